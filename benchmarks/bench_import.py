@@ -0,0 +1,119 @@
+'''bench_import.py: import-time budget for table_configs modules (cron CLI startup)
+
+Usage:
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --budget-ms 100 --repeat 9
+
+Each module is imported in a fresh interpreter (-X importtime); the median
+cumulative import time must stay under --budget-ms, and none of the
+DEFERRED_MODULES may be loaded by the import itself.  Exits 1 on a breach,
+so it can gate CI.
+
+'''
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from os import path
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.dirname(HERE)
+
+DEFAULT_MODULES = (
+    'prosper.table_configs.snapshot_evecentral',
+    'prosper.table_configs.crest_markethistory',
+    'prosper.table_configs.eve_serverinfo',
+    'prosper.warehouse.FetchConnection'
+)
+DEFERRED_MODULES = (
+    'pandas',
+    'numpy',
+    'plumbum',
+    'mysql.connector',
+    'psycopg2',
+    'prosper.common.prosper_config'
+)
+DEFAULT_BUDGET_MS = 150.0
+
+PROBE = '''
+import sys
+import {module}
+print('DEFERRED=' + ','.join(name for name in {deferred!r} if name in sys.modules))
+'''
+
+def import_once(module_name):
+    '''(cumulative import ms, [deferred modules loaded]) in a fresh interpreter'''
+    completed = subprocess.run(
+        [
+            sys.executable, '-X', 'importtime', '-c',
+            PROBE.format(module=module_name, deferred=DEFERRED_MODULES)
+        ],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True
+    )
+    cumulative_us = None
+    for line in completed.stderr.splitlines():
+        #import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module_name:
+            cumulative_us = int(fields[1])
+    loaded = []
+    for line in completed.stdout.splitlines():
+        if line.startswith('DEFERRED='):
+            loaded = [name for name in line[len('DEFERRED='):].split(',') if name]
+    return cumulative_us / 1000.0, loaded
+
+def bench_module(module_name, repeat):
+    '''median/max import ms + deferred modules that got loaded'''
+    timings = []
+    loaded = set()
+    for _ in range(repeat):
+        milliseconds, deferred_loaded = import_once(module_name)
+        timings.append(milliseconds)
+        loaded.update(deferred_loaded)
+    return {
+        'median_ms': statistics.median(timings),
+        'max_ms': max(timings),
+        'deferred_loaded': sorted(loaded)
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--modules', nargs='+', default=list(DEFAULT_MODULES))
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args(argv)
+
+    report = {'budget_ms': args.budget_ms, 'modules': {}}
+    failures = []
+    for module_name in args.modules:
+        summary = bench_module(module_name, args.repeat)
+        report['modules'][module_name] = summary
+        print('{0:45} median={1:8.1f}ms max={2:8.1f}ms deferred_loaded={3}'.format(
+            module_name, summary['median_ms'], summary['max_ms'],
+            ','.join(summary['deferred_loaded']) or '-'
+        ))
+        if summary['median_ms'] > args.budget_ms:
+            failures.append('{0}: {1:.1f}ms > {2:.1f}ms budget'.format(
+                module_name, summary['median_ms'], args.budget_ms
+            ))
+        if summary['deferred_loaded']:
+            failures.append('{0}: imports {1} eagerly'.format(
+                module_name, ','.join(summary['deferred_loaded'])
+            ))
+
+    if args.output:
+        with open(args.output, 'w') as file_handle:
+            json.dump(report, file_handle, indent=2)
+    for failure in failures:
+        print('-- OVER BUDGET: ' + failure)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
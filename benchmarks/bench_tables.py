@@ -0,0 +1,87 @@
+'''bench_tables.py: SQLTable datasources for benchmark runs
+
+Same keys as prosper/table_configs (read from table_config.cfg), but the
+connection comes from the benchmark command line instead of the secrets
+file: a real MySQL server, or the embedded TableType.SQLite backend.
+
+'''
+
+import configparser
+from os import path
+
+import prosper.warehouse.Connection as Connection
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.dirname(HERE)
+CONFIG_DIR = path.join(ROOT, 'prosper', 'table_configs')
+CONFIG_ABSPATH = path.join(CONFIG_DIR, 'table_config.cfg')
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read(CONFIG_ABSPATH)
+
+## Benchmark datasources ##
+class BenchTable(Connection.SQLTable):
+    '''table_configs-style SQLTable with connection values injected at runtime'''
+    CONFIG_SECTION = None
+    CONNECTION_VALUES = None    #set by configure()
+
+    @classmethod
+    def configure(cls, connection_values):
+        '''point every BenchTable at one backend'''
+        BenchTable.CONNECTION_VALUES = connection_values
+
+    def set_local_path(self):
+        return HERE
+
+    def _define_table_type(self):
+        return Connection.TableType().set_table_type(self.CONNECTION_VALUES['table_type'])
+
+    def get_table_create_string(self):
+        create_file = CONFIG.get(self.CONFIG_SECTION, 'table_create_file')
+        with open(path.join(CONFIG_DIR, create_file), 'r') as file_handle:
+            return file_handle.read()
+
+    def get_keys(self):
+        self.index_key = CONFIG.get(self.CONFIG_SECTION, 'index_key')
+        return (
+            CONFIG.get(self.CONFIG_SECTION, 'primary_keys').split(','),
+            CONFIG.get(self.CONFIG_SECTION, 'data_keys').split(',')
+        )
+
+    def _set_info(self):
+        return self.CONFIG_SECTION, self.CONNECTION_VALUES['schema']
+
+    def get_connection_values(self):
+        return self.CONNECTION_VALUES
+
+    def get_connection(self):
+        import mysql.connector
+        return mysql.connector.connect(
+            user    =self.CONNECTION_VALUES['user'],
+            password=self.CONNECTION_VALUES['passwd'],
+            database=self.CONNECTION_VALUES['schema'],
+            host    =self.CONNECTION_VALUES['host'],
+            port    =self.CONNECTION_VALUES['port'],
+            allow_local_infile=True
+        )
+
+    def test_table(self):
+        self.test_table_exists(self.table_name, self.schema_name)
+        self.test_table_headers(self.table_name, self.schema_name, self.all_keys)
+
+    def latest_entry(self, **kwargs):
+        latest_frame = self.latest_entries(**kwargs)
+        if latest_frame.empty:
+            return None
+        return latest_frame[self.index_key].max()
+
+class snapshot_evecentral(BenchTable):
+    CONFIG_SECTION = 'snapshot_evecentral'
+
+class crest_markethistory(BenchTable):
+    CONFIG_SECTION = 'crest_markethistory'
+
+TABLES = {
+    'snapshot_evecentral': snapshot_evecentral,
+    'crest_markethistory': crest_markethistory
+}
@@ -0,0 +1,259 @@
+'''bench_warehouse.py: throughput/latency/RSS benchmarks for SQLTable reads and writes
+
+Usage:
+    python benchmarks/bench_warehouse.py --rows 1000000
+    python benchmarks/bench_warehouse.py --backend mysql --host localhost --user bench \
+        --passwd bench --schema eveprosper_bench --rows 20000000 --tables snapshot_evecentral
+
+Each run writes benchmarks/results/<timestamp>_<commit>.json; compare runs
+across commits with --compare OLD.json NEW.json.
+
+'''
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+
+import numpy
+import pandas
+
+HERE = path.abspath(path.dirname(__file__))
+sys.path.insert(0, path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import prosper.warehouse.BulkLoader as table_bulk
+import prosper.warehouse.ConnectionPool as table_pool
+import bench_tables
+import synthetic_data
+
+RESULTS_DIR = path.join(HERE, 'results')
+PERCENTILES = (50, 90, 99)
+
+def peak_rss_mb():
+    '''peak resident set size of this process so far'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #linux reports KB, macOS bytes
+    return peak / 1024.0 / (1024.0 if sys.platform == 'darwin' else 1.0)
+
+def git_commit():
+    '''short HEAD hash (+ "-dirty"), or "unknown"'''
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, stderr=subprocess.DEVNULL
+        ).decode().strip()
+        dirty = subprocess.call(
+            ['git', 'diff', '--quiet', 'HEAD', '--', '../prosper'], cwd=HERE
+        )
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def summarize(latencies, rows=None):
+    '''latency list (seconds) -> count/mean/percentiles (ms), rows/sec'''
+    latencies = numpy.asarray(latencies, dtype=float)
+    summary = {
+        'calls': int(len(latencies)),
+        'total_seconds': float(latencies.sum()),
+        'mean_ms': float(latencies.mean() * 1000) if len(latencies) else None
+    }
+    for percentile in PERCENTILES:
+        summary['p{0}_ms'.format(percentile)] = \
+            float(numpy.percentile(latencies, percentile) * 1000) if len(latencies) else None
+    if rows is not None:
+        summary['rows'] = int(rows)
+        summary['rows_per_sec'] = rows / summary['total_seconds'] if summary['total_seconds'] else None
+    summary['peak_rss_mb'] = peak_rss_mb()
+    return summary
+
+def timed(func, *args, **kwargs):
+    '''(seconds, result)'''
+    start_time = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start_time, result
+
+def bench_table(table_name, args, random_state):
+    '''run every phase against one table.  Returns {phase: summary}'''
+    table_class = bench_tables.TABLES[table_name]
+    results = {}
+
+    ## table checks: cold (create + validate), then cached/forced re-validation ##
+    seconds, table = timed(table_class, table_name, lazy=False)
+    results['test_table_cold'] = summarize([seconds])
+    results['test_table_forced'] = summarize(
+        [timed(table.validate_table, force=True)[0] for _ in range(args.repeat)]
+    )
+
+    ## put_data ##
+    write_latencies = []
+    written_rows = 0
+    frames_seen = []
+    for frame in synthetic_data.GENERATORS[table_name](
+            args.rows,
+            chunk_rows=args.write_chunk,
+            seed=args.seed
+    ):
+        seconds, _ = timed(table.put_data, frame)
+        write_latencies.append(seconds)
+        written_rows += len(frame)
+        if not frames_seen:
+            frames_seen.append(frame.reset_index())
+    results['put_data'] = summarize(write_latencies, rows=written_rows)
+    results['put_data']['strategy'] = table.connection_values['write_strategy']
+
+    ## get_data: random key filters over random windows ##
+    sample = frames_seen[0]
+    query_keys = [key for key in table.primary_keys if key and key != 'location_type']
+    index_values = pandas.to_datetime(sample[table.index_key])
+    full_start = index_values.min() - pandas.Timedelta(seconds=1)
+    read_latencies = []
+    read_rows = 0
+    for _ in range(args.repeat):
+        row = sample.iloc[random_state.randint(len(sample))]
+        filters = {key: table_value(row[key]) for key in query_keys[:1]}
+        seconds, frame = timed(table.get_data, str(full_start), **filters)
+        read_latencies.append(seconds)
+        read_rows += len(frame)
+    results['get_data_filtered'] = summarize(read_latencies, rows=read_rows)
+
+    seconds, frame = timed(table.get_data, str(full_start), limit=args.scan_limit)
+    results['get_data_scan'] = summarize([seconds], rows=len(frame))
+
+    ## latest_entry: per key and bulk ##
+    latest_latencies = []
+    for _ in range(args.repeat):
+        row = sample.iloc[random_state.randint(len(sample))]
+        filters = {key: table_value(row[key]) for key in query_keys}
+        latest_latencies.append(timed(table.latest_entries, refresh=True, **filters)[0])
+    results['latest_entry'] = summarize(latest_latencies)
+    results['latest_entries_all'] = summarize(
+        [timed(table.latest_entries, refresh=True)[0]]
+    )
+    return results
+
+def table_value(value):
+    '''numpy scalar -> python'''
+    return value.item() if hasattr(value, 'item') else value
+
+def build_connection_values(args, work_dir):
+    '''connection values for BenchTable (same shape as Utilities.get_config_values)'''
+    return {
+        'table_type': args.backend,
+        'sqlite_path': path.join(work_dir, 'bench.sqlite'),
+        'schema': args.schema,
+        'host': args.host,
+        'user': args.user,
+        'passwd': args.passwd,
+        'port': args.port,
+        'table': None,
+        'pool_size': 5,
+        'pool_idle_timeout': 300,
+        'pool_health_check': False,
+        'write_strategy': args.write_strategy,
+        'write_batch_size': args.batch_size,
+        'local_cache_path': None,
+        'local_cache_max_mb': 512,
+        'compact_dtypes': True,
+        'fast_decode': not args.no_fast_decode,
+        'dtype_overrides': '',
+        'result_cache_ttl': 0,
+        'result_cache_max_mb': 256,
+        'schema_cache_path': None,
+        'schema_cache_ttl': None,
+        'profile_path': args.profile_path,
+        'profile_sample_rate': args.profile_sample_rate,
+        'profile_memory': args.profile_memory
+    }
+
+def compare(old_path, new_path):
+    '''print per-phase change between two result files'''
+    with open(old_path) as file_handle:
+        old = json.load(file_handle)
+    with open(new_path) as file_handle:
+        new = json.load(file_handle)
+    print('{0} -> {1}'.format(old['commit'], new['commit']))
+    for table_name, phases in new['tables'].items():
+        for phase, summary in phases.items():
+            before = old['tables'].get(table_name, {}).get(phase)
+            if not before:
+                continue
+            for metric in ('rows_per_sec', 'p50_ms', 'p99_ms', 'peak_rss_mb'):
+                if summary.get(metric) and before.get(metric):
+                    print('{0:22} {1:20} {2:12} {3:12.2f} -> {4:12.2f} ({5:+.1f}%)'.format(
+                        table_name, phase, metric, before[metric], summary[metric],
+                        (summary[metric] / before[metric] - 1) * 100
+                    ))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--backend', choices=('sqlite', 'mysql', 'postgres'), default='sqlite')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', default='bench')
+    parser.add_argument('--passwd', default='bench')
+    parser.add_argument('--schema', default='eveprosper_bench')
+    parser.add_argument('--tables', nargs='+', default=sorted(bench_tables.TABLES))
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--write-chunk', type=int, default=100000)
+    parser.add_argument('--write-strategy', default=table_bulk.WriteStrategy.BatchInsert)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--scan-limit', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--no-fast-decode', action='store_true',
+                        help='decode get_data() via DataFrame.from_records (baseline)')
+    parser.add_argument('--profile-path', default=None,
+                        help='write cProfile reports of sampled get_data()/put_data() calls here')
+    parser.add_argument('--profile-sample-rate', type=int, default=10)
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='add tracemalloc allocations to the profile reports')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix='prosper_bench_')
+    bench_tables.BenchTable.configure(build_connection_values(args, work_dir))
+    random_state = numpy.random.RandomState(args.seed)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pandas.__version__,
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'args': vars(args),
+        'tables': {}
+    }
+    for table_name in args.tables:
+        print('-- benchmarking {0} ({1} rows, {2})'.format(table_name, args.rows, args.backend))
+        report['tables'][table_name] = bench_table(table_name, args, random_state)
+        for phase, summary in report['tables'][table_name].items():
+            print('   {0:20} {1}'.format(phase, json.dumps(summary)))
+    table_pool.close_pools()
+    report['peak_rss_mb'] = peak_rss_mb()
+
+    output_path = args.output
+    if not output_path:
+        if not path.isdir(RESULTS_DIR):
+            os.makedirs(RESULTS_DIR)
+        output_path = path.join(
+            RESULTS_DIR,
+            '{0}_{1}.json'.format(time.strftime('%Y%m%d_%H%M%S'), report['commit'])
+        )
+    with open(output_path, 'w') as file_handle:
+        json.dump(report, file_handle, indent=2, default=str)
+    print('-- results: {0}'.format(output_path))
+
+if __name__ == '__main__':
+    main()
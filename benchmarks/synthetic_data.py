@@ -0,0 +1,127 @@
+'''synthetic_data.py: vectorized, seeded frame generators for benchmark runs
+
+Frames mirror the table_config.cfg layouts (index_key + primary_keys +
+data_keys) and come out in bounded chunks, so tens of millions of rows never
+sit in memory at once.
+
+'''
+
+import numpy
+import pandas
+
+LOCATION_TYPES = ('solarsystemid', 'stationid', 'regionid', 'global', 'citadelid')
+
+def _grid(rows, key_count, start, freq):
+    '''(#timestamps, DatetimeIndex) so timestamps * key_count >= rows'''
+    periods = max(1, -(-rows // key_count))     #ceil
+    return periods, pandas.date_range(start=start, periods=periods, freq=freq)
+
+def snapshot_evecentral(
+        rows,
+        typeids=500,
+        locations=20,
+        start='2016-01-01',
+        freq='h',
+        chunk_rows=1000000,
+        seed=1234
+):
+    '''yield snapshot_evecentral-shaped frames (price_datetime as index)
+
+    Args:
+        rows (int): total rows to generate (rounded down to whole timestamps at the end)
+        typeids (int): distinct typeid values
+        locations (int): distinct locationid values
+        start (str): first price_datetime
+        freq (str): pandas frequency between snapshots
+        chunk_rows (int): max rows per yielded frame
+        seed (int): numpy seed: same args -> same data
+
+    '''
+    random_state = numpy.random.RandomState(seed)
+    key_count = typeids * locations
+    _, timestamps = _grid(rows, key_count, start, freq)
+    typeid_values = numpy.repeat(numpy.arange(34, 34 + typeids, dtype='int32'), locations)
+    locationid_values = numpy.tile(
+        numpy.arange(30000000, 30000000 + locations, dtype='int32'),
+        typeids
+    )
+    location_types = numpy.array(LOCATION_TYPES, dtype=object)[
+        numpy.arange(key_count) % len(LOCATION_TYPES)
+    ]
+    base_price = random_state.lognormal(mean=4.0, sigma=2.0, size=key_count)
+
+    stamps_per_chunk = max(1, chunk_rows // key_count)
+    emitted = 0
+    for offset in range(0, len(timestamps), stamps_per_chunk):
+        chunk_stamps = timestamps[offset:offset + stamps_per_chunk]
+        chunk_size = min(len(chunk_stamps) * key_count, rows - emitted)
+        if chunk_size <= 0:
+            break
+        tiles = len(chunk_stamps)
+        drift = random_state.normal(1.0, 0.02, size=tiles * key_count)
+        sell_min = numpy.tile(base_price, tiles) * drift
+        spread = random_state.uniform(0.90, 0.99, size=tiles * key_count)
+        frame = pandas.DataFrame({
+            'price_datetime': numpy.repeat(chunk_stamps.values, key_count),
+            'typeid': numpy.tile(typeid_values, tiles),
+            'locationid': numpy.tile(locationid_values, tiles),
+            'location_type': numpy.tile(location_types, tiles),
+            'buy_max': (sell_min * spread).round(2),
+            'sell_min': sell_min.round(2),
+            'buy_avg': (sell_min * spread * 0.95).round(2),
+            'sell_avg': (sell_min * 1.05).round(2),
+            'buy_volume': random_state.randint(0, 1000000, size=tiles * key_count),
+            'sell_volume': random_state.randint(0, 1000000, size=tiles * key_count)
+        }).iloc[:chunk_size]
+        emitted += chunk_size
+        yield frame.set_index('price_datetime')
+
+def crest_markethistory(
+        rows,
+        typeids=2000,
+        regions=60,
+        start='2010-01-01',
+        chunk_rows=1000000,
+        seed=1234
+):
+    '''yield crest_markethistory-shaped frames (one row per day per typeid/region)
+
+    Args: as snapshot_evecentral(), with regions instead of locations
+
+    '''
+    random_state = numpy.random.RandomState(seed)
+    key_count = typeids * regions
+    _, dates = _grid(rows, key_count, start, 'D')
+    typeid_values = numpy.repeat(numpy.arange(34, 34 + typeids, dtype='int32'), regions)
+    regionid_values = numpy.tile(
+        numpy.arange(10000001, 10000001 + regions, dtype='int32'),
+        typeids
+    )
+    base_price = random_state.lognormal(mean=4.0, sigma=2.0, size=key_count)
+
+    stamps_per_chunk = max(1, chunk_rows // key_count)
+    emitted = 0
+    for offset in range(0, len(dates), stamps_per_chunk):
+        chunk_dates = dates[offset:offset + stamps_per_chunk]
+        chunk_size = min(len(chunk_dates) * key_count, rows - emitted)
+        if chunk_size <= 0:
+            break
+        tiles = len(chunk_dates)
+        avg_price = numpy.tile(base_price, tiles) * random_state.normal(1.0, 0.03, size=tiles * key_count)
+        frame = pandas.DataFrame({
+            'price_date': numpy.repeat(chunk_dates.values, key_count),
+            'typeid': numpy.tile(typeid_values, tiles),
+            'regionid': numpy.tile(regionid_values, tiles),
+            'orderCount': random_state.randint(1, 5000, size=tiles * key_count),
+            'volume': random_state.randint(1, 10000000, size=tiles * key_count),
+            'lowPrice': (avg_price * 0.97).round(2),
+            'highPrice': (avg_price * 1.03).round(2),
+            'avgPrice': avg_price.round(2)
+        }).iloc[:chunk_size]
+        emitted += chunk_size
+        yield frame.set_index('price_date')
+
+GENERATORS = {
+    'snapshot_evecentral': snapshot_evecentral,
+    'crest_markethistory': crest_markethistory
+}
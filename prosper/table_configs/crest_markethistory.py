@@ -1,57 +1,65 @@
-'''snapshot_evecentral.py: contains connection logic for snapshot_evecentral database'''
+'''crest_markethistory.py: contains connection logic for crest_markethistory database'''
 
 from os import path
+import logging
 from datetime import datetime, timedelta
 
-import pandas
-from plumbum import local
-import mysql.connector
-
-#from prosper.common.utilities import get_config, create_logger
-from prosper.common.prosper_logging import create_logger
-from prosper.common.prosper_config import get_config
 import prosper.warehouse.Connection as Connection
 import prosper.warehouse.Utilities as table_utils
+import prosper.warehouse.BulkLoader as table_bulk
+
+pandas = table_utils.lazy_import('pandas')
 
 HERE = path.abspath(path.dirname(__file__))
 ME = __file__.replace('.py', '')
 CONFIG_ABSPATH = path.join(HERE, 'table_config.cfg')
 
-print('SNAPSHOT: GET_CONFIG')
-config = get_config(CONFIG_ABSPATH)
-CONNECTION_VALUES = table_utils.get_config_values(config, ME)
+def get_table_config():
+    '''table_config.cfg: parsed on first use, shared with the other table_configs'''
+    return table_utils.load_config(CONFIG_ABSPATH)
+
+def connection_values():
+    '''connection values for this datasource: parsed on first use'''
+    return table_utils.load_connection_values(CONFIG_ABSPATH, ME)
+
+def __getattr__(attr_name):
+    '''legacy module attributes (config, CONNECTION_VALUES) resolve lazily'''
+    if attr_name == 'config':
+        return get_table_config()
+    if attr_name == 'CONNECTION_VALUES':
+        return connection_values()
+    raise AttributeError('module {0} has no attribute {1}'.format(__name__, attr_name))
 
 DEBUG = False
 class crest_markethistory(Connection.SQLTable):
-    '''worker class for handling eve_central data'''
-    _latest_entry=None
+    '''worker class for handling CREST market history data'''
 
     def set_local_path(self):
         return HERE
 
     def _define_table_type(self):
-        '''set TableType enum'''
-        return Connection.TableType.MySQL
+        '''set TableType enum (cfg `table_type`, default mysql)'''
+        return Connection.TableType().set_table_type(connection_values()['table_type'])
 
     def get_table_create_string(self):
         '''get/parse table-create file'''
         self._logger.info('crest_markethistory.get_table_create_string()')
 
         full_table_filepath = None
-        table_create_path = config.get(ME, 'table_create_file')
+        table_create_path = get_table_config().get(ME, 'table_create_file')
         if '..' in table_create_path:
-            local.cwd.chdir(HERE)
-            full_table_filepath = local.path(table_create_path)
+            #relative to this module (no chdir: cwd is process-wide state)
+            full_table_filepath = path.normpath(path.join(HERE, table_create_path))
         else:
-            full_table_filepath = local.path(table_create_path)
-        self._logger.debug('-- full_table_filepath: {0}'.format(full_table_filepath))
+            full_table_filepath = path.abspath(table_create_path)
+        self._logger.debug('-- full_table_filepath: %s', full_table_filepath)
 
         #TODO: test `exists`
         full_create_string = ''
         with open(full_table_filepath, 'r') as file_handle:
             full_create_string = file_handle.read()
 
-        self._logger.debug('-- full_create_string: {0}'.format(full_create_string))
+        self._logger.debug('-- full_create_string: %s', full_create_string)
 
         return full_create_string
 
@@ -62,24 +70,24 @@ class crest_markethistory(Connection.SQLTable):
         tmp_primary_keys = []
         tmp_data_keys = []
         try:
-            tmp_primary_keys = config.get(ME, 'primary_keys').split(',')
-            tmp_data_keys = config.get(ME, 'data_keys').split(',')
-            self.index_key = config.get(ME, 'index_key') #FIXME: this is bad
+            tmp_primary_keys = get_table_config().get(ME, 'primary_keys').split(',')
+            tmp_data_keys = get_table_config().get(ME, 'data_keys').split(',')
+            self.index_key = get_table_config().get(ME, 'index_key') #FIXME: this is bad
         except KeyError as error_msg:
-            self._logger.error(
-                'EXCEPTION: Keys missing' + \
-                '\r\tprimary_keys={0}'.format(','.join(tmp_primary_keys)) +
-                '\r\tdata_keys={0}'.format(','.join(tmp_data_keys)) +
-                '\r\tindex_key={0}'.format(self.index_key),
-                exc_info=True
+            table_utils.log_fields(
+                self._logger, logging.ERROR, 'EXCEPTION: Keys missing',
+                exc_info=True,
+                primary_keys=tmp_primary_keys,
+                data_keys=tmp_data_keys,
+                index_key=self.index_key
             )
             raise Connection.TableKeysMissing(error_msg, ME)
 
-        self._logger.debug(
-            'keys validated:' + \
-            '\r\tprimary_keys={0}'.format(','.join(tmp_primary_keys)) +
-            '\r\tdata_keys={0}'.format(','.join(tmp_data_keys)) +
-            '\r\tindex_key={0}'.format(self.index_key)
+        table_utils.log_fields(
+            self._logger, logging.DEBUG, 'keys validated:',
+            primary_keys=tmp_primary_keys,
+            data_keys=tmp_data_keys,
+            index_key=self.index_key
         )
         return tmp_primary_keys, tmp_data_keys
 
@@ -87,22 +95,26 @@ class crest_markethistory(Connection.SQLTable):
         '''save info about table/datasource'''
         #TODO move up?
         self._logger.info('crest_markethistory._set_info()')
-        return CONNECTION_VALUES['table'], CONNECTION_VALUES['schema']
+        return connection_values()['table'], connection_values()['schema']
+
+    def get_connection_values(self):
+        '''get host/port/schema/user (+pool settings) for the pool key'''
+        return connection_values()
 
     def get_connection(self):
-        '''get con/cur for db connections'''
+        '''open a new connection; SQLTable pools and hands these out per query'''
         self._logger.info('crest_markethistory.get_connection()')
         #self._logger.debug(str(CONNECTION_VALUES))
+        import mysql.connector
         tmp_connection = mysql.connector.connect(
-            user    =CONNECTION_VALUES['user'],
-            password=CONNECTION_VALUES['passwd'],
-            database=CONNECTION_VALUES['schema'],
-            host    =CONNECTION_VALUES['host'],
-            port    =CONNECTION_VALUES['port']
+            user    =connection_values()['user'],
+            password=connection_values()['passwd'],
+            database=connection_values()['schema'],
+            host    =connection_values()['host'],
+            port    =connection_values()['port']
         )
-        tmp_cursor = tmp_connection.cursor()
 
-        return tmp_connection, tmp_cursor
+        return tmp_connection
 
     def test_table(self):
         '''test table connection/contents'''
@@ -111,14 +123,14 @@ class crest_markethistory(Connection.SQLTable):
         self._logger.info('-- table exists test: START')
         try:
             self.test_table_exists(
-                CONNECTION_VALUES['table'],
-                CONNECTION_VALUES['schema']
+                connection_values()['table'],
+                connection_values()['schema']
             )
         except Exception as error_msg:
-            self._logger.error(
-                'EXCEPTION: table does not exist, unable to fix:' +
-                '\r\ttable={0}.{1}'.format(CONNECTION_VALUES['schema'],CONNECTION_VALUES['table']),
-                exc_info=True
+            table_utils.log_fields(
+                self._logger, logging.ERROR, 'EXCEPTION: table does not exist, unable to fix',
+                exc_info=True,
+                table='{0}.{1}'.format(connection_values()['schema'], connection_values()['table'])
             )
             raise error_msg
 
@@ -129,80 +141,81 @@ class crest_markethistory(Connection.SQLTable):
 
         try:
             self.test_table_headers(
-                CONNECTION_VALUES['table'],
-                CONNECTION_VALUES['schema'],
+                connection_values()['table'],
+                connection_values()['schema'],
                 self.all_keys
             )
         except Exception as error_msg:
-            self._logger.error(
-                'EXCEPTION: table headers missmatch:' +
-                '\r\ttable={0}.{1}'.format(CONNECTION_VALUES['schema'],CONNECTION_VALUES['table']),
-                exc_info=True
+            table_utils.log_fields(
+                self._logger, logging.ERROR, 'EXCEPTION: table headers missmatch',
+                exc_info=True,
+                table='{0}.{1}'.format(connection_values()['schema'], connection_values()['table'])
             )
             raise error_msg
 
         self._logger.info('-- table headers test: PASS')
 
-        self._latest_entry = self.latest_entry()
-
     #TODO: maybe too complicated
 
 
     def latest_entry(self, **kwargs):
         '''check source for latest entry (given kwargs)'''
         self._logger.info('crest_markethistory.latest_entry()')
-        pd_dataframe = self.get_data(
-            '1970-01-01',   #FIXME: epoc0 is a hacky way to handle this
-            kwargs_passthrough=kwargs,
-            limit=1,
-            )
+        latest_frame = self.latest_entries(**kwargs)
 
-        if pd_dataframe.empty:
+        if latest_frame.empty:
             self._logger.info('-- latest_entry=None, no entries found')
             return None
         else:
-            latest_entry = pd_dataframe[self.index_key][0]
-            self._logger.debug('-- latest_entry={0}'.format(str(latest_entry)))
+            latest_entry = latest_frame[self.index_key].max()
+            self._logger.debug('-- latest_entry=%s', (latest_entry))
             return latest_entry
 
     def put_data(self, payload):
-        '''tests and pushes data to datastore'''
+        '''tests and pushes data to datastore
+
+        Trims payload per (typeid, regionid) series against that series' own
+        latest entry.  With write_strategy=upsert the latest day is re-sent
+        (it changes until the day closes); otherwise only newer rows go out.
+
+        '''
         self._logger.info('crest_markethistory.put_data()')
         if not isinstance(payload, pandas.DataFrame):
             raise NotImplementedError('put_data() requires Pandas.DataFrame.  No conversion implemented')
 
-        if not payload.index.name:
-            # change pandas.index to db's index_key
-            payload.set_index(
-                keys=self.index_key,
-                drop=True,
-                inplace=True
-            )
+        self.validate_table()
+        flat_payload = payload.reset_index() if payload.index.name else payload.copy()
+        if flat_payload.empty:
+            self._logger.warning('WARNING: empty payload, SKIPPING WRITE')
+            return
 
+        watermarks = self.latest_entries(**{
+            key: list(flat_payload[key].unique()) for key in self.primary_keys
+        })
         self._logger.debug(
-            '-- Testing dataframe against existing table.'
-            '\r\tlatest_entry={0}'.format(self._latest_entry)
+            '-- Testing dataframe against existing table.\r\tseries_with_history=%d',
+            len(watermarks)
         )
-        if self._latest_entry:
-            # avoid overwrites
-            datemin = self._latest_entry + timedelta(days=1)
-            datemax = payload.index.values.max()
-            print('datemin: ' + str(datemin))
-            print('datemax: ' + str(datemax))
-            if payload.index.values.max() == self._latest_entry:
+        if not watermarks.empty:
+            # avoid overwrites: compare each row to its own series watermark
+            watermarks = watermarks.rename(columns={self.index_key: '_watermark'})
+            merged = flat_payload.merge(watermarks, on=self.primary_keys, how='left')
+            row_dates = pandas.to_datetime(merged[self.index_key])
+            series_dates = pandas.to_datetime(merged['_watermark'])
+            if self.connection_values['write_strategy'] == table_bulk.WriteStrategy.Upsert:
+                keep_mask = series_dates.isnull() | (row_dates >= series_dates)
+            else:
+                keep_mask = series_dates.isnull() | (row_dates > series_dates)
+            flat_payload = flat_payload[keep_mask.values]
+
+            if flat_payload.empty:
                 self._logger.warning('WARNING: db already up-to-date, SKIPPING WRITE')
                 return
-            else:
-                self._logger.info(
-                    '-- Adjusting dataframe to {0}'.format(self._latest_entry)
-                )
-                payload = payload.ix[
-                    datemin:\
-                    datemax
-                ]
+            self._logger.info('-- Adjusted dataframe to series watermarks: %d rows', len(flat_payload))
 
+        payload = flat_payload.set_index(keys=self.index_key, drop=True)
         self._logger.info('-- returning to super().put_data()')
-        self._logger.debug(str(payload))
+        self._logger.debug('-- payload:\n%s', table_utils.LogFrame(payload))
         super().put_data(payload)
 
 def build_sample_dataframe(days):
@@ -268,12 +281,11 @@ def build_sample_dataframe(days):
         drop=True,
         inplace=True
     )
-    if DEBUG: print(dataframe)
     return dataframe
 
 ## MAIN = TEST ##
 if __name__ == '__main__':
-    print(ME)
+    from prosper.common.prosper_logging import create_logger
     DEBUG = True
     DEBUG_LOGGER = create_logger(
         'debug_crest_markethistory',
@@ -286,7 +298,7 @@ if __name__ == '__main__':
     #CONNECTION_VALUES = table_utils.get_config_values(config, ME)
     SAMPLE_DATA_FRAME = build_sample_dataframe(10)
     TEST_OBJECT = crest_markethistory(
-        CONNECTION_VALUES['table'],
+        connection_values()['table'],
         debug=DEBUG,
         loging_handle=DEBUG_LOGGER
     )
@@ -302,6 +314,6 @@ if __name__ == '__main__':
         regionid=99999999,#30000142,
         typeid=[34, 40],
     )
-    print(TEST_DATA)
+    DEBUG_LOGGER.debug('-- TEST_DATA:\n%s', table_utils.LogFrame(TEST_DATA))
 
     #TODO compare TEST_DATA and SAMPLE_DATA_FRAME
@@ -0,0 +1,70 @@
+'''memmap_history.py: frozen market history in local memory-mapped column files
+
+Same keys as the SQL datasources of the same name (table_config.cfg
+sections), stored under cfg `memmap_path`/<table_name>.  Load with:
+    fetch_data_source('memmap_history', 'crest_markethistory')
+
+'''
+
+from os import path
+import logging
+
+import prosper.warehouse.Connection as Connection
+import prosper.warehouse.Utilities as table_utils
+
+HERE = path.abspath(path.dirname(__file__))
+CONFIG_ABSPATH = path.join(HERE, 'table_config.cfg')
+
+def get_table_config():
+    '''table_config.cfg: parsed on first use, shared with the other table_configs'''
+    return table_utils.load_config(CONFIG_ABSPATH)
+
+class MemMapHistory(Connection.MemMapTable):
+    '''keys/paths from the cfg section named by CONFIG_SECTION'''
+    CONFIG_SECTION = None
+
+    def set_local_path(self):
+        return HERE
+
+    def get_keys(self):
+        '''get primary/data keys from config file'''
+        self._logger.info('%s.get_keys()', self.CONFIG_SECTION)
+
+        tmp_primary_keys = []
+        tmp_data_keys = []
+        try:
+            tmp_primary_keys = get_table_config().get(self.CONFIG_SECTION, 'primary_keys').split(',')
+            tmp_data_keys = get_table_config().get(self.CONFIG_SECTION, 'data_keys').split(',')
+            self.index_key = get_table_config().get(self.CONFIG_SECTION, 'index_key')
+        except KeyError as error_msg:
+            table_utils.log_fields(
+                self._logger, logging.ERROR, 'EXCEPTION: Keys missing',
+                exc_info=True,
+                section=self.CONFIG_SECTION
+            )
+            raise Connection.TableKeysMissing(error_msg, self.CONFIG_SECTION)
+
+        return tmp_primary_keys, tmp_data_keys
+
+    def _set_info(self):
+        '''(table_name, table directory) from cfg `table_name`/`memmap_path`'''
+        self._logger.info('%s._set_info()', self.CONFIG_SECTION)
+        config = get_table_config()
+        memmap_path = table_utils.get_config_option(config, self.CONFIG_SECTION, 'memmap_path')
+        if not memmap_path:
+            raise Connection.TableKeysMissing(
+                'memmap_path not set in [{0}] or [default]'.format(self.CONFIG_SECTION),
+                self.CONFIG_SECTION
+            )
+        table_name = table_utils.get_config_option(
+            config, self.CONFIG_SECTION, 'table_name', self.CONFIG_SECTION
+        )
+        return table_name, path.join(memmap_path, table_name)
+
+class crest_markethistory(MemMapHistory):
+    '''daily CREST market history (typeid, regionid)'''
+    CONFIG_SECTION = 'crest_markethistory'
+
+class snapshot_evecentral(MemMapHistory):
+    '''eve-central price snapshots (typeid, locationid, location_type)'''
+    CONFIG_SECTION = 'snapshot_evecentral'
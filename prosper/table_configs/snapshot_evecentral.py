@@ -1,23 +1,32 @@
 '''snapshot_evecentral.py: contains connection logic for snapshot_evecentral database'''
 
 from os import path
+import logging
 
-import pandas
-from plumbum import local
-import mysql.connector
-
-from prosper.common.prosper_logging import create_logger
-from prosper.common.prosper_config import get_config
 import prosper.warehouse.Connection as Connection
 import prosper.warehouse.Utilities as table_utils
 
+pandas = table_utils.lazy_import('pandas')
+
 HERE = path.abspath(path.dirname(__file__))
 ME = __file__.replace('.py', '') #FIXME: only valid for single-config profiles
 CONFIG_ABSPATH = path.join(HERE, 'table_config.cfg')
 
-print('SNAPSHOT: GET_CONFIG')
-config = get_config(CONFIG_ABSPATH)
-CONNECTION_VALUES = table_utils.get_config_values(config, ME)
+def get_table_config():
+    '''table_config.cfg: parsed on first use, shared with the other table_configs'''
+    return table_utils.load_config(CONFIG_ABSPATH)
+
+def connection_values():
+    '''connection values for this datasource: parsed on first use'''
+    return table_utils.load_connection_values(CONFIG_ABSPATH, ME)
+
+def __getattr__(attr_name):
+    '''legacy module attributes (config, CONNECTION_VALUES) resolve lazily'''
+    if attr_name == 'config':
+        return get_table_config()
+    if attr_name == 'CONNECTION_VALUES':
+        return connection_values()
+    raise AttributeError('module {0} has no attribute {1}'.format(__name__, attr_name))
 
 DEBUG = False
 class snapshot_evecentral(Connection.SQLTable):
@@ -28,26 +37,26 @@ class snapshot_evecentral(Connection.SQLTable):
         return HERE
 
     def _define_table_type(self):
-        '''set TableType enum'''
-        return Connection.TableType.MySQL
+        '''set TableType enum (cfg `table_type`, default mysql)'''
+        return Connection.TableType().set_table_type(connection_values()['table_type'])
 
     def get_table_create_string(self):
         '''get/parse table-create file'''
         self._logger.info('snapshot_evecentral.get_table_create_string()')
         full_table_filepath = None
-        table_create_path = config.get(ME, 'table_create_file')
+        table_create_path = get_table_config().get(ME, 'table_create_file')
         if '..' in table_create_path:
-            local.cwd.chdir(HERE)
-            full_table_filepath = local.path(table_create_path)
+            #relative to this module (no chdir: cwd is process-wide state)
+            full_table_filepath = path.normpath(path.join(HERE, table_create_path))
         else:
-            full_table_filepath = local.path(table_create_path)
-        self._logger.debug('-- full_table_filepath: {0}'.format(full_table_filepath))
+            full_table_filepath = path.abspath(table_create_path)
+        self._logger.debug('-- full_table_filepath: %s', full_table_filepath)
 
         full_create_string = ''
         with open(full_table_filepath, 'r') as file_handle:
             full_create_string = file_handle.read()
 
-        self._logger.debug('-- full_create_string: {0}'.format(full_create_string))
+        self._logger.debug('-- full_create_string: %s', full_create_string)
         return full_create_string
 
     def get_keys(self):
@@ -57,23 +66,24 @@ class snapshot_evecentral(Connection.SQLTable):
         tmp_primary_keys = []
         tmp_data_keys = []
         try:
-            tmp_primary_keys = config.get(ME, 'primary_keys').split(',')
-            tmp_data_keys = config.get(ME, 'data_keys').split(',')
-            self.index_key = config.get(ME, 'index_key') #FIXME: this is bad
+            tmp_primary_keys = get_table_config().get(ME, 'primary_keys').split(',')
+            tmp_data_keys = get_table_config().get(ME, 'data_keys').split(',')
+            self.index_key = get_table_config().get(ME, 'index_key') #FIXME: this is bad
         except KeyError as error_msg:
-            self._logger.error(
-                'EXCEPTION: keys missing' +
-                '\r\tprimary_keys={0}'.format(','.join(tmp_primary_keys)) +
-                '\r\tdata_keys={0}'.format(','.join(tmp_data_keys)) +
-                '\r\tindex_key={0}'.format(self.index_key),
-                exc_info=True
+            table_utils.log_fields(
+                self._logger, logging.ERROR, 'EXCEPTION: Keys missing',
+                exc_info=True,
+                primary_keys=tmp_primary_keys,
+                data_keys=tmp_data_keys,
+                index_key=self.index_key
             )
             raise Connection.TableKeysMissing(error_msg, ME)
 
-        self._logger.debug(
-            '\r\tprimary_keys={0}'.format(','.join(tmp_primary_keys)) +
-            '\r\tdata_keys={0}'.format(','.join(tmp_data_keys)) +
-            '\r\tindex_key={0}'.format(self.index_key)
+        table_utils.log_fields(
+            self._logger, logging.DEBUG, 'keys validated:',
+            primary_keys=tmp_primary_keys,
+            data_keys=tmp_data_keys,
+            index_key=self.index_key
         )
 
         return tmp_primary_keys, tmp_data_keys
@@ -82,23 +92,27 @@ class snapshot_evecentral(Connection.SQLTable):
         '''save info about table/datasource'''
         #TODO move up?
         self._logger.info('snapshot_evecentral._set_info()')
-        return CONNECTION_VALUES['table'], CONNECTION_VALUES['schema']
+        return connection_values()['table'], connection_values()['schema']
+
+    def get_connection_values(self):
+        '''get host/port/schema/user (+pool settings) for the pool key'''
+        return connection_values()
 
     def get_connection(self):
-        '''get con/cur for db connections'''
+        '''open a new connection; SQLTable pools and hands these out per query'''
         self._logger.info('snapshot_evecentral.get_connection()')
         #self._logger.debug(str(CONNECTION_VALUES))
         #FIXME vvv try/exception
+        import mysql.connector
         tmp_connection = mysql.connector.connect(
-            user    =CONNECTION_VALUES['user'],
-            password=CONNECTION_VALUES['passwd'],
-            database=CONNECTION_VALUES['schema'],
-            host    =CONNECTION_VALUES['host'],
-            port    =CONNECTION_VALUES['port']
+            user    =connection_values()['user'],
+            password=connection_values()['passwd'],
+            database=connection_values()['schema'],
+            host    =connection_values()['host'],
+            port    =connection_values()['port']
         )
-        tmp_cursor = tmp_connection.cursor()
 
-        return tmp_connection, tmp_cursor
+        return tmp_connection
 
     def test_table(self):
         '''test table connection/contents'''
@@ -107,14 +121,14 @@ class snapshot_evecentral(Connection.SQLTable):
         self._logger.info('-- table exists test: START')
         try:
             self.test_table_exists(
-                CONNECTION_VALUES['table'],
-                CONNECTION_VALUES['schema']
+                connection_values()['table'],
+                connection_values()['schema']
             )
         except Exception as error_msg:
-            self._logger.error(
-                'EXCEPTION: Table does not exist, unable to fix' +
-                '\r\ttable={0}.{1}'.format(CONNECTION_VALUES['schema'],CONNECTION_VALUES['table']),
-                exc_info=True
+            table_utils.log_fields(
+                self._logger, logging.ERROR, 'EXCEPTION: Table does not exist, unable to fix',
+                exc_info=True,
+                table='{0}.{1}'.format(connection_values()['schema'], connection_values()['table'])
             )
             raise error_msg
 
@@ -124,15 +138,15 @@ class snapshot_evecentral(Connection.SQLTable):
         self._logger.info('-- table headers test: START')
         try:
             self.test_table_headers(
-                CONNECTION_VALUES['table'],
-                CONNECTION_VALUES['schema'],
+                connection_values()['table'],
+                connection_values()['schema'],
                 self.all_keys,
             )
         except Exception as error_msg:
-            self._logger.error(
-                'EXCEPTION: table headers missmatch' +
-                '\r\ttable={0}.{1}'.format(CONNECTION_VALUES['schema'],CONNECTION_VALUES['table']),
-                exc_info=True
+            table_utils.log_fields(
+                self._logger, logging.ERROR, 'EXCEPTION: table headers missmatch',
+                exc_info=True,
+                table='{0}.{1}'.format(connection_values()['schema'], connection_values()['table'])
             )
             raise error_msg
 
@@ -255,7 +269,7 @@ def build_sample_dataframe(days, frequency):
 
 ## MAIN = TEST ##
 if __name__ == '__main__':
-    print(ME)
+    from prosper.common.prosper_logging import create_logger
     DEBUG = True
     DEBUG_LOGGER = create_logger(
         'debug_snapshot_evecentral',
@@ -268,7 +282,7 @@ if __name__ == '__main__':
     #print(CONNECTION_VALUES)
     SAMPLE_DATA_FRAME = build_sample_dataframe(2, 12)
     TEST_OBJECT = snapshot_evecentral(
-        CONNECTION_VALUES['table'],
+        connection_values()['table'],
         debug=DEBUG,
         loging_handle=DEBUG_LOGGER
     )
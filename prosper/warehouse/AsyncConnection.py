@@ -0,0 +1,132 @@
+'''AsyncConnection.py: asyncio facade for Database/SQLTable datasources
+
+Blocking driver calls run on one shared, bounded ThreadPoolExecutor so an
+event loop can keep many queries in flight without a thread per call.
+Concurrency against the db is further capped by each ConnectionPool.
+
+'''
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import logging
+#use NullHandler to avoid "NoneType is not Scriptable" exceptions
+DEFAULT_LOGGER = logging.getLogger('NULL')
+DEFAULT_LOGGER.addHandler(logging.NullHandler())
+
+import prosper.warehouse.FetchConnection as FetchConnection
+
+DEFAULT_MAX_WORKERS = 16
+
+EXECUTOR = None
+EXECUTOR_LOCK = threading.Lock()
+
+def get_executor(max_workers=DEFAULT_MAX_WORKERS):
+    '''process-wide executor for warehouse I/O (built on first use)'''
+    global EXECUTOR
+    with EXECUTOR_LOCK:
+        if EXECUTOR is None:
+            EXECUTOR = ThreadPoolExecutor(max_workers=max_workers)
+        return EXECUTOR
+
+def shutdown_executor(wait=True):
+    '''stop the shared executor (next get_executor() builds a new one)'''
+    global EXECUTOR
+    with EXECUTOR_LOCK:
+        if EXECUTOR is not None:
+            EXECUTOR.shutdown(wait=wait)
+            EXECUTOR = None
+
+class AsyncDatabase:
+    '''awaitable wrapper around a Database object
+
+    Args:
+        database (:obj:`prosper.warehouse.Connection.Database`): datasource to wrap
+        executor (:obj:`concurrent.futures.Executor`, optional): defaults to get_executor()
+
+    Other attributes (table_name, data_keys...) pass through to database.
+
+    '''
+    def __init__(self, database, executor=None):
+        self.database = database
+        self._executor = executor
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    def __str__(self):
+        return str(self.database)
+
+    async def _run(self, func, *args, **kwargs):
+        '''run a blocking call on the executor'''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor or get_executor(),
+            functools.partial(func, *args, **kwargs)
+        )
+
+    async def validate_table(self, force=False):
+        '''await Database.validate_table()'''
+        return await self._run(self.database.validate_table, force=force)
+
+    async def get_data(self, datetime_start, *args, **kwargs):
+        '''await Database.get_data(): same args'''
+        return await self._run(self.database.get_data, datetime_start, *args, **kwargs)
+
+    async def put_data(self, payload):
+        '''await Database.put_data()'''
+        return await self._run(self.database.put_data, payload)
+
+    async def latest_entry(self, **kwargs):
+        '''await Database.latest_entry()'''
+        return await self._run(self.database.latest_entry, **kwargs)
+
+    def iter_data(self, datetime_start, *args, **kwargs):
+        '''async-iterate SQLTable.iter_data() chunks: `async for frame in table.iter_data(...)`'''
+        return AsyncChunkIterator(
+            self,
+            functools.partial(self.database.iter_data, datetime_start, *args, **kwargs)
+        )
+
+class AsyncChunkIterator:
+    '''drives a blocking chunk generator from the executor, one chunk per await'''
+    def __init__(self, async_database, generator_func):
+        self._async_database = async_database
+        self._generator_func = generator_func
+        self._generator = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._generator is None:
+            #building the generator is free; first next() does the query
+            self._generator = self._generator_func()
+        chunk = await self._async_database._run(next, self._generator, None)
+        if chunk is None:
+            raise StopAsyncIteration
+        return chunk
+
+    async def aclose(self):
+        '''release the cursor/connection when abandoning early'''
+        if self._generator is not None:
+            await self._async_database._run(self._generator.close)
+
+async def fetch_data_source(family_name, datasource_name=None, **kwargs):
+    '''awaitable FetchConnection.fetch_data_source(), returns an AsyncDatabase
+
+    Args: same as FetchConnection.fetch_data_source()
+
+    '''
+    loop = asyncio.get_running_loop()
+    database = await loop.run_in_executor(
+        get_executor(),
+        functools.partial(
+            FetchConnection.fetch_data_source,
+            family_name,
+            datasource_name,
+            **kwargs
+        )
+    )
+    return AsyncDatabase(database)
@@ -0,0 +1,343 @@
+'''BulkLoader.py: high-throughput write paths for SQLTable.put_data()'''
+
+import csv
+import os
+import tempfile
+import time
+import threading
+import logging
+
+import prosper.warehouse.PostgresBackend as table_postgres
+#use NullHandler to avoid "NoneType is not Scriptable" exceptions
+DEFAULT_LOGGER = logging.getLogger('NULL')
+DEFAULT_LOGGER.addHandler(logging.NullHandler())
+
+DEFAULT_BATCH_SIZE = 5000
+
+class WriteStrategy:
+    '''enumeration for put_data() write paths'''
+    ToSQL = 'to_sql'                #pandas.DataFrame.to_sql on sqlite, batch_insert on MySQL
+    BatchInsert = 'batch_insert'    #multi-row INSERT ... VALUES (),(),...
+    ExecuteMany = 'executemany'     #server-side prepared INSERT, executemany
+    LoadData = 'load_data'          #LOAD DATA LOCAL INFILE from a temp CSV
+    Upsert = 'upsert'               #batched INSERT ... ON DUPLICATE KEY UPDATE
+    NOTDEFINED = 'NOTDEFINED'
+
+    def set_write_strategy(self, string_enum):
+        '''roll enum from string'''
+        for strategy in (
+                self.ToSQL, self.BatchInsert, self.ExecuteMany, self.LoadData, self.Upsert
+        ):
+            if string_enum.lower() == strategy:
+                return strategy
+
+        return self.NOTDEFINED
+
+WRITE_STATS = {}    #strategy: {'calls', 'rows', 'seconds'}
+STATS_LOCK = threading.Lock()
+
+def _record_stats(strategy, rows, seconds):
+    '''accumulate per-strategy throughput for write_stats()'''
+    with STATS_LOCK:
+        stats = WRITE_STATS.setdefault(strategy, {'calls': 0, 'rows': 0, 'seconds': 0.0})
+        stats['calls'] += 1
+        stats['rows'] += rows
+        stats['seconds'] += seconds
+
+def write_stats():
+    '''per-strategy totals + rows/sec since process start (or reset_write_stats())'''
+    with STATS_LOCK:
+        report = {}
+        for strategy, stats in WRITE_STATS.items():
+            report[strategy] = dict(stats)
+            report[strategy]['rows_per_sec'] = \
+                stats['rows'] / stats['seconds'] if stats['seconds'] else None
+        return report
+
+def reset_write_stats():
+    '''zero the per-strategy counters'''
+    with STATS_LOCK:
+        WRITE_STATS.clear()
+
+def quote_name(name):
+    '''MySQL identifier quoting (`character` etc are reserved words)'''
+    return '`{0}`'.format(name.replace('`', '``'))
+
+def quote_postgres_name(name):
+    '''Postgres identifier quoting (keeps mixed-case names like orderCount intact)'''
+    return '"{0}"'.format(name.replace('"', '""'))
+
+def frame_to_rows(payload):
+    '''DataFrame -> list of row tuples of native python values (NULL-safe)
+
+    mysql.connector can't convert numpy scalars/pandas.Timestamp, so convert
+    column-wise (vectorized) before zipping into rows.
+
+    '''
+    columns = []
+    for column_name in payload.columns:
+        series = payload[column_name]
+        if str(series.dtype).startswith('datetime64'):
+            values = list(series.dt.to_pydatetime())
+        else:
+            values = series.tolist()
+        null_mask = series.isnull().values
+        if null_mask.any():
+            values = [None if is_null else value for value, is_null in zip(values, null_mask)]
+        columns.append(values)
+
+    return list(zip(*columns))
+
+def _insert_prefix(table_name, columns):
+    '''INSERT INTO `table` (`a`,`b`) VALUES'''
+    return 'INSERT INTO {table} ({columns}) VALUES '.format(
+        table=quote_name(table_name),
+        columns=','.join(quote_name(column) for column in columns)
+    )
+
+def batch_insert(
+        connection,
+        table_name,
+        columns,
+        rows,
+        batch_size=DEFAULT_BATCH_SIZE,
+        update_columns=None
+):
+    '''multi-row INSERT: one statement + round trip per batch_size rows
+
+    update_columns turns the batch into an upsert: existing keys get those
+    columns overwritten (ON DUPLICATE KEY UPDATE) instead of failing the batch.
+
+    '''
+    row_placeholder = '(' + ','.join(['%s'] * len(columns)) + ')'
+    prefix = _insert_prefix(table_name, columns)
+    suffix = ''
+    if update_columns:
+        suffix = ' ON DUPLICATE KEY UPDATE ' + ','.join(
+            '{0}=VALUES({0})'.format(quote_name(column)) for column in update_columns
+        )
+    full_batch_sql = prefix + ','.join([row_placeholder] * batch_size) + suffix
+
+    cursor = connection.cursor()
+    for offset in range(0, len(rows), batch_size):
+        batch = rows[offset:offset + batch_size]
+        if len(batch) == batch_size:
+            query_str = full_batch_sql
+        else:
+            query_str = prefix + ','.join([row_placeholder] * len(batch)) + suffix
+        cursor.execute(query_str, [value for row in batch for value in row])
+    cursor.close()
+
+def execute_many(connection, table_name, columns, rows, batch_size=DEFAULT_BATCH_SIZE):
+    '''prepared INSERT: statement parsed once server-side, rows streamed through it'''
+    query_str = _insert_prefix(table_name, columns) + \
+        '(' + ','.join(['%s'] * len(columns)) + ')'
+
+    cursor = connection.cursor(prepared=True)
+    for offset in range(0, len(rows), batch_size):
+        cursor.executemany(query_str, rows[offset:offset + batch_size])
+    cursor.close()
+
+def sqlite_insert(connection, table_name, columns, rows, replace=False):
+    '''sqlite: one prepared INSERT stepped per row inside the caller's transaction
+
+    In-process, so there's no round trip to batch away; executemany reuses
+    the compiled statement.  replace=True is the upsert (INSERT OR REPLACE:
+    the row is rewritten whole, so every non-key column is "updated").
+
+    '''
+    query_str = 'INSERT {verb}INTO {table} ({columns}) VALUES ({values})'.format(
+        verb='OR REPLACE ' if replace else '',
+        table=quote_name(table_name),
+        columns=','.join(quote_name(column) for column in columns),
+        values=','.join(['?'] * len(columns))
+    )
+    cursor = connection.cursor()
+    cursor.executemany(query_str, rows)
+    cursor.close()
+
+def load_data_infile(connection, table_name, payload, temp_dir=None):
+    '''LOAD DATA LOCAL INFILE from a CSV dump of payload
+
+    Note:
+        mysql.connector only streams LOCAL INFILE from a path, so the buffer
+        is a temp file (removed afterwards).  Server needs local_infile=ON.
+
+    '''
+    export_frame = payload.copy()
+    for column_name in export_frame.columns:
+        #TINYINT columns want 1/0, not True/False
+        if export_frame[column_name].dtype == bool:
+            export_frame[column_name] = export_frame[column_name].astype('int8')
+
+    file_handle = tempfile.NamedTemporaryFile(
+        'w',
+        suffix='.csv',
+        dir=temp_dir,
+        delete=False,
+        newline=''
+    )
+    try:
+        with file_handle:
+            export_frame.to_csv(
+                file_handle,
+                header=False,
+                index=False,
+                na_rep='\\N',
+                date_format='%Y-%m-%d %H:%M:%S',
+                quoting=csv.QUOTE_MINIMAL
+            )
+
+        query_str = \
+            '''LOAD DATA LOCAL INFILE %s
+            INTO TABLE {table}
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+            LINES TERMINATED BY '\\n'
+            ({columns})'''.format(
+                table=quote_name(table_name),
+                columns=','.join(quote_name(column) for column in export_frame.columns)
+            )
+        cursor = connection.cursor()
+        cursor.execute(query_str, (file_handle.name,))
+        cursor.close()
+    finally:
+        os.remove(file_handle.name)
+
+def bulk_write(
+        connection,
+        payload,
+        table_name,
+        schema_name=None,
+        strategy=WriteStrategy.BatchInsert,
+        batch_size=DEFAULT_BATCH_SIZE,
+        temp_dir=None,
+        update_columns=None,
+        dialect=None,
+        logger=DEFAULT_LOGGER
+):
+    '''push a DataFrame with the requested strategy, in one transaction
+
+    Args:
+        connection (:obj:`DB-API connection`): borrowed connection
+        payload (:obj:`pandas.DataFrame`): data, index named after index_key
+        table_name (str): target table
+        schema_name (str): target schema (unused: the connection is already on it)
+        strategy (str): WriteStrategy value
+        batch_size (int): rows per statement/round trip
+        temp_dir (str, optional): where load_data writes its CSV
+        update_columns (:obj:`list`, optional): upsert only: columns to overwrite
+            on key collision (defaults to every non-index column)
+        dialect (str, optional): TableType value; 'SQLite' routes every row-wise
+            strategy through sqlite_insert(), 'Postgres' every strategy through COPY
+        logger (:obj:`logging.logger`): logging handle
+
+    Returns:
+        (:obj:`dict`): strategy, rows, seconds, rows_per_sec
+
+    '''
+    start_time = time.perf_counter()
+    row_count = len(payload)
+
+    is_sqlite = str(dialect).lower() == 'sqlite'
+    is_postgres = str(dialect).lower() == 'postgres'
+    if is_postgres:
+        flat_frame = payload.reset_index() if payload.index.name else payload
+        try:
+            if strategy == WriteStrategy.Upsert:
+                table_postgres.copy_upsert(
+                    connection,
+                    table_name,
+                    flat_frame,
+                    update_columns or list(payload.columns),
+                    quote_postgres_name,
+                    chunk_rows=batch_size
+                )
+            elif strategy in (
+                    WriteStrategy.ToSQL, WriteStrategy.BatchInsert,
+                    WriteStrategy.ExecuteMany, WriteStrategy.LoadData
+            ):
+                #COPY FROM STDIN beats every INSERT form; strategies only differ on MySQL
+                table_postgres.copy_from_frame(
+                    connection,
+                    table_name,
+                    flat_frame,
+                    quote_postgres_name,
+                    chunk_rows=batch_size
+                )
+            else:
+                raise UnsupportedWriteStrategy(
+                    'unsupported write strategy: {0}'.format(strategy)
+                )
+        except Exception:
+            connection.rollback()
+            raise
+        connection.commit()
+    elif strategy == WriteStrategy.ToSQL and is_sqlite:
+        #pandas speaks sqlite3 natively
+        payload.to_sql(name=table_name, con=connection, if_exists='append')
+    else:
+        flat_frame = payload.reset_index() if payload.index.name else payload
+        columns = list(flat_frame.columns)
+        try:
+            if is_sqlite and strategy in (
+                    WriteStrategy.BatchInsert, WriteStrategy.ExecuteMany, WriteStrategy.Upsert
+            ):
+                sqlite_insert(
+                    connection,
+                    table_name,
+                    columns,
+                    frame_to_rows(flat_frame),
+                    replace=strategy == WriteStrategy.Upsert
+                )
+            elif is_sqlite and strategy == WriteStrategy.LoadData:
+                raise UnsupportedWriteStrategy('load_data is MySQL-only; use batch_insert')
+            elif strategy in (WriteStrategy.BatchInsert, WriteStrategy.ToSQL):
+                #pandas only writes through SQLAlchemy or sqlite3: plain INSERT on MySQL
+                batch_insert(connection, table_name, columns, frame_to_rows(flat_frame), batch_size)
+            elif strategy == WriteStrategy.ExecuteMany:
+                execute_many(connection, table_name, columns, frame_to_rows(flat_frame), batch_size)
+            elif strategy == WriteStrategy.LoadData:
+                load_data_infile(connection, table_name, flat_frame, temp_dir)
+            elif strategy == WriteStrategy.Upsert:
+                batch_insert(
+                    connection,
+                    table_name,
+                    columns,
+                    frame_to_rows(flat_frame),
+                    batch_size,
+                    update_columns=update_columns or list(payload.columns)
+                )
+            else:
+                raise UnsupportedWriteStrategy(
+                    'unsupported write strategy: {0}'.format(strategy)
+                )
+        except Exception:
+            connection.rollback()
+            raise
+        connection.commit()
+
+    elapsed = time.perf_counter() - start_time
+    _record_stats(strategy, row_count, elapsed)
+    report = {
+        'strategy': strategy,
+        'rows': row_count,
+        'seconds': elapsed,
+        'rows_per_sec': row_count / elapsed if elapsed else None
+    }
+    logger.info(
+        '-- bulk_write: %s rows=%d seconds=%.3f',
+        report['strategy'], report['rows'], report['seconds']
+    )
+    return report
+
+class BulkLoaderException(Exception):
+    '''base class for bulk-write exceptions'''
+    def __init__(self, error_msg):
+        self.error_msg = error_msg
+
+    def __str__(self):
+        return self.error_msg
+
+class UnsupportedWriteStrategy(BulkLoaderException):
+    '''write_strategy not known'''
+    pass
@@ -0,0 +1,180 @@
+'''ColumnDecoder.py: cursor batches -> preallocated numpy columns -> DataFrame
+
+pandas.read_sql/DataFrame.from_records hold every row tuple of a result
+before building columns (and infer dtypes afterwards).  Here rows are pulled
+fetchmany() batch by batch and written straight into one typed numpy array
+per column, so only one batch of python tuples is alive at a time and the
+DataFrame wraps the arrays without another copy.
+
+Each batch is converted in C (numpy.array(rows, dtype=<record dtype>));
+batches numpy can't convert whole (odd values) go column by column instead.
+Integer and bool columns are read as python objects and checked before the
+cast: numpy would silently turn NULL into False and 1.5 into 1.
+
+'''
+
+import logging
+#use NullHandler to avoid "NoneType is not Scriptable" exceptions
+DEFAULT_LOGGER = logging.getLogger('NULL')
+DEFAULT_LOGGER.addHandler(logging.NullHandler())
+
+import prosper.warehouse.Utilities as table_utils
+
+numpy = table_utils.lazy_import('numpy')
+pandas = table_utils.lazy_import('pandas')
+
+DEFAULT_BATCH_ROWS = 50000
+MIN_CAPACITY = 1024
+CHECKED_KINDS = 'biu'   #numpy kinds that can't hold NULLs (or fractions)
+NONE_TYPE = type(None)
+
+def storage_dtype(dtype):
+    '''numpy dtype a column is decoded into (object: categories/strings/unknown)'''
+    if dtype is None or not isinstance(dtype, str) or dtype in ('str', 'string'):
+        return numpy.dtype(object)
+    return numpy.dtype(dtype)
+
+class ColumnBuffer:
+    '''one growable, typed column
+
+    Integer columns that turn out to hold NULLs or fractional values are
+    promoted to float64 (NaN), bools with NULLs to object (inferred at the
+    end, so 1/NULL/0 comes back 1.0/NaN/0.0): what TypeMap.apply_dtypes()
+    keeps.  Anything else numpy can't take falls back to object and is left
+    for apply_dtypes() to cast.
+
+    '''
+    def __init__(self, name, dtype, capacity):
+        self.name = name
+        self.dtype = dtype
+        self.values = numpy.empty(capacity, dtype=storage_dtype(dtype))
+
+    def grow(self, capacity):
+        '''reallocate to capacity rows (keeps contents)'''
+        grown = numpy.empty(capacity, dtype=self.values.dtype)
+        grown[:len(self.values)] = self.values
+        self.values = grown
+
+    @property
+    def checked(self):
+        '''int/bool storage: values are checked before numpy casts them'''
+        return self.values.dtype.kind in CHECKED_KINDS
+
+    def _promote(self, column_values):
+        '''widen int/bool storage that can't hold this batch as-is
+
+        NULLs: int -> float64, bool -> object.  Fractional floats: int -> float64.
+
+        '''
+        value_types = set(map(type, column_values))
+        if NONE_TYPE in value_types:
+            self.values = self.values.astype('float64' if self.values.dtype.kind in 'iu' else object)
+        elif self.values.dtype.kind in 'iu' and \
+             any(issubclass(value_type, float) for value_type in value_types) and \
+             not all(value.is_integer() for value in column_values if isinstance(value, float)):
+            self.values = self.values.astype('float64')
+
+    def write_array(self, offset, array):
+        '''copy one batch (a record-array field) into place'''
+        if self.checked and array.dtype == object:
+            self.write(offset, array)
+            return
+        self.values[offset:offset + len(array)] = array
+
+    def write(self, offset, column_values):
+        '''copy one batch of python values into rows [offset, offset+len)'''
+        if self.checked:
+            self._promote(column_values)
+        end = offset + len(column_values)
+        try:
+            self.values[offset:end] = column_values
+            return
+        except (TypeError, ValueError, OverflowError):
+            pass
+
+        self.values = self.values.astype(object)
+        #astype() copies into an array this buffer owns (finish() can shrink it)
+        self.write(offset, column_values)
+
+    def finish(self, rows):
+        '''trim to rows and hand back a DataFrame-ready column (no copy for numpy dtypes)'''
+        if len(self.values) != rows:
+            if self.values.dtype == object:
+                self.values = self.values[:rows]
+            else:
+                self.values.resize(rows, refcheck=False)   #shrink in place: no copy
+        if isinstance(self.dtype, pandas.CategoricalDtype):
+            return pandas.Categorical(self.values, dtype=self.dtype)
+        if self.values.dtype == object:
+            return pandas.Series(self.values, copy=False).infer_objects()
+        return self.values
+
+def _to_records(batch, buffers):
+    '''batch of row tuples -> numpy record array in the buffers' dtypes, or None
+
+    int/bool fields stay python objects here: ColumnBuffer.write() checks them.
+
+    '''
+    try:
+        record_dtype = numpy.dtype([
+            (buffer.name, object if buffer.checked else buffer.values.dtype)
+            for buffer in buffers
+        ])
+        return numpy.array(batch, dtype=record_dtype)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+def decode_cursor(
+        cursor,
+        dtypes,
+        batch_rows=DEFAULT_BATCH_ROWS,
+        logger=DEFAULT_LOGGER
+):
+    '''drain an executed cursor into a DataFrame, column-wise
+
+    Args:
+        cursor (:obj:`DB-API cursor`): cursor with a SELECT already executed
+        dtypes (:obj:`dict`): {column: dtype} (TypeMap); unknown columns decode
+            as object and are inferred at the end
+        batch_rows (int): rows per fetchmany()
+        logger (:obj:`logging.logger`): logging handle
+
+    Returns:
+        (:obj:`pandas.DataFrame`)
+
+    '''
+    column_names = [description[0] for description in cursor.description]
+    #buffered MySQL cursors know the result size; sqlite reports -1
+    expected_rows = cursor.rowcount if cursor.rowcount and cursor.rowcount > 0 else 0
+    capacity = max(expected_rows, MIN_CAPACITY)
+    buffers = [
+        ColumnBuffer(column_name, dtypes.get(column_name), capacity)
+        for column_name in column_names
+    ]
+
+    rows = 0
+    while True:
+        batch = cursor.fetchmany(batch_rows)
+        if not batch:
+            break
+        batch_size = len(batch)
+        if rows + batch_size > capacity:
+            capacity = max(capacity * 2, rows + batch_size)
+            for buffer in buffers:
+                buffer.grow(capacity)
+        records = _to_records(batch, buffers)
+        if records is not None:
+            for buffer in buffers:
+                buffer.write_array(rows, records[buffer.name])
+        else:
+            for buffer, column_values in zip(buffers, zip(*batch)):
+                buffer.write(rows, column_values)
+        rows += batch_size
+        del batch, records
+
+    logger.debug('-- decode_cursor: rows=%d columns=%d', rows, len(column_names))
+    return pandas.DataFrame(
+        {buffer.name: buffer.finish(rows) for buffer in buffers},
+        columns=column_names,
+        copy=False
+    )
@@ -1,21 +1,41 @@
 '''connection.py: a framework for defining/managing database connections'''
 
 import abc
-import importlib.util
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import logging
 #use NullHandler to avoid "NoneType is not Scriptable" exceptions
 DEFAULT_LOGGER = logging.getLogger('NULL')
 DEFAULT_LOGGER.addHandler(logging.NullHandler())
 
-from plumbum import local
-import pandas
-
 import prosper.warehouse.Utilities as table_utils #TODO, required?
+import prosper.warehouse.ConnectionPool as table_pool
+import prosper.warehouse.SchemaCache as table_schema
+import prosper.warehouse.BulkLoader as table_bulk
+import prosper.warehouse.QueryBuilder as table_query
+import prosper.warehouse.LocalCache as table_local
+import prosper.warehouse.TypeMap as table_types
+import prosper.warehouse.ResultCache as table_results
+import prosper.warehouse.Metrics as table_metrics
+import prosper.warehouse.SQLiteBackend as table_sqlite
+import prosper.warehouse.PostgresBackend as table_postgres
+import prosper.warehouse.ColumnDecoder as table_decode
+import prosper.warehouse.MemMapStore as table_memmap
+import prosper.warehouse.Profiler as table_profile
+
+pandas = table_utils.lazy_import('pandas')
+numpy = table_utils.lazy_import('numpy')
+
+DEFAULT_CHUNK_SIZE = 10000
 
 class TableType:
     '''enumeration for tabletypes'''
     MySQL = 'MySQL'
     Postgres = 'Postgres'
+    SQLite = 'SQLite'
+    MemMap = 'MemMap'
     NOTDEFINED = 'NOTDEFINED'
 
     def set_table_type(self, string_enum):
@@ -24,23 +44,47 @@ class TableType:
             return self.MySQL
         elif string_enum.lower() == 'postgres':
             return self.Postgres
+        elif string_enum.lower() == 'sqlite':
+            return self.SQLite
+        elif string_enum.lower() == 'memmap':
+            return self.MemMap
 
         else:
             return self.NOTDEFINED
 
+class SliceMode:
+    '''enumeration for get_data(slices=N) range splitting'''
+    Fixed = 'fixed'         #equal-width time ranges
+    Adaptive = 'adaptive'   #equal row counts, from per-day counts
+
 class Database(metaclass=abc.ABCMeta):
     '''parent class for holding database connection info'''
     _debug = False
     _logger = None
-    def __init__(self, datasource_name, debug=False, loging_handle=DEFAULT_LOGGER):
-        '''basic info about all databases'''
+    def __init__(
+            self,
+            datasource_name,
+            debug=False,
+            loging_handle=DEFAULT_LOGGER,
+            lazy=False
+    ):
+        '''basic info about all databases
+
+        Args:
+            datasource_name (str): name of datasource
+            debug (bool): debug mode
+            loging_handle (:obj:`logging.logger`): logging handle
+            lazy (bool): skip test_table() until first get_data()/put_data()
+
+        '''
         self._debug = debug
         self._logger = loging_handle
-        self._logger.info(
-            'Database __init__(' +
-            '\r\tdatasouce_name={0},'.format(datasource_name) +
-            '\r\tdebug={0},'.format(str(debug)) +
-            '\r\tlogger={0})'.format(str(loging_handle))
+        table_utils.log_fields(
+            self._logger, logging.INFO, 'Database __init__()',
+            datasource_name=datasource_name,
+            debug=debug,
+            loging_handle=loging_handle,
+            lazy=lazy
         )
 
         self._logger.debug('-- Global Setup')
@@ -57,6 +101,60 @@ class Database(metaclass=abc.ABCMeta):
         self._logger.info('--DATABASE: got keys from config')
 
         self.table_type = self._define_table_type()
+        self._profiler = None
+        profile_path, profile_sample_rate, profile_memory = self._profile_settings()
+        if profile_path:
+            self.set_profiling(profile_path, profile_sample_rate, profile_memory)
+        self._table_ready = False
+        self._validating = False
+        self._validate_lock = threading.RLock()
+        if not lazy:
+            self.validate_table()
+
+    def validate_table(self, force=False):
+        '''run test_table() once per process/schema-fingerprint
+
+        Safe to call from many threads: one runs test_table(), the others wait
+        for it instead of racing it to CREATE TABLE.
+
+        Args:
+            force (bool): ignore validation caches and re-run test_table()
+
+        '''
+        if self._table_ready and not force:
+            return
+
+        with self._validate_lock:
+            if self._validating:
+                #test_table() calling back into get_data() (latest_entry) on this thread
+                return
+            if self._table_ready and not force:
+                #another thread finished validating while this one waited
+                return
+            self._validating = True
+            try:
+                self._validate_table(force)
+            finally:
+                self._validating = False
+
+    def _validate_table(self, force):
+        '''validate_table() body: caller holds _validate_lock'''
+        validation_key = self._validation_key()
+        fingerprint = self._schema_fingerprint()
+        cache_path, cache_ttl = self._schema_cache_settings()
+        if not force and table_schema.is_validated(
+                validation_key,
+                fingerprint,
+                cache_path=cache_path,
+                ttl=cache_ttl,
+                logger=self._logger
+        ):
+            self._logger.info('-- test_table skipped: schema already validated')
+            self._table_ready = True
+            return
+
+        #_table_ready only flips after test_table() passes: other threads keep waiting
+        self._table_ready = False
         try:
             self.test_table()
         except Exception as error_msg:
@@ -66,6 +164,124 @@ class Database(metaclass=abc.ABCMeta):
             )
             raise error_msg
 
+        table_schema.mark_validated(
+            validation_key,
+            fingerprint,
+            cache_path=cache_path,
+            logger=self._logger
+        )
+        self._table_ready = True
+
+    def _validation_key(self):
+        '''identifies the physical table for validation caching'''
+        return (self.table_type, self.datasource_name)
+
+    def _schema_fingerprint(self):
+        '''what test_table() validated against: a change forces re-validation'''
+        return table_schema.schema_fingerprint(self.table_type, self.all_keys)
+
+    def _schema_cache_settings(self):
+        '''(cache_path, ttl) for on-disk validation cache.  Off by default'''
+        return None, None
+
+    def _profile_settings(self):
+        '''(report_path, sample_rate, memory) for get_data()/put_data() profiling.  Off by default'''
+        return None, table_profile.DEFAULT_SAMPLE_RATE, False
+
+    def set_profiling(
+            self,
+            report_path=None,
+            sample_rate=table_profile.DEFAULT_SAMPLE_RATE,
+            memory=False
+    ):
+        '''start/stop profiling get_data()/put_data() at runtime (see Profiler.py)
+
+        Args:
+            report_path (str, optional): report directory; None switches profiling off
+            sample_rate (int): profile 1 in sample_rate calls
+            memory (bool): also capture tracemalloc allocations
+
+        Returns:
+            (:obj:`Profiler.Profiler`): the attached profiler (None when off)
+
+        '''
+        if not report_path:
+            self._profiler = None
+            return None
+        self._profiler = table_profile.Profiler(
+            report_path,
+            self.datasource_name,
+            sample_rate=sample_rate,
+            memory=memory,
+            logger=self._logger
+        )
+        self._logger.info(
+            '-- profiling on: 1 in %d calls -> %s', self._profiler.sample_rate, report_path
+        )
+        return self._profiler
+
+    def _parse_query_args(
+            self,
+            datetime_start,
+            args,
+            limit=None,
+            kwargs_passthrough=None,
+            kwargs=None
+    ):
+        '''validate/normalize get_data()-style arguments
+
+        Returns:
+            (str): datetime_start
+            (tuple): data keys requested
+            (int): limit
+            (:obj:`dict`): filter kwargs
+
+        '''
+        kwargs = kwargs or {}
+        #**kwargs: filter query keys
+        #*args: data keys to return
+        if kwargs_passthrough:
+            self._logger.debug('-- received override kwargs: %s', list(kwargs_passthrough.keys()))
+            kwargs = kwargs_passthrough
+
+        if isinstance(datetime_start, int):
+            #assume "last x days"
+            self._logger.debug('-- type(datetime_start)=INT.  Converting to datetime')
+            datetime_start = table_utils.convert_days_to_datetime(datetime_start)
+
+        ## Test argument contents before executing ##
+        try:
+            table_utils.test_kwargs_headers(self.primary_keys, kwargs)
+        except Exception as error_msg:
+            table_utils.log_fields(
+                self._logger, logging.ERROR, 'EXCEPTION: query/kwarg keys invalid',
+                exc_info=True,
+                kwargs_keys=list(kwargs.keys()),
+                primary_keys=self.primary_keys
+            )
+            raise InvalidQueryKeys(error_msg, self.table_name)
+
+        try:
+            table_utils.test_args_headers(self.data_keys, args)
+        except Exception as error_msg:
+            table_utils.log_fields(
+                self._logger, logging.ERROR, 'EXCEPTION: data/args keys invalid',
+                exc_info=True,
+                args=args,
+                data_keys=self.data_keys
+            )
+            raise InvalidDataKeys(error_msg, self.table_name)
+
+        if isinstance(limit, int):
+            limit = abs(limit)
+        elif limit is not None: #<--FIXME: logic is kinda shitty
+            raise BadQueryModifier(
+                'limit badType: ' + str(type(limit)),
+                self.table_name
+            )
+        #TODO: test datetimes
+        return datetime_start, tuple(args), limit, kwargs
+
     def __str__(self):
         return self.datasource_name
 
@@ -120,7 +336,7 @@ class Database(metaclass=abc.ABCMeta):
         pass
 
     @abc.abstractmethod
-    def _direct_query(self, query_str):
+    def _direct_query(self, query_str, query_params=None):
         '''some tests require direct SQL execution.  Support those calls internally ONLY'''
         pass
 
@@ -130,19 +346,70 @@ class Database(metaclass=abc.ABCMeta):
         pass
 
 class SQLTable(Database):
-    '''child class for handling TimeSeries databases'''
+    '''child class for handling TimeSeries databases
 
-    def __init__(self, datasource_name, debug=False, loging_handle=DEFAULT_LOGGER):
-        '''Traditional SQL-style hook setup'''
+    One object can be shared by many threads: every query borrows its own
+    connection (and cursor) from the pool, and per-object caches carry their
+    own locks.
+
+    '''
+
+    def __init__(
+            self,
+            datasource_name,
+            debug=False,
+            loging_handle=DEFAULT_LOGGER,
+            lazy=False
+    ):
+        '''Traditional SQL-style hook setup.  No I/O here: the pool connects on first borrow'''
         self._logger = loging_handle
         self._logger.info('SQLTable __init__()')
-        self._connection,self._cursor = self.get_connection()
+        self.connection_values = self.get_connection_values()
+        self._pool = table_pool.get_pool(
+            self.connection_values,
+            self._open_connection,
+            logger=loging_handle
+        )
         self.table_name, self.schema_name = self._set_info()
-        super().__init__(datasource_name, debug, loging_handle)
+        self._watermarks = {}   #primary_keys values tuple: latest index_key (None: no rows)
+        self._watermark_lock = threading.Lock()
+        self._thread_state = threading.local()  #per-thread results (last_write_report)
+        super().__init__(datasource_name, debug, loging_handle, lazy)
+
+        self._local_cache = None
+        if self.connection_values.get('local_cache_path'):
+            self._local_cache = table_local.ColumnarCache(
+                self.connection_values['local_cache_path'],
+                self.datasource_name,
+                self.index_key,
+                [key for key in self.primary_keys if key],
+                max_bytes=self.connection_values['local_cache_max_mb'] * 1024 * 1024,
+                logger=self._logger
+            )
+
+        self._result_cache = None
+        if self.connection_values.get('result_cache_ttl'):
+            self._result_cache = table_results.ResultCache(
+                self.connection_values['result_cache_ttl'],
+                max_bytes=self.connection_values.get(
+                    'result_cache_max_mb', table_results.DEFAULT_MAX_MB
+                ) * 1024 * 1024,
+                logger=self._logger
+            )
+
+    @property
+    def last_write_report(self):
+        '''bulk_write() report of this thread's latest put_data() (None before one)'''
+        return getattr(self._thread_state, 'last_write_report', None)
+
+    @abc.abstractmethod
+    def get_connection_values(self):
+        '''get host/port/schema/user (+pool settings) from config'''
+        pass
 
     @abc.abstractmethod
     def get_connection(self):
-        '''get con[nection] for database handles'''
+        '''open a new con[nection] for database handles.  Used as the pool factory'''
         pass
 
     @abc.abstractmethod
@@ -150,27 +417,214 @@ class SQLTable(Database):
         '''get/parse table-create file'''
         pass
 
-    def _direct_query(self, query_str):
+    def _open_connection(self):
+        '''pool factory: embedded backends open here, server backends via get_connection()'''
+        if self.table_type == TableType.SQLite:
+            return table_sqlite.connect(
+                self.connection_values.get('sqlite_path'),
+                memory_name=self.schema_name,
+                logger=self._logger
+            )
+        elif self.table_type == TableType.Postgres:
+            return table_postgres.connect(self.connection_values, logger=self._logger)
+        return self.get_connection()
+
+    def _validation_key(self):
+        '''physical table identity: shared by every object pointing at it'''
+        return (
+            self.table_type,
+            self.connection_values['host'],
+            self.connection_values['port'],
+            self.schema_name,
+            self.table_name
+        )
+
+    def _schema_cache_settings(self):
+        '''(cache_path, ttl) from table_config.cfg'''
+        return (
+            self.connection_values.get('schema_cache_path'),
+            self.connection_values.get('schema_cache_ttl')
+        )
+
+    def _profile_settings(self):
+        '''(report_path, sample_rate, memory) from table_config.cfg'''
+        return (
+            self.connection_values.get('profile_path'),
+            self.connection_values.get('profile_sample_rate', table_profile.DEFAULT_SAMPLE_RATE),
+            self.connection_values.get('profile_memory', False)
+        )
+
+    def get_dtypes(self, refresh=False):
+        '''compact pandas dtypes for this table's columns (cached per process)
+
+        Column types come from INFORMATION_SCHEMA (MySQL), or from parsing the
+        table-create file (SQLite/Postgres, or if that query fails).  cfg `dtype_overrides`
+        (`column:dtype,...`) win over both.
+
+        Args:
+            refresh (bool): re-read the schema
+
+        Returns:
+            (:obj:`dict`): {column: dtype}
+
+        '''
+        cache_key = self._validation_key()
+        dtypes = None if refresh else table_types.get_cached(cache_key)
+        if dtypes is not None:
+            return dtypes
+
+        try:
+            if self.table_type in (TableType.SQLite, TableType.Postgres):
+                #sqlite only keeps type affinity, postgres has translated types:
+                #the create file has the real ones
+                raise UnsupportedTableType('no INFORMATION_SCHEMA', self.table_name)
+            column_types = dict(self._direct_query(
+                '''SELECT `COLUMN_NAME`, `COLUMN_TYPE`
+                    FROM `INFORMATION_SCHEMA`.`COLUMNS`
+                    WHERE `TABLE_SCHEMA`=%s
+                    AND `TABLE_NAME`=%s''',
+                (self.schema_name, self.table_name)
+            ))
+        except UnsupportedTableType:
+            column_types = table_types.parse_ddl(self.get_table_create_string())
+        except Exception:
+            self._logger.warning(
+                'WARNING: INFORMATION_SCHEMA lookup failed, parsing table_create_file',
+                exc_info=True
+            )
+            column_types = table_types.parse_ddl(self.get_table_create_string())
+
+        column_types = {
+            (name.decode('utf-8') if isinstance(name, bytes) else name):
+            (column_type.decode('utf-8') if isinstance(column_type, bytes) else column_type)
+            for name, column_type in column_types.items()
+        }
+        dtypes = table_types.build_dtype_map(
+            column_types,
+            index_key=self.index_key,
+            overrides=table_types.parse_overrides(
+                self.connection_values.get('dtype_overrides')
+            )
+        )
+        self._logger.debug('-- dtypes=%s', dtypes)
+        table_types.set_cached(cache_key, dtypes)
+        return dtypes
+
+    def _result_dtypes(self, columns=None):
+        '''get_dtypes() (for columns, default all), or None if cfg compact_dtypes=False
+
+        Resolve before _borrow_connection(): MySQL's INFORMATION_SCHEMA lookup
+        borrows a connection of its own, and asking the pool for a second one
+        while holding the first can stall until borrow_timeout.
+
+        '''
+        if not self.connection_values.get('compact_dtypes', True):
+            return None
+        dtypes = self.get_dtypes()
+        if columns is not None:
+            dtypes = {column: dtypes[column] for column in columns if column in dtypes}
+        return dtypes
+
+    def _apply_dtypes(self, pandas_dataframe, dtypes=None):
+        '''cast a decoded frame to _result_dtypes() (cfg compact_dtypes=False disables)
+
+        Args:
+            dtypes (:obj:`dict`, optional): already-resolved _result_dtypes()
+
+        '''
+        if dtypes is None:
+            dtypes = self._result_dtypes()
+        if dtypes is None:
+            return pandas_dataframe
+        return table_types.apply_dtypes(pandas_dataframe, dtypes, logger=self._logger)
+
+    @contextmanager
+    def _borrow_connection(self):
+        '''check a connection out of the shared pool for one query'''
+        with table_metrics.phase('connect'):
+            connection = self._pool.borrow()
+        try:
+            yield connection
+        except BaseException:
+            #connection state unknown (unread results, broken link, abandoned generator):
+            #don't recycle
+            self._pool.release(connection, discard=True)
+            raise
+
+        try:
+            #close out any read snapshot so the next borrower sees fresh data
+            connection.rollback()
+        except Exception:
+            self._pool.release(connection, discard=True)
+        else:
+            self._pool.release(connection)
+
+    def _read_frame(self, connection, query_string, query_params=None, dtypes=None):
+        '''execute + fetch + DataFrame build (what pandas.read_sql does), timed per phase
+
+        Args:
+            dtypes (:obj:`dict`, optional): _result_dtypes() to decode into; columns
+                left out are inferred from their values.  None: plain from_records()
+
+        '''
+        if self.table_type == TableType.Postgres:
+            #COPY TO STDOUT + C csv parser: no per-row python objects
+            with table_metrics.phase('fetch'):
+                return table_postgres.copy_to_frame(connection, query_string, query_params)
+
+        cursor = connection.cursor()
+        with table_metrics.phase('execute'):
+            cursor.execute(query_string, query_params)
+        if dtypes is not None and self.connection_values.get('fast_decode', True):
+            #fetch + build in one pass: batches land in typed numpy columns
+            with table_metrics.phase('fetch'):
+                pandas_dataframe = table_decode.decode_cursor(
+                    cursor,
+                    dtypes,
+                    logger=self._logger
+                )
+            cursor.close()
+            return pandas_dataframe
+
+        with table_metrics.phase('fetch'):
+            rows = cursor.fetchall()
+        column_names = [description[0] for description in cursor.description]
+        cursor.close()
+        with table_metrics.phase('build'):
+            pandas_dataframe = pandas.DataFrame.from_records(
+                rows,
+                columns=column_names,
+                coerce_float=True
+            )
+        return pandas_dataframe
+
+    @table_metrics.instrumented('direct_query')
+    def _direct_query(self, query_str, query_params=None):
         '''direct query for SQL tables'''
         #TODO: if/else check for every query seems wasteful, rework?
         self._logger.info('--_direct_query')
 
         #FIXME vvv do different coonections need different execute/fetch cmds?
-        if self.table_type == TableType.MySQL:
-            #MYSQL EXECUTE
+        if self.table_type in (TableType.MySQL, TableType.SQLite, TableType.Postgres):
+            #MYSQL/SQLITE/POSTGRES EXECUTE: plain DB-API
             try:
-                self._cursor.execute(query_str)
-                query_result = self._cursor.fetchall()
+                with self._borrow_connection() as connection:
+                    cursor = connection.cursor()
+                    with table_metrics.phase('execute'):
+                        if query_params is None:
+                            cursor.execute(query_str)
+                        else:
+                            cursor.execute(query_str, query_params)
+                    with table_metrics.phase('fetch'):
+                        query_result = cursor.fetchall()
+                    cursor.close()
+                    table_metrics.add_rows(len(query_result))
             except Exception as error_msg:
                 #log error one step up
                 raise error_msg
 
             return query_result
 
-        elif self.table_type == TableType.Postgres:
-            #POSTGRESS EXECUTE
-            raise NotImplementedError('Postgres not supported yet')
-
         else:
             raise UnsupportedTableType(
                 'unsupported table type: ' + str(self.table_type),
@@ -180,28 +634,36 @@ class SQLTable(Database):
     def _create_table(self, full_create_string):
         '''handles executing table-create query'''
         self._logger.info('--_create_table')
+        if self.table_type == TableType.SQLite:
+            full_create_string = table_sqlite.translate_ddl(full_create_string)
+        elif self.table_type == TableType.Postgres:
+            full_create_string = table_postgres.translate_ddl(full_create_string)
         command_list = full_create_string.split(';')
-        for command in command_list:
-            self._logger.debug('-- `{0}`'.format(command))
-            if command.startswith('--') or \
-               command == '\n':
-                #don't execute comments or blank lines
-                #FIXME hacky as fuck
-                continue
-
-            self._cursor.execute(command)
-            self._connection.commit()
-
+        with self._borrow_connection() as connection:
+            cursor = connection.cursor()
+            for command in command_list:
+                self._logger.debug('-- `%s`', command)
+                if command.startswith('--') or \
+                   command == '\n':
+                    #don't execute comments or blank lines
+                    #FIXME hacky as fuck
+                    continue
+
+                cursor.execute(command)
+                connection.commit()
+            cursor.close()
+
+    @table_metrics.instrumented('test_table_exists')
     def test_table_exists(
             self,
             table_name,
             schema_name
     ):
         '''basic test for table existing'''
-        self._logger.info(
-            '-- test_table_exists(' +
-            '\r\ttable_name={0},'.format(table_name) +
-            '\r\tschema_name={0})'.format(schema_name)
+        table_utils.log_fields(
+            self._logger, logging.INFO, '-- test_table_exists()',
+            table_name=table_name,
+            schema_name=schema_name
         )
 
         exists_query = ''
@@ -212,6 +674,20 @@ class SQLTable(Database):
                 format(
                     table_name=table_name
                 )
+        elif self.table_type == TableType.SQLite:
+            exists_query = \
+            '''SELECT `name` FROM `sqlite_master`
+                WHERE `type`=\'table\' AND `name`=\'{table_name}\''''.\
+                format(
+                    table_name=table_name
+                )
+        elif self.table_type == TableType.Postgres:
+            exists_query = \
+            '''SELECT table_name FROM information_schema.tables
+                WHERE table_schema=current_schema() AND table_name=\'{table_name}\''''.\
+                format(
+                    table_name=table_name
+                )
         else:
             raise UnsupportedTableType(
                 'unsupported table type: ' + str(self.table_type),
@@ -222,40 +698,36 @@ class SQLTable(Database):
         try:
             exists_result = self._direct_query(exists_query)
         except Exception as error_msg:
-            self._logger.error(
-                'EXCEPTION query failed:' +
-                '\r\ttable_type={0},'.format(str(self.table_type)) +
-                '\r\tquery={0}'.format(exists_query),
-                exc_info=True
+            table_utils.log_fields(
+                self._logger, logging.ERROR, 'EXCEPTION: query failed',
+                exc_info=True,
+                table_type=self.table_type,
+                query=exists_query
             )
             raise error_msg
 
         if len(exists_result) != 1:
-            warning_str = '-- TABLE {schema_name}.{table_name} NOT FOUND, creating table'.\
-                format(
-                    schema_name=schema_name,
-                    table_name =table_name
-                )
             self._logger.warning(
-                '-- WARNING: Table not found.  Attempting to create' + \
-                '\r\ttable_name={0}.{1}'.format(schema_name, table_name)
+                '-- WARNING: Table not found.  Attempting to create\r\ttable_name=%s.%s',
+                schema_name, table_name
             )
             try:
                 self._create_table(self.get_table_create_string())
             except Exception as error_msg:
-                self._logger.error(
-                    'EXCEPTION: Unable to create table' +
-                    '\r\ttable_name={0}.{1}'.format(schema_name, table_name) +
-                    '\r\ttable_type={0}'.format(self.table_type) +
-                    '\r\tcreate_table_string={0}'.format(self.get_table_create_string()),
-                    exc_info=True
+                table_utils.log_fields(
+                    self._logger, logging.ERROR, 'EXCEPTION: Unable to create table',
+                    exc_info=True,
+                    table_name='{0}.{1}'.format(schema_name, table_name),
+                    table_type=self.table_type,
+                    create_table_string=self.get_table_create_string()
                 )
                 raise error_msg
 
-            self._logger.info('-- Created Table: {0}.{1}'.format(schema_name, table_name))
+            self._logger.info('-- Created Table: %s.%s', schema_name, table_name)
         else:
-            self._logger.info('-- Table Already Exists: {0}.{1}'.format(schema_name, table_name))
+            self._logger.info('-- Table Already Exists: %s.%s', schema_name, table_name)
 
+    @table_metrics.instrumented('test_table_headers')
     def test_table_headers(
             self,
             table_name,
@@ -264,11 +736,11 @@ class SQLTable(Database):
 
     ):
         '''test if headers are correctly covered by cfg'''
-        self._logger.info(
-            'test_table_headers(' +
-            '\r\ttable_name={0}'.format(table_name) +
-            '\r\tschema_name={0}'.format(schema_name) +
-            '\r\tdefined_headers={0}'.format(defined_headers)
+        table_utils.log_fields(
+            self._logger, logging.INFO, 'test_table_headers()',
+            table_name=table_name,
+            schema_name=schema_name,
+            defined_headers=defined_headers
         )
 
         header_query = ''
@@ -282,27 +754,43 @@ class SQLTable(Database):
                     schema_name=schema_name,
                     table_name =table_name
                 )
+        elif self.table_type == TableType.SQLite:
+            header_query = \
+            '''SELECT `name` FROM pragma_table_info(\'{table_name}\')'''.\
+                format(
+                    table_name=table_name
+                )
+        elif self.table_type == TableType.Postgres:
+            #cfg db_schema is the database; tables live in the search_path schema
+            header_query = \
+            '''SELECT column_name
+                FROM information_schema.columns
+                WHERE table_schema=current_schema()
+                AND table_name=\'{table_name}\''''.\
+                format(
+                    table_name=table_name
+                )
         else:
             raise UnsupportedTableType(
                 'unsupported table type: ' + str(self.table_type),
                 table_name
             )
-        self._logger.debug('-- header_query={0}'.format(header_query))
+        self._logger.debug('-- header_query=%s', header_query)
 
         try:
             headers = self._direct_query(header_query)
         except Exception as error_msg:
-            self._logger.error(
-                'EXCEPTION: query failed:' +
-                '\r\ttable_type={0}'.format(self.table_type) +
-                '\r\tquery={0}'.format(header_query),
-                exc_info=True
+            table_utils.log_fields(
+                self._logger, logging.ERROR, 'EXCEPTION: query failed',
+                exc_info=True,
+                table_type=self.table_type,
+                query=header_query
             )
             raise error_msg
 
         #TODO mysql specific? vvv
         headers = table_utils.mysql_cleanup_results(headers)
-        self._logger.debug('-- headers={0}'.format(','.join(headers)))
+        self._logger.debug('-- headers=%s', headers)
 
         #FIXME vvv bool_test_headers return values are weird
         if not table_utils.bool_test_headers(
@@ -314,6 +802,50 @@ class SQLTable(Database):
             self._logger.warning('WARNING: Table headers not equivalent')
             raise MismatchedHeaders(error_msg, table_name)
 
+    def _build_query(
+            self,
+            datetime_start,
+            args,
+            datetime_end=None,
+            limit=None,
+            kwargs_passthrough=None,
+            kwargs=None,
+            start_inclusive=False
+    ):
+        '''validate get_data()-style arguments and build the SELECT
+
+        Returns:
+            (str): query string (with placeholders)
+            (:obj:`list`): params to bind
+
+        '''
+        datetime_start, args, limit, kwargs = self._parse_query_args(
+            datetime_start,
+            args,
+            limit=limit,
+            kwargs_passthrough=kwargs_passthrough,
+            kwargs=kwargs
+        )
+
+        ## Let's Build A Query! ##
+        #statement text is compiled once per shape; values are bound, never inlined
+        query_keys = [key for key in self.primary_keys if key] #for tables without query keys
+        query_string, query_params = table_query.build_select(
+            self.table_name,
+            self.index_key,
+            query_keys,
+            args if args else self.data_keys,
+            datetime_start,
+            datetime_end=datetime_end,
+            limit=limit,
+            kwargs=kwargs,
+            start_inclusive=start_inclusive,
+            dialect=self.table_type
+        )
+        return query_string, query_params
+
+    @table_profile.profiled('get_data')
+    @table_metrics.instrumented('get_data')
     def get_data(
             self,
             datetime_start,
@@ -321,110 +853,650 @@ class SQLTable(Database):
             datetime_end=None,
             limit=None,
             kwargs_passthrough=None,
+            slices=None,
+            slice_mode=SliceMode.Fixed,
+            bucket=None,
+            agg=None,
             **kwargs
     ):
-        '''process queries to fetch data'''
+        '''process queries to fetch data
+
+        Args:
+            datetime_start (str or int): lower bound on index_key (int: last x days)
+            *args: data keys to return (default all)
+            datetime_end (str, optional): upper bound on index_key
+            limit (int, optional): max rows (newest first)
+            kwargs_passthrough (:obj:`dict`, optional): overrides **kwargs
+            slices (int, optional): split the time range into this many sub-ranges
+                and query them concurrently on pooled connections
+            slice_mode (str): SliceMode.Fixed (equal width) or SliceMode.Adaptive
+                (equal row counts, from a per-day count query)
+            bucket (str, optional): aggregate server-side into time buckets ('1D', '4H', '15min')
+            agg (:obj:`dict`, optional): {data_key: func or [funcs]} with func in
+                min/max/sum/mean/count/first/last/ohlc.  Defaults to mean of *args
+            **kwargs: primary_keys filters
+
+        Returns:
+            (:obj:`pandas.DataFrame`)
+
+        '''
         self._logger.info('get_data()')
+        self.validate_table()
         #TODO: self._logger.debug(args)
 
-        #**kwargs: filter query keys
-        #*args: data keys to return
-        if kwargs_passthrough:
-            self._logger.debug(
-                '-- received override kwargs: {0}'.format(','.join(kwargs_passthrough.keys()))
+        if self._result_cache is None:
+            return self._get_data_routed(
+                datetime_start,
+                args,
+                datetime_end=datetime_end,
+                limit=limit,
+                kwargs_passthrough=kwargs_passthrough,
+                kwargs=kwargs,
+                slices=slices,
+                slice_mode=slice_mode,
+                bucket=bucket,
+                agg=agg
             )
-            kwargs = kwargs_passthrough
 
-        if isinstance(datetime_start, int):
-            #assume "last x days"
-            self._logger.debug('-- type(datetime_start)=INT.  Converting to datetime')
-            datetime_start = table_utils.convert_days_to_datetime(datetime_start)
+        parsed_start, parsed_args, parsed_limit, parsed_kwargs = self._parse_query_args(
+            datetime_start,
+            args,
+            limit=limit,
+            kwargs_passthrough=kwargs_passthrough,
+            kwargs=kwargs
+        )
+        cache_key = table_results.result_key(
+            self.datasource_name,
+            datetime_start,
+            parsed_args,
+            datetime_end=datetime_end,
+            limit=parsed_limit,
+            kwargs=parsed_kwargs,
+            bucket=bucket,
+            agg=agg
+        )
+        #read before querying: a put_data() landing mid-query makes this result stale
+        generation = self._result_cache.generation
+        pandas_dataframe = self._result_cache.get(cache_key)
+        if pandas_dataframe is not None:
+            self._logger.debug('-- result cache hit')
+            return pandas_dataframe
+
+        pandas_dataframe = self._get_data_routed(
+            parsed_start,
+            parsed_args,
+            datetime_end=datetime_end,
+            limit=parsed_limit,
+            kwargs=parsed_kwargs,
+            slices=slices,
+            slice_mode=slice_mode,
+            bucket=bucket,
+            agg=agg
+        )
+        self._result_cache.put(
+            cache_key,
+            pandas_dataframe,
+            parsed_start,
+            datetime_end,
+            parsed_kwargs,
+            generation=generation
+        )
+        return pandas_dataframe
 
-        ## Test argument contents before executing ##
-        try:
-            table_utils.test_kwargs_headers(self.primary_keys, kwargs)
-        except Exception as error_msg:
-            self._logger.error(
-                'EXCEPTION: query/kwarg keys invalid' +
-                'kwargs.keys={0} '.format(','.join(kwargs.keys())) +
-                'primary_keys={0}'.format(','.join(self.primary_keys)),
-                exc_info=True
+    def _get_data_routed(
+            self,
+            datetime_start,
+            args,
+            datetime_end=None,
+            limit=None,
+            kwargs_passthrough=None,
+            kwargs=None,
+            slices=None,
+            slice_mode=SliceMode.Fixed,
+            bucket=None,
+            agg=None
+    ):
+        '''pick the get_data() path: aggregate, local cache, sliced or single query'''
+        if bucket or agg:
+            return self._get_data_aggregate(
+                datetime_start,
+                args,
+                datetime_end=datetime_end,
+                limit=limit,
+                kwargs_passthrough=kwargs_passthrough,
+                kwargs=kwargs,
+                bucket=bucket or '1D',
+                agg=agg
             )
-            raise InvalidQueryKeys(error_msg, self.table_name)
 
+        if self._local_cache is not None:
+            pandas_dataframe = self._get_data_local_cache(
+                datetime_start,
+                args,
+                datetime_end=datetime_end,
+                limit=limit,
+                kwargs_passthrough=kwargs_passthrough,
+                kwargs=kwargs
+            )
+            if pandas_dataframe is not None:
+                return pandas_dataframe
+
+        if slices and slices > 1:
+            return self._get_data_sliced(
+                datetime_start,
+                args,
+                datetime_end=datetime_end,
+                limit=limit,
+                kwargs_passthrough=kwargs_passthrough,
+                kwargs=kwargs,
+                slices=slices,
+                slice_mode=slice_mode
+            )
+
+        return self._query_data(
+            datetime_start,
+            args,
+            datetime_end=datetime_end,
+            limit=limit,
+            kwargs_passthrough=kwargs_passthrough,
+            kwargs=kwargs
+        )
+
+    def _query_data(
+            self,
+            datetime_start,
+            args,
+            datetime_end=None,
+            limit=None,
+            kwargs_passthrough=None,
+            kwargs=None,
+            start_inclusive=False
+    ):
+        '''run a get_data() query against the database (no caches)'''
+        query_string, query_params = self._build_query(
+            datetime_start,
+            args,
+            datetime_end=datetime_end,
+            limit=limit,
+            kwargs_passthrough=kwargs_passthrough,
+            kwargs=kwargs,
+            start_inclusive=start_inclusive
+        )
+        dtypes = self._result_dtypes()
+        self._logger.debug(query_string)
+        with self._borrow_connection() as connection:
+            pandas_dataframe = self._read_frame(
+                connection,
+                query_string,
+                query_params,
+                dtypes=dtypes
+            )
+        pandas_dataframe = self._apply_dtypes(pandas_dataframe, dtypes=dtypes)
+        self._logger.debug('-- get_data result:\n%s', table_utils.LogFrame(pandas_dataframe))
+        return pandas_dataframe
+
+    def _get_data_aggregate(
+            self,
+            datetime_start,
+            args,
+            datetime_end=None,
+            limit=None,
+            kwargs_passthrough=None,
+            kwargs=None,
+            bucket='1D',
+            agg=None
+    ):
+        '''get_data() with GROUP BY (time bucket, primary_keys) pushed to the db'''
+        datetime_start, args, limit, kwargs = self._parse_query_args(
+            datetime_start,
+            args,
+            limit=limit,
+            kwargs_passthrough=kwargs_passthrough,
+            kwargs=kwargs
+        )
+        if agg is None:
+            agg = {data_key: 'mean' for data_key in (args if args else self.data_keys)}
         try:
-            table_utils.test_args_headers(self.data_keys, args)
+            table_utils.test_args_headers(self.data_keys, list(agg.keys()))
         except Exception as error_msg:
-            self._logger.error(
-                'EXCEPTION data/args keys invalid ' +
-                'args={0} '.format(','.join(args)) +
-                'data_keys={0}'.format(','.join(self.data_keys)),
-                exc_info=True
-            )
             raise InvalidDataKeys(error_msg, self.table_name)
 
-        if isinstance(limit, int):
-            limit = abs(limit)
-        elif limit is not None: #<--FIXME: logic is kinda shitty
-            raise BadQueryModifier(
-                'limit badType: ' + str(type(limit)),
-                self.table_name
+        query_keys = [key for key in self.primary_keys if key]
+        try:
+            query_string, query_params, aggregates = table_query.build_aggregate(
+                self.table_name,
+                self.index_key,
+                query_keys,
+                agg,
+                bucket,
+                datetime_start,
+                datetime_end=datetime_end,
+                limit=limit,
+                kwargs=kwargs,
+                dialect=self.table_type
             )
-        #TODO: test datetimes
+        except ValueError as error_msg:
+            raise BadQueryModifier(str(error_msg), self.table_name)
 
-        ## Let's Build A Query! ##
-        query_header_string = ','.join(args) if args else ','.join(self.data_keys)
-        max_date_filter = ''
-        if datetime_end:
-            max_date_filter = 'AND {index_key} < \'{datetime_string}\''.\
-                format(
-                    index_key=self.index_key,
-                    datetime_string=str(datetime_end)
+        #aggregates are new values (mean of an int column is a float): only keys
+        #keep their schema dtypes, in the decoder as well as afterwards
+        key_dtypes = self._result_dtypes([self.index_key] + query_keys)
+
+        self._logger.debug(query_string)
+        with self._borrow_connection() as connection:
+            pandas_dataframe = self._read_frame(
+                connection,
+                query_string,
+                query_params,
+                dtypes=key_dtypes
+            )
+
+        #first/last come back as GROUP_CONCAT strings
+        for output_name, func, _ in aggregates:
+            if func in ('first', 'last'):
+                pandas_dataframe[output_name] = pandas.to_numeric(
+                    pandas_dataframe[output_name],
+                    errors='coerce'
+                )
+        return self._apply_dtypes(pandas_dataframe, dtypes=key_dtypes)
+
+    def _slice_bounds(
+            self,
+            datetime_start,
+            datetime_end,
+            kwargs,
+            slices,
+            slice_mode
+    ):
+        '''cut (datetime_start, datetime_end) into index_key sub-range boundaries
+
+        Returns:
+            (:obj:`list`): slices+1 Timestamps; the last is None when open-ended
+
+        '''
+        range_start = pandas.Timestamp(datetime_start)
+        range_end = pandas.Timestamp(datetime_end) if datetime_end else pandas.Timestamp.now()
+
+        if slice_mode == SliceMode.Adaptive:
+            query_string, query_params = table_query.build_day_counts(
+                self.table_name,
+                self.index_key,
+                datetime_start,
+                datetime_end=datetime_end,
+                kwargs=kwargs,
+                dialect=self.table_type
+            )
+            day_counts = self._direct_query(query_string, query_params)
+            if len(day_counts) > slices:
+                total_rows = sum(count for _, count in day_counts)
+                bounds = [range_start]
+                running_rows = 0
+                for day, count in day_counts:
+                    #cut at the start of the day that crosses the next quantile
+                    if running_rows >= total_rows * len(bounds) / slices and \
+                       len(bounds) < slices:
+                        bounds.append(pandas.Timestamp(day))
+                    running_rows += count
+                bounds.append(None if not datetime_end else range_end)
+                return bounds
+            self._logger.info('-- too few days for adaptive slicing, using fixed width')
+
+        step = (range_end - range_start) / slices
+        bounds = [range_start + step * position for position in range(slices)]
+        bounds.append(None if not datetime_end else range_end)
+        return bounds
+
+    def _get_data_sliced(
+            self,
+            datetime_start,
+            args,
+            datetime_end=None,
+            limit=None,
+            kwargs_passthrough=None,
+            kwargs=None,
+            slices=2,
+            slice_mode=SliceMode.Fixed
+    ):
+        '''run get_data() as concurrent index_key sub-range queries
+
+        Each slice is its own query on its own pooled connection.  Slices keep
+        the newest-first order and limit is applied to every slice and then to
+        the combined result, so limit semantics match a single query.
+
+        '''
+        datetime_start, args, limit, kwargs = self._parse_query_args(
+            datetime_start,
+            args,
+            limit=limit,
+            kwargs_passthrough=kwargs_passthrough,
+            kwargs=kwargs
+        )
+        bounds = self._slice_bounds(datetime_start, datetime_end, kwargs, slices, slice_mode)
+        slice_ranges = [
+            (bounds[position], bounds[position + 1], position > 0)
+            for position in range(len(bounds) - 1)
+            if bounds[position + 1] is None or bounds[position] < bounds[position + 1]
+        ]
+        self._logger.info('-- get_data split into %d slices', len(slice_ranges))
+
+        operation = table_metrics.current_operation()
+
+        def _run_slice(slice_range):
+            slice_start, slice_end, start_inclusive = slice_range
+            #worker threads: time this slice's phases on the calling get_data()
+            with table_metrics.attached(operation):
+                return self._query_data(
+                    str(slice_start),
+                    args,
+                    datetime_end=str(slice_end) if slice_end is not None else None,
+                    limit=limit,
+                    kwargs=kwargs,
+                    start_inclusive=start_inclusive
                 )
-        limit_filter = ''
+
+        self._result_dtypes()   #one schema lookup up front, not one per worker
+        max_workers = min(len(slice_ranges), self._pool.pool_size)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            slice_frames = list(executor.map(_run_slice, slice_ranges))
+
+        #each slice is newest-first: stitch newest slice first
+        pandas_dataframe = pandas.concat(list(reversed(slice_frames)), ignore_index=True)
         if limit:
-            limit_filter = 'LIMIT {limit}'.format(limit=limit)
+            pandas_dataframe = pandas_dataframe.head(limit)
+        return pandas_dataframe
 
-        query_general_filter = \
-            '''{index_key} > \'{datetime_string}\'
-            {max_date_filter}'''.\
-            format(
-                index_key=self.index_key,
-                datetime_string=str(datetime_start),
-                max_date_filter=max_date_filter
+    def _get_data_local_cache(
+            self,
+            datetime_start,
+            args,
+            datetime_end=None,
+            limit=None,
+            kwargs_passthrough=None,
+            kwargs=None
+    ):
+        '''serve get_data() from the local columnar cache, topping it up from the db
+
+        Only rows newer than each partition's high-watermark are queried.
+        Returns None (caller queries directly) unless kwargs pin down every
+        primary key, since partitions are keyed on primary_keys values.
+
+        '''
+        datetime_start, args, limit, kwargs = self._parse_query_args(
+            datetime_start,
+            args,
+            limit=limit,
+            kwargs_passthrough=kwargs_passthrough,
+            kwargs=kwargs
+        )
+        query_keys = [key for key in self.primary_keys if key]
+        if set(kwargs.keys()) != set(query_keys):
+            return None
+
+        value_lists = []
+        for key in query_keys:
+            value = kwargs[key]
+            if not isinstance(value, (list, tuple, set)):
+                value = [value]
+            value_lists.append([table_query.native_value(element) for element in value])
+        partitions = list(itertools.product(*value_lists))
+        request_start = pandas.Timestamp(datetime_start)
+
+        ## Sort partitions: missing/too-short need a fill, the rest a top-up ##
+        cached_frames = {}
+        fill_partitions = []
+        top_up_marks = {}
+        for partition in partitions:
+            meta = self._local_cache.read_meta(partition)
+            cached = self._local_cache.load(partition) if meta else None
+            if cached is None or request_start < meta['low']:
+                fill_partitions.append(partition)
+            else:
+                cached_frames[partition] = cached
+                top_up_marks[partition] = meta
+
+        def _split(frame):
+            '''db rows -> {partition: rows}'''
+            if frame.empty:
+                return {}
+            frame = frame.copy()
+            frame[self.index_key] = pandas.to_datetime(frame[self.index_key])
+            if not query_keys:
+                return {(): frame}
+            return {
+                (partition if isinstance(partition, tuple) else (partition,)): rows
+                for partition, rows in frame.groupby(query_keys)
+            }
+
+        if fill_partitions:
+            fetched = _split(self._query_data(datetime_start, (), kwargs=kwargs))
+            for partition in fill_partitions:
+                rows = fetched.get(
+                    partition,
+                    pandas.DataFrame(columns=[self.index_key] + query_keys + self.data_keys)
                 )
-        query_specific_filter = table_utils.format_kwargs(kwargs)
-        query_keys = ''
-        if self.primary_keys[0]:
-            query_keys = ','.join(self.primary_keys) + ','  #for tables without query keys
-
-        query_string = '''
-            SELECT {index_key},{query_keys}{query_header_string}
-            FROM {table_name}
-            WHERE {query_general_filter}
-            {query_specific_filter}
-            ORDER BY {index_key} DESC
-            {limit_filter}'''.\
-            format(
-                query_header_string=query_header_string,
-                query_keys=query_keys,
-                table_name=self.table_name,
-                query_general_filter=query_general_filter,
-                query_specific_filter=query_specific_filter,
-                index_key=self.index_key,
-                limit_filter=limit_filter
-            )
+                high = rows[self.index_key].max() if not rows.empty else request_start
+                self._local_cache.store(partition, rows, low=request_start, high=high)
+                cached_frames[partition] = rows
+
+        if top_up_marks:
+            #re-read the watermark row itself: upserts may have rewritten it
+            oldest_mark = min(meta['high'] for meta in top_up_marks.values())
+            fetched = _split(self._query_data(
+                str(oldest_mark - pandas.Timedelta(seconds=1)), (), kwargs=kwargs
+            ))
+            for partition, meta in top_up_marks.items():
+                rows = fetched.get(partition)
+                if rows is None:
+                    continue
+                rows = rows[rows[self.index_key] >= meta['high']]
+                if rows.empty:
+                    continue
+                cached = cached_frames[partition]
+                merged = pandas.concat(
+                    [cached[cached[self.index_key] < meta['high']], rows],
+                    ignore_index=True
+                )
+                self._local_cache.store(
+                    partition,
+                    merged,
+                    low=meta['low'],
+                    high=rows[self.index_key].max()
+                )
+                cached_frames[partition] = merged
+
+        ## Apply the caller's window/columns/limit to the local rows ##
+        selected_keys = [self.index_key] + query_keys + list(args if args else self.data_keys)
+        frames = [frame for frame in cached_frames.values() if not frame.empty]
+        if not frames:
+            return pandas.DataFrame(columns=selected_keys)
+        pandas_dataframe = pandas.concat(frames, ignore_index=True)
+        index_values = pandas.to_datetime(pandas_dataframe[self.index_key])
+        row_mask = index_values > request_start
+        if datetime_end:
+            row_mask &= index_values < pandas.Timestamp(datetime_end)
+        pandas_dataframe = pandas_dataframe[row_mask.values]
+        pandas_dataframe = pandas_dataframe.sort_values(by=self.index_key, ascending=False)
+        if limit:
+            pandas_dataframe = pandas_dataframe.head(limit)
+        return self._apply_dtypes(pandas_dataframe[selected_keys].reset_index(drop=True))
+
+    def _open_stream_cursor(self, connection):
+        '''unbuffered (server-side) cursor: rows stay on the server until fetched'''
+        if self.table_type == TableType.MySQL:
+            return connection.cursor(buffered=False)
+        elif self.table_type == TableType.Postgres:
+            #named cursor == DECLARE ... CURSOR: fetchmany() pulls itersize batches
+            return connection.cursor(name='prosper_iter_{0}'.format(id(self)))
+
+        return connection.cursor()
+
+    def iter_data(
+            self,
+            datetime_start,
+            *args,
+            datetime_end=None,
+            limit=None,
+            kwargs_passthrough=None,
+            chunk_size=DEFAULT_CHUNK_SIZE,
+            prefetch=False,
+            **kwargs
+    ):
+        '''generator version of get_data(): yields DataFrames of <= chunk_size rows
+
+        Same args as get_data().  Peak memory is bounded by chunk_size, not result size.
+        The borrowed connection stays checked out until the generator finishes or is closed.
+
+        Args:
+            chunk_size (int): rows per yielded DataFrame
+            prefetch (bool): fetch the next chunk on a background thread while
+                the caller works on the current one
+
+        '''
+        self._logger.info('iter_data()')
+        self.validate_table()
+
+        query_string, query_params = self._build_query(
+            datetime_start,
+            args,
+            datetime_end=datetime_end,
+            limit=limit,
+            kwargs_passthrough=kwargs_passthrough,
+            kwargs=kwargs
+        )
+        dtypes = self._result_dtypes()
         self._logger.debug(query_string)
-        pandas_dataframe = pandas.read_sql(
-            query_string,
-            self._connection
-            )
-        self._logger.debug(str(pandas_dataframe))
-        return pandas_dataframe
+        with self._borrow_connection() as connection:
+            cursor = self._open_stream_cursor(connection)
+            cursor.execute(query_string, query_params)
+            column_names = []
+
+            def fetch_chunk():
+                rows = cursor.fetchmany(chunk_size)
+                if not column_names and cursor.description:
+                    #named (server-side) cursors only describe after the first fetch
+                    column_names.extend(description[0] for description in cursor.description)
+                return rows
+
+            if prefetch:
+                chunks = table_utils.PrefetchIterator(fetch_chunk)
+            else:
+                chunks = iter(fetch_chunk, [])
+
+            try:
+                for rows in chunks:
+                    if not rows:
+                        break
+                    yield self._apply_dtypes(
+                        pandas.DataFrame.from_records(rows, columns=column_names),
+                        dtypes=dtypes
+                    )
+            finally:
+                if prefetch:
+                    chunks.close()
+
+            cursor.close()
+
+    @table_metrics.instrumented('latest_entries')
+    def latest_entries(self, group_by=None, refresh=False, **kwargs):
+        '''latest index_key per key group, in one GROUP BY query
+
+        Watermarks per primary_keys group are cached on the object and kept
+        current by put_data(), so repeat lookups for fully-specified groups
+        never touch the db.
+
+        Args:
+            group_by (:obj:`list`, optional): columns to group on (default primary_keys)
+            refresh (bool): ignore the watermark cache
+            **kwargs: primary_keys filters, as in get_data()
+
+        Returns:
+            (:obj:`pandas.DataFrame`): group_by columns + index_key (groups with no rows absent)
+
+        '''
+        self._logger.info('latest_entries()')
+        self.validate_table()
+        query_keys = [key for key in self.primary_keys if key]
+        group_by = list(group_by) if group_by is not None else query_keys
+        try:
+            table_utils.test_kwargs_headers(self.primary_keys, kwargs)
+            table_utils.test_kwargs_headers(self.primary_keys, dict.fromkeys(group_by))
+        except Exception as error_msg:
+            raise InvalidQueryKeys(error_msg, self.table_name)
+
+        cacheable = group_by == query_keys
+        requested_groups = None
+        if cacheable and set(kwargs.keys()) == set(query_keys):
+            value_lists = []
+            for key in query_keys:
+                value = kwargs[key]
+                if not isinstance(value, (list, tuple, set)):
+                    value = [value]
+                value_lists.append([table_query.native_value(element) for element in value])
+            requested_groups = list(itertools.product(*value_lists))
+
+            with self._watermark_lock:
+                if not refresh and all(group in self._watermarks for group in requested_groups):
+                    rows = [
+                        list(group) + [self._watermarks[group]]
+                        for group in requested_groups
+                        if self._watermarks[group] is not None
+                    ]
+                    return pandas.DataFrame(rows, columns=group_by + [self.index_key])
+
+        query_string, query_params = table_query.build_latest(
+            self.table_name,
+            self.index_key,
+            group_by,
+            kwargs=kwargs,
+            dialect=self.table_type
+        )
+        self._logger.debug(query_string)
+        query_result = self._direct_query(query_string, query_params)
+        latest_frame = pandas.DataFrame(
+            [list(row) for row in query_result if row[-1] is not None],
+            columns=group_by + [self.index_key]
+        )
+        latest_frame[self.index_key] = pandas.to_datetime(latest_frame[self.index_key])
+
+        if cacheable:
+            with self._watermark_lock:
+                for group in requested_groups or []:
+                    self._watermarks.setdefault(group, None)
+                for row in latest_frame.itertuples(index=False):
+                    group = tuple(table_query.native_value(value) for value in row[:-1])
+                    self._watermarks[group] = row[-1]
+
+        return latest_frame
+
+    def _update_watermarks(self, payload):
+        '''fold a written payload into the watermark cache'''
+        query_keys = [key for key in self.primary_keys if key]
+        flat_payload = payload.reset_index() if payload.index.name else payload
+        index_values = pandas.to_datetime(flat_payload[self.index_key])
+        if query_keys:
+            written = index_values.groupby(
+                [flat_payload[key] for key in query_keys]
+            ).max()
+            updates = [
+                (group if isinstance(group, tuple) else (group,), latest)
+                for group, latest in written.items()
+            ]
+        else:
+            updates = [((), index_values.max())]
 
+        with self._watermark_lock:
+            for group, latest in updates:
+                group = tuple(table_query.native_value(value) for value in group)
+                current = self._watermarks.get(group)
+                if current is None or latest > current:
+                    self._watermarks[group] = latest
+
+    @table_profile.profiled('put_data')
+    @table_metrics.instrumented('put_data')
     def put_data(self, payload):
         '''tests and pushes data to datastore'''
         self._logger.info('put_data()')
+        self.validate_table()
         if not isinstance(payload, pandas.DataFrame):
             raise NotImplementedError(
                 'put_data() requires Pandas.DataFrame.  No conversion implemented'
@@ -438,41 +1510,294 @@ class SQLTable(Database):
         )
 
         if not payload.index.name:
-            self._logger.info('-- setting payload.index to {0}'.format(self.index_key))
-            payload.set_index(
+            #new frame: the caller's payload may be shared with other threads
+            self._logger.info('-- setting payload.index to %s', self.index_key)
+            payload = payload.set_index(
                 keys=self.index_key,
-                drop=True,
-                inplace=True
+                drop=True
             )
 
         #FIXME vvv return types are weird without ConnectionExceptions being passed down
         if isinstance(test_result, str):
             raise MismatchedHeaders(test_result, self.table_name)
 
+        table_metrics.add_rows(len(payload), table_metrics.frame_bytes(payload))
         try:
-            #FIXME vvv to_sql is a problem
-            payload.to_sql(
-                name=self.table_name,
-                con=self._connection,
-                schema=self.schema_name,
-                flavor='mysql',
-                if_exists='append'
-            )
+            with self._borrow_connection() as connection, table_metrics.phase('execute'):
+                self._thread_state.last_write_report = table_bulk.bulk_write(
+                    connection,
+                    payload,
+                    self.table_name,
+                    self.schema_name,
+                    strategy=self.connection_values.get(
+                        'write_strategy', table_bulk.WriteStrategy.BatchInsert
+                    ),
+                    batch_size=self.connection_values.get(
+                        'write_batch_size', table_bulk.DEFAULT_BATCH_SIZE
+                    ),
+                    update_columns=self.data_keys,
+                    dialect=self.table_type,
+                    logger=self._logger
+                )
         except Exception as error_msg:
-            self._logger.error(
-                'EXCEPTION: Unable to write to table' +
-                '\r\ttable_name={0}.{1}'.format(self.schema_name, self.table_name),
-                exc_info=True
+            table_utils.log_fields(
+                self._logger, logging.ERROR, 'EXCEPTION: Unable to write to table',
+                exc_info=True,
+                table_name='{0}.{1}'.format(self.schema_name, self.table_name)
             )
             raise UnableToWriteToDatastore(error_msg, self.table_name)
 
-    def __del__(self):
-        '''release connection/cursor'''
-        #__del__ needs to be in lowest-child to execute:
-        #http://www.electricmonk.nl/log/2008/07/07/python-destructor-and-garbage-collection-notes/
-        #FIXME vvv need to close cursor?
-        #self._cursor.close()
-        self._connection.close()
+        self._update_watermarks(payload)
+        if self._result_cache is not None:
+            self._invalidate_results(payload)
+
+    def _invalidate_results(self, payload):
+        '''drop cached get_data() results that could include the written rows'''
+        flat_payload = payload.reset_index() if payload.index.name else payload
+        index_values = pandas.to_datetime(flat_payload[self.index_key])
+        written_values = {
+            key: flat_payload[key].unique()
+            for key in self.primary_keys
+            if key and key in flat_payload.columns
+        }
+        self._result_cache.invalidate(index_values.min(), index_values.max(), written_values)
+
+    def result_cache_stats(self):
+        '''get_data() result cache counters (None if result_cache_ttl is off)'''
+        if self._result_cache is None:
+            return None
+        return self._result_cache.stats()
+
+class MemMapTable(Database):
+    '''child class for frozen/read-mostly history in local memory-mapped column files
+
+    One fixed-width file per column, rows sorted by index_key (MemMapStore).
+    get_data() binary-searches the time range and hands back views of the
+    mapped files (copies only where a key filter has to pick rows out);
+    put_data() appends, and rows older than the newest stored row are
+    refused.  latest_entry() for a fully-specified key is one offset-index
+    lookup.
+
+    Same Database interface as SQLTable, so datasources load through
+    fetch_data_source().  Single writer per table directory.
+
+    '''
+
+    def __init__(
+            self,
+            datasource_name,
+            debug=False,
+            loging_handle=DEFAULT_LOGGER,
+            lazy=False
+    ):
+        '''no I/O here: the table directory is opened on first use'''
+        self._logger = loging_handle
+        self._logger.info('MemMapTable __init__()')
+        self.table_name, self.root_path = self._set_info()
+        self._store = None
+        self._store_lock = threading.Lock()
+        super().__init__(datasource_name, debug, loging_handle, lazy)
+
+    def _define_table_type(self):
+        '''always TableType.MemMap'''
+        return TableType.MemMap
+
+    def _validation_key(self):
+        return (self.table_type, self.root_path)
+
+    @property
+    def store(self):
+        '''MemMapStore.ColumnStore for root_path (created on first use)'''
+        if self._store is None:
+            with self._store_lock:
+                if self._store is None:
+                    self._store = table_memmap.ColumnStore(
+                        self.root_path,
+                        self.index_key,
+                        self._query_keys(),
+                        logger=self._logger
+                    )
+        return self._store
+
+    def _query_keys(self):
+        return [key for key in self.primary_keys if key] #for tables without query keys
+
+    def test_table(self):
+        '''table directory exists (created if missing) and stored columns match config'''
+        self._logger.info('MemMapTable.test_table()')
+        stored_columns = self.store.columns
+        if not stored_columns:
+            self._logger.info('-- empty table: columns are fixed by the first put_data()')
+            return
+
+        defined_columns = [self.index_key] + self._query_keys() + self.data_keys
+        if set(stored_columns) != set(defined_columns):
+            raise MismatchedHeaders(
+                'stored columns ({0}) != config ({1})'.format(
+                    ','.join(sorted(stored_columns)),
+                    ','.join(sorted(defined_columns))
+                ),
+                self.table_name
+            )
+
+    def _direct_query(self, query_str, query_params=None):
+        '''no SQL engine behind memory-mapped tables'''
+        raise UnsupportedTableType(
+            'direct queries unsupported for ' + str(self.table_type),
+            self.table_name
+        )
+
+    @staticmethod
+    def _filter_values(value):
+        '''kwargs filter value -> list of values'''
+        if isinstance(value, (list, tuple, set)):
+            return list(value)
+        return [value]
+
+    def _row_range(self, datetime_start, datetime_end, kwargs):
+        '''(start, stop, row mask or None) for a get_data() window + key filters'''
+        store = self.store
+        start, stop = store.search(datetime_start, datetime_end)
+        if not kwargs or start == stop:
+            return start, stop, None
+
+        filters = {key: self._filter_values(value) for key, value in kwargs.items()}
+        entries = store.key_offsets(filters)
+        if not entries:
+            return start, start, None
+        #every matching row lies between the first/last rows of the matched keys
+        start = max(start, min(entry[0] for entry in entries))
+        stop = max(start, min(stop, max(entry[1] for entry in entries) + 1))
+
+        row_mask = numpy.ones(stop - start, dtype=bool)
+        for key, values in filters.items():
+            row_mask &= numpy.isin(
+                store.column(key)[start:stop],
+                store.encode_filter(key, values)
+            )
+        return start, stop, row_mask
+
+    @table_profile.profiled('get_data')
+    @table_metrics.instrumented('get_data')
+    def get_data(
+            self,
+            datetime_start,
+            *args,
+            datetime_end=None,
+            limit=None,
+            kwargs_passthrough=None,
+            **kwargs
+    ):
+        '''process queries to fetch data
+
+        Args:
+            datetime_start (str or int): lower bound on index_key (int: last x days)
+            *args: data keys to return (default all)
+            datetime_end (str, optional): upper bound on index_key
+            limit (int, optional): max rows (newest first)
+            kwargs_passthrough (:obj:`dict`, optional): overrides **kwargs
+            **kwargs: primary_keys filters
+
+        Returns:
+            (:obj:`pandas.DataFrame`): newest first, like SQLTable.get_data().
+                Unfiltered columns are read-only views of the mapped files
+
+        '''
+        self._logger.info('get_data()')
+        self.validate_table()
+        datetime_start, args, limit, kwargs = self._parse_query_args(
+            datetime_start,
+            args,
+            limit=limit,
+            kwargs_passthrough=kwargs_passthrough,
+            kwargs=kwargs
+        )
+        selected_keys = [self.index_key] + self._query_keys() + list(args if args else self.data_keys)
+        store = self.store
+        if not store.rows:
+            return pandas.DataFrame(columns=selected_keys)
+
+        with table_metrics.phase('fetch'):
+            start, stop, row_mask = self._row_range(datetime_start, datetime_end, kwargs)
+            columns = {}
+            for column_name in selected_keys:
+                values = store.column(column_name)[start:stop]
+                if row_mask is not None:
+                    values = values[row_mask]
+                values = values[::-1]   #newest first: still a view
+                if limit:
+                    values = values[:limit]
+                columns[column_name] = store.decode(column_name, values)
+
+        self._logger.debug('-- memmap rows=%d', len(columns[self.index_key]))
+        return pandas.DataFrame(columns, columns=selected_keys, copy=False)
+
+    @table_profile.profiled('put_data')
+    @table_metrics.instrumented('put_data')
+    def put_data(self, payload):
+        '''append payload (index_key as index or column); history is append-only'''
+        self._logger.info('put_data()')
+        self.validate_table()
+        if not isinstance(payload, pandas.DataFrame):
+            raise NotImplementedError(
+                'put_data() requires Pandas.DataFrame.  No conversion implemented'
+            )
+
+        flat_payload = payload.reset_index() if payload.index.name else payload
+        defined_columns = [self.index_key] + self._query_keys() + self.data_keys
+        if set(flat_payload.columns) != set(defined_columns):
+            raise MismatchedHeaders(
+                'payload columns ({0}) != config ({1})'.format(
+                    ','.join(sorted(str(column) for column in flat_payload.columns)),
+                    ','.join(sorted(defined_columns))
+                ),
+                self.table_name
+            )
+
+        table_metrics.add_rows(len(flat_payload), table_metrics.frame_bytes(flat_payload))
+        try:
+            with table_metrics.phase('execute'):
+                self.store.append(flat_payload[defined_columns])
+        except table_memmap.MemMapStoreException as error_msg:
+            table_utils.log_fields(
+                self._logger, logging.ERROR, 'EXCEPTION: Unable to write to table',
+                exc_info=True,
+                root_path=self.root_path
+            )
+            raise UnableToWriteToDatastore(error_msg, self.table_name)
+
+    def latest_entry(self, **kwargs):
+        '''latest index_key matching kwargs (primary_keys filters), or None'''
+        self._logger.info('latest_entry()')
+        self.validate_table()
+        try:
+            table_utils.test_kwargs_headers(self.primary_keys, kwargs)
+        except Exception as error_msg:
+            raise InvalidQueryKeys(error_msg, self.table_name)
+
+        store = self.store
+        if not store.rows:
+            return None
+
+        query_keys = self._query_keys()
+        if not kwargs:
+            latest = store.column(self.index_key)[store.rows - 1]
+        elif set(kwargs.keys()) == set(query_keys) and not any(
+                isinstance(value, (list, tuple, set)) for value in kwargs.values()
+        ):
+            #one series: straight from the offset index
+            latest = store.latest([kwargs[key] for key in query_keys])
+        else:
+            entries = store.key_offsets(
+                {key: self._filter_values(value) for key, value in kwargs.items()}
+            )
+            latest = store.column(self.index_key)[max(entry[1] for entry in entries)] \
+                if entries else None
+
+        if latest is None:
+            self._logger.info('-- latest_entry=None, no entries found')
+            return None
+        return pandas.Timestamp(latest)
 
 class ConnectionException(Exception):
     '''base class for table-connection exceptions'''
@@ -0,0 +1,215 @@
+'''ConnectionPool.py: process-wide pooling for datasource connections'''
+
+import time
+import threading
+import logging
+#use NullHandler to avoid "NoneType is not Scriptable" exceptions
+DEFAULT_LOGGER = logging.getLogger('NULL')
+DEFAULT_LOGGER.addHandler(logging.NullHandler())
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_IDLE_TIMEOUT = 300      #seconds a connection may sit unused before recycle
+DEFAULT_BORROW_TIMEOUT = 30     #seconds to wait for a free connection
+DEFAULT_HEALTH_CHECK = True
+
+def ping_connection(connection):
+    '''cheap liveness test for a DB-API connection.  Returns bool'''
+    try:
+        if hasattr(connection, 'ping'):
+            #mysql.connector: raises if link is dead
+            connection.ping(reconnect=False)
+            return True
+        cursor = connection.cursor()
+        cursor.execute('SELECT 1')
+        cursor.fetchall()
+        cursor.close()
+        return True
+    except Exception:
+        return False
+
+def close_connection(connection):
+    '''close without letting driver errors escape'''
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+class ConnectionPool:
+    '''bounded pool of reusable connections for one host/port/schema/user
+
+    Args:
+        connect_func (:obj:`callable`): no-arg factory returning a new DB-API connection
+        pool_size (int): max connections open at once (idle + borrowed)
+        idle_timeout (float): seconds before an idle connection is closed instead of reused
+        health_check (bool): ping connections on borrow
+        borrow_timeout (float): seconds to wait for a slot before PoolExhausted
+        logger (:obj:`logging.logger`): logging handle
+
+    '''
+    def __init__(
+            self,
+            connect_func,
+            pool_size=DEFAULT_POOL_SIZE,
+            idle_timeout=DEFAULT_IDLE_TIMEOUT,
+            health_check=DEFAULT_HEALTH_CHECK,
+            borrow_timeout=DEFAULT_BORROW_TIMEOUT,
+            logger=DEFAULT_LOGGER
+    ):
+        self.connect_func = connect_func
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+        self.borrow_timeout = borrow_timeout
+        self._logger = logger
+
+        self._idle = []     #[(connection, last_used)], newest at the end
+        self._open_count = 0
+        self._condition = threading.Condition(threading.Lock())
+
+    def borrow(self):
+        '''check out a connection, reusing an idle one when possible'''
+        deadline = time.monotonic() + self.borrow_timeout
+        with self._condition:
+            while True:
+                connection = self._pop_idle()
+                if connection is not None:
+                    break
+                if self._open_count < self.pool_size:
+                    self._open_count += 1
+                    connection = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(
+                        'no free connection after {0}s (pool_size={1})'.\
+                            format(self.borrow_timeout, self.pool_size)
+                    )
+                self._condition.wait(remaining)
+
+        if connection is not None:
+            if not self.health_check or ping_connection(connection):
+                return connection
+            self._logger.warning('-- pooled connection failed health check, reconnecting')
+            close_connection(connection)
+
+        #slot reserved above; open outside the lock so slow handshakes don't block releases
+        try:
+            return self.connect_func()
+        except Exception:
+            with self._condition:
+                self._open_count -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, connection, discard=False):
+        '''return a connection to the pool.  discard=True closes it instead'''
+        if discard:
+            close_connection(connection)
+            with self._condition:
+                self._open_count -= 1
+                self._condition.notify()
+            return
+
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def _pop_idle(self):
+        '''newest idle connection; closes any that sat past idle_timeout.  Call under lock'''
+        now = time.monotonic()
+        expired = [conn for conn, last_used in self._idle if now - last_used > self.idle_timeout]
+        if expired:
+            self._idle = [
+                (conn, last_used) for conn, last_used in self._idle
+                if now - last_used <= self.idle_timeout
+            ]
+            for conn in expired:
+                close_connection(conn)
+            self._open_count -= len(expired)
+
+        if self._idle:
+            return self._idle.pop()[0]
+        return None
+
+    def close_all(self):
+        '''close idle connections.  Borrowed connections close on release(discard=True)'''
+        with self._condition:
+            for conn, _ in self._idle:
+                close_connection(conn)
+            self._open_count -= len(self._idle)
+            self._idle = []
+            self._condition.notify_all()
+
+    def stats(self):
+        '''snapshot of pool occupancy'''
+        with self._condition:
+            return {
+                'pool_size': self.pool_size,
+                'open': self._open_count,
+                'idle': len(self._idle),
+                'borrowed': self._open_count - len(self._idle)
+            }
+
+POOLS = {}
+POOLS_LOCK = threading.Lock()
+
+def pool_key(connection_values):
+    '''pools are shared by every datasource pointing at the same host/port/schema/user'''
+    return (
+        connection_values['host'],
+        connection_values['port'],
+        connection_values['schema'],
+        connection_values['user'],
+        connection_values.get('table_type'),
+        connection_values.get('sqlite_path')
+    )
+
+def get_pool(
+        connection_values,
+        connect_func,
+        logger=DEFAULT_LOGGER
+):
+    '''fetch (or build) the process-wide pool for a set of connection values
+
+    Args:
+        connection_values (:obj:`dict`): from Utilities.get_config_values()
+        connect_func (:obj:`callable`): factory used if the pool needs building
+        logger (:obj:`logging.logger`): logging handle
+
+    Returns:
+        (:obj:`ConnectionPool`)
+
+    '''
+    key = pool_key(connection_values)
+    with POOLS_LOCK:
+        pool = POOLS.get(key)
+        if pool is None:
+            logger.info('-- building connection pool for %s:%s/%s', *key[:3])
+            pool = ConnectionPool(
+                connect_func,
+                pool_size=connection_values.get('pool_size', DEFAULT_POOL_SIZE),
+                idle_timeout=connection_values.get('pool_idle_timeout', DEFAULT_IDLE_TIMEOUT),
+                health_check=connection_values.get('pool_health_check', DEFAULT_HEALTH_CHECK),
+                logger=logger
+            )
+            POOLS[key] = pool
+        return pool
+
+def close_pools():
+    '''close every idle pooled connection in the process (shutdown/fork hook)'''
+    with POOLS_LOCK:
+        for pool in POOLS.values():
+            pool.close_all()
+        POOLS.clear()
+
+class PoolException(Exception):
+    '''base class for pool exceptions'''
+    def __init__(self, error_msg):
+        self.error_msg = error_msg
+
+    def __str__(self):
+        return self.error_msg
+
+class PoolExhausted(PoolException):
+    '''every connection is checked out and none came back in time'''
+    pass
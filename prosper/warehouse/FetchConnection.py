@@ -1,72 +1,167 @@
 '''FetchConnection.py: importlib magic for importing connections dynamically by-string'''
 
-from os import path #FIXME: plumbum
+from os import path, stat #FIXME: plumbum
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import importlib.util
+import threading
+import time
 import logging
 #use NullHandler to avoid "NoneType is not Scriptable" exceptions
 DEFAULT_LOGGER = logging.getLogger('NULL')
 DEFAULT_LOGGER.addHandler(logging.NullHandler())
 
+import prosper.warehouse.Utilities as table_utils
+
 ## NOTE: importlib magic: http://www.blog.pythonlibrary.org/2016/05/27/python-201-an-intro-to-importlib/
 
 HERE = path.abspath(path.dirname(__file__))
 DEFAULT_TABLECONFIG_PATH = path.join(path.dirname(HERE), 'table_configs')
 DEBUG = False
+DEFAULT_FETCH_WORKERS = 4
+
+MODULE_CACHE = {}       #(family, datasource, config_path): (signature, module)
+DATASOURCE_CACHE = {}   #(family, datasource, config_path): (signature, datasource object)
+CACHE_LOCK = threading.RLock()
+
+def _source_signature(module_path, table_config_path):
+    '''mtimes of the module and its cfg: a change in either means reload'''
+    signature = []
+    for file_path in (module_path, path.join(table_config_path, 'table_config.cfg')):
+        try:
+            signature.append(stat(file_path).st_mtime)
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+def load_module(
+        family_name,
+        datasource_name,
+        table_config_path=DEFAULT_TABLECONFIG_PATH,
+        use_cache=True,
+        logger=DEFAULT_LOGGER
+):
+    '''importlib magic to load a table_config module (memoized)
+
+    Args:
+        family_name (str): module name in table_config_path
+        datasource_name (str): class name inside module
+        table_config_path (str): directory holding table_configs
+        use_cache (bool): reuse the module loaded last time (unless files changed)
+        logger (:obj:`logging.logger`): logging handle
+
+    Returns:
+        (:obj:`module`): executed table_config module
+
+    '''
+    module_path = path.join(table_config_path, family_name + '.py')
+    cache_key = (family_name, datasource_name, table_config_path)
+    signature = _source_signature(module_path, table_config_path)
+
+    with CACHE_LOCK:
+        if use_cache and cache_key in MODULE_CACHE:
+            cached_signature, cached_module = MODULE_CACHE[cache_key]
+            if cached_signature == signature:
+                return cached_module
+            logger.info(
+                '-- table_config changed on disk, reloading %s.%s',
+                family_name, datasource_name
+            )
+            DATASOURCE_CACHE.pop(cache_key, None)
+            table_utils.clear_config_cache()
+
+        ## Fetch module spec ##
+        logger.debug('-- fetching module spec')
+
+        import_spec = importlib.util.spec_from_file_location(datasource_name, module_path)
+        if import_spec is None:
+            table_utils.log_fields(
+                logger, logging.ERROR, 'EXCEPTION: Unable to find module in path',
+                table_config_path=table_config_path,
+                family_name=family_name,
+                datasource_name=datasource_name
+            )
+            raise FindConnectionModuleError(
+                'Unable to find module in path: {0} {1}.{2}'.\
+                    format(table_config_path, family_name, datasource_name)
+            )
+
+        logger.debug('-- fetching module from spec')
+
+        import_module = importlib.util.module_from_spec(import_spec)
+        import_spec.loader.exec_module(import_module)
+
+        MODULE_CACHE[cache_key] = (signature, import_module)
+        return import_module
 
 def fetch_data_source(
         family_name,
         datasource_name=None,
         table_config_path=DEFAULT_TABLECONFIG_PATH,
         debug=DEBUG,
-        logger=DEFAULT_LOGGER
+        logger=DEFAULT_LOGGER,
+        use_cache=True,
+        cache_instance=False,
+        lazy=False
 ):
-    '''importlib magic to fetch table connections'''
+    '''importlib magic to fetch table connections
+
+    Args:
+        family_name (str): module name in table_config_path
+        datasource_name (str, optional): class name (defaults to family_name)
+        table_config_path (str): directory holding table_configs
+        debug (bool): debug mode passthrough
+        logger (:obj:`logging.logger`): logging handle
+        use_cache (bool): memoize the loaded module (reload when module/cfg mtime changes)
+        cache_instance (bool): also memoize the constructed datasource object.
+            Cached objects keep the debug/logger they were first built with
+        lazy (bool): build without I/O; connect + test_table() on first get_data/put_data
+
+    Returns:
+        (:obj:`prosper.warehouse.Connection.Database`): datasource object
+
+    '''
     if not datasource_name:
         #make 1 call: snapshot_evecentral.snapshot_evecentral
         datasource_name = family_name
     #else: zkillboard.map_stats, zkillboard.item_stats...
-    logger.debug(
-        'fetch_data_source' +
-        '\r\family_name={0}'.format(family_name) +
-        '\r\tdatasource_name={0}'.format(datasource_name) +
-        '\r\ttable_config_path={0}'.format(table_config_path) +
-        '\r\tdebug={0}'.format(str(debug)) +
-        '\r\tlogger={0}'.format(str(logger))
+    table_utils.log_fields(
+        logger, logging.DEBUG, 'fetch_data_source',
+        family_name=family_name,
+        datasource_name=datasource_name,
+        table_config_path=table_config_path,
+        debug=debug,
+        loging_handle=logger
     )
 
-    ## Fetch module spec ##
-    logger.debug('-- fetching module spec')
-
-    module_path = path.join(table_config_path, family_name + '.py')
-    import_spec = importlib.util.spec_from_file_location(datasource_name, module_path)
-    if import_spec is None:
-        logger.error(
-            'EXCEPTION: Unable to find module in path' +
-            '\r\ttable_config_path={0}'.format(table_config_path) +
-            '\r\tfamily_name={0}'.format(family_name) +
-            '\r\tdatasource_name={0}'.format(datasource_name)
-        )
-        raise FindConnectionModuleError(
-            'Unable to find module in path: {0} {1}.{2}'.\
-                format(table_config_path, family_name, datasource_name)
-        )
+    cache_key = (family_name, datasource_name, table_config_path)
+    import_module = load_module(
+        family_name,
+        datasource_name,
+        table_config_path,
+        use_cache=use_cache,
+        logger=logger
+    )
 
-    logger.debug('-- fetching module from spec')
+    with CACHE_LOCK:
+        if cache_instance and use_cache and cache_key in DATASOURCE_CACHE:
+            cached_module, cached_connection = DATASOURCE_CACHE[cache_key]
+            if cached_module is import_module:
+                return cached_connection
 
-    import_module = importlib.util.module_from_spec(import_spec)
-    import_spec.loader.exec_module(import_module)
     try:
         connection_class = getattr(import_module, datasource_name)(
             datasource_name,
             debug,
-            logger
+            logger,
+            lazy=lazy
         )
     except Exception as e_msg:
-        logger.exception(
-            'EXCEPTION: Unable to load datasource class:' +
-            '\r\tsource_dir={0}'.format(table_config_path) +
-            '\r\tmodule={0}.{1}'.format(family_name, datasource_name),
-            exc_info=True
+        table_utils.log_fields(
+            logger, logging.ERROR, 'EXCEPTION: Unable to load datasource class',
+            exc_info=True,
+            source_dir=table_config_path,
+            module='{0}.{1}'.format(family_name, datasource_name)
         )
 
         raise LoadConnectionModuleError(
@@ -78,13 +173,187 @@ def fetch_data_source(
                 )
         )
 
-    logger.info(
-        '-- SUCCESS: got connection class {0}.{1}'.\
-            format(family_name, datasource_name)
-    )
+    logger.info('-- SUCCESS: got connection class %s.%s', family_name, datasource_name)
+
+    if cache_instance and use_cache:
+        with CACHE_LOCK:
+            DATASOURCE_CACHE[cache_key] = (import_module, connection_class)
 
     return connection_class
 
+def invalidate_cache(
+        family_name=None,
+        datasource_name=None,
+        table_config_path=None
+):
+    '''drop memoized modules/datasources.  None matches everything
+
+    Returns:
+        (int): number of modules dropped
+
+    '''
+    def _matches(cache_key):
+        return all(
+            want is None or want == have
+            for want, have in zip((family_name, datasource_name, table_config_path), cache_key)
+        )
+
+    with CACHE_LOCK:
+        dropped = [key for key in MODULE_CACHE if _matches(key)]
+        for key in dropped:
+            MODULE_CACHE.pop(key, None)
+        for key in [key for key in DATASOURCE_CACHE if _matches(key)]:
+            DATASOURCE_CACHE.pop(key, None)
+
+    return len(dropped)
+
+
+FetchResult = namedtuple(
+    'FetchResult',
+    ['family_name', 'datasource_name', 'data', 'error', 'elapsed']
+)
+
+def _fetch_one(
+        family_name,
+        datasource_name,
+        query_spec,
+        table_config_path,
+        debug,
+        logger
+):
+    '''fetch_many() worker: load (cached) datasource and run one get_data()'''
+    start_time = time.monotonic()
+    try:
+        #a bad spec is this request's error, not the batch's
+        query_spec = dict(query_spec)   #caller's spec stays intact
+        query_spec.pop('timeout', None)
+        datetime_start = query_spec.pop('datetime_start')
+        args = query_spec.pop('args', ())
+        filters = query_spec.pop('kwargs', {})
+        data_source = fetch_data_source(
+            family_name,
+            datasource_name,
+            table_config_path=table_config_path,
+            debug=debug,
+            logger=logger,
+            cache_instance=True
+        )
+        data = data_source.get_data(
+            datetime_start,
+            *args,
+            kwargs_passthrough=filters or None,
+            **query_spec
+        )
+    except Exception as error_msg:
+        table_utils.log_fields(
+            logger, logging.ERROR, 'EXCEPTION: fetch_many request failed',
+            exc_info=True,
+            module='{0}.{1}'.format(family_name, datasource_name)
+        )
+        return FetchResult(
+            family_name, datasource_name, None, error_msg, time.monotonic() - start_time
+        )
+
+    return FetchResult(
+        family_name, datasource_name, data, None, time.monotonic() - start_time
+    )
+
+def fetch_many(
+        requests,
+        max_workers=DEFAULT_FETCH_WORKERS,
+        timeout=None,
+        table_config_path=DEFAULT_TABLECONFIG_PATH,
+        debug=DEBUG,
+        logger=DEFAULT_LOGGER
+):
+    '''run several get_data() requests concurrently on a bounded thread pool
+
+    Each worker runs one request at a time, so it holds at most one pooled
+    connection.  Failures and timeouts are captured per request instead of
+    aborting the batch.
+
+    Args:
+        requests (:obj:`list`): (family_name, datasource_name, query_spec) tuples.
+            query_spec is a dict: datetime_start (required), args (data keys),
+            kwargs (filters), any other get_data() keyword (datetime_end, limit...)
+            and an optional per-request timeout
+        max_workers (int): thread pool size
+        timeout (float, optional): default seconds a request may run once started
+        table_config_path (str): directory holding table_configs
+        debug (bool): debug mode passthrough
+        logger (:obj:`logging.logger`): logging handle
+
+    Returns:
+        (:obj:`list` :obj:`FetchResult`): one per request, in request order.
+            data is the DataFrame (None on failure), error the exception (or None)
+
+    '''
+    requests = list(requests)
+    results = [None] * len(requests)
+    timeouts = [query_spec.get('timeout', timeout) for _, _, query_spec in requests]
+    started = {}
+
+    def _run(position, family_name, datasource_name, query_spec):
+        started[position] = time.monotonic()
+        return _fetch_one(
+            family_name,
+            datasource_name or family_name,
+            query_spec,
+            table_config_path,
+            debug,
+            logger
+        )
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {}
+    for position, (family_name, datasource_name, query_spec) in enumerate(requests):
+        future = executor.submit(_run, position, family_name, datasource_name, query_spec)
+        futures[future] = position
+
+    pending = set(futures)
+    while pending:
+        ## Expire requests that overran their timeout ##
+        now = time.monotonic()
+        wake_after = None
+        for future in list(pending):
+            position = futures[future]
+            if timeouts[position] is None:
+                continue
+            if position not in started:
+                wake_after = 0.05 if wake_after is None else min(wake_after, 0.05)
+                continue
+            remaining = started[position] + timeouts[position] - now
+            if remaining > 0:
+                wake_after = remaining if wake_after is None else min(wake_after, remaining)
+                continue
+            family_name, datasource_name, _ = requests[position]
+            datasource_name = datasource_name or family_name
+            pending.discard(future)
+            logger.warning(
+                'WARNING: fetch_many request timed out\r\tmodule=%s.%s',
+                family_name, datasource_name
+            )
+            results[position] = FetchResult(
+                family_name,
+                datasource_name,
+                None,
+                FetchTimeoutError(
+                    'timed out after {0}s: {1}.{2}'.\
+                        format(timeouts[position], family_name, datasource_name)
+                ),
+                now - started[position]
+            )
+        if not pending:
+            break
+
+        done, _ = wait(pending, timeout=wake_after, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            results[futures[future]] = future.result()
+
+    #timed-out workers can't be interrupted; let them finish in the background
+    executor.shutdown(wait=False)
+    return results
 
 class FetchConnectionException(Exception):
     '''base class for module-fetch exceptions'''
@@ -102,5 +371,9 @@ class LoadConnectionModuleError(FetchConnectionException):
     '''failed loading connection module'''
     pass
 
+class FetchTimeoutError(FetchConnectionException):
+    '''fetch_many() request ran past its timeout'''
+    pass
+
 if __name__ == '__main__':
     DEBUG=True
@@ -0,0 +1,183 @@
+'''LocalCache.py: on-disk columnar read-through cache for SQLTable.get_data()'''
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from os import path
+import logging
+#use NullHandler to avoid "NoneType is not Scriptable" exceptions
+DEFAULT_LOGGER = logging.getLogger('NULL')
+DEFAULT_LOGGER.addHandler(logging.NullHandler())
+
+import prosper.warehouse.Utilities as table_utils
+
+numpy = table_utils.lazy_import('numpy')
+pandas = table_utils.lazy_import('pandas')
+
+META_FILE = 'meta.json'
+DEFAULT_MAX_MB = 512
+
+class ColumnarCache:
+    '''per-datasource cache: one directory per primary_keys partition
+
+    Each partition holds one .npy file per column, sorted by index_key, plus
+    meta.json with the partition values and its low/high watermarks.  The
+    partition holds every row with low < index_key <= high.
+
+    Args:
+        cache_dir (str): root cache directory (shared by datasources)
+        datasource_name (str): subdirectory for this datasource
+        index_key (str): time index column
+        partition_keys (:obj:`list`): primary keys defining a partition
+        max_bytes (int): size budget for this datasource; LRU partitions evicted past it
+        logger (:obj:`logging.logger`): logging handle
+
+    '''
+    def __init__(
+            self,
+            cache_dir,
+            datasource_name,
+            index_key,
+            partition_keys,
+            max_bytes=DEFAULT_MAX_MB * 1024 * 1024,
+            logger=DEFAULT_LOGGER
+    ):
+        self.root_path = path.join(cache_dir, datasource_name)
+        self.index_key = index_key
+        self.partition_keys = list(partition_keys)
+        self.max_bytes = max_bytes
+        self._logger = logger
+        self._lock = threading.Lock()
+
+    def _partition_path(self, partition):
+        '''stable directory name for a tuple of primary key values'''
+        digest = hashlib.sha1(repr(tuple(partition)).encode('utf-8')).hexdigest()[:20]
+        return path.join(self.root_path, digest)
+
+    def read_meta(self, partition):
+        '''meta dict for a partition, or None if not cached'''
+        meta_path = path.join(self._partition_path(partition), META_FILE)
+        try:
+            with open(meta_path, 'r') as file_handle:
+                meta = json.load(file_handle)
+        except (OSError, ValueError):
+            return None
+        meta['low'] = pandas.Timestamp(meta['low'])
+        meta['high'] = pandas.Timestamp(meta['high'])
+        return meta
+
+    def load(self, partition):
+        '''cached rows for a partition (ascending index_key), or None'''
+        partition_path = self._partition_path(partition)
+        with self._lock:
+            meta = self.read_meta(partition)
+            if meta is None:
+                return None
+            columns = {}
+            try:
+                for column_name, kind in meta['columns'].items():
+                    column_path = path.join(partition_path, column_name + '.npy')
+                    values = numpy.load(column_path, mmap_mode='r')
+                    if kind == 'datetime':
+                        values = values.view('datetime64[ns]')
+                    elif kind == 'object':
+                        null_mask = numpy.load(path.join(partition_path, column_name + '.null.npy'))
+                        values = values.astype(object)
+                        values[null_mask] = None
+                    if len(values) != meta['rows']:
+                        raise ValueError('partial write: ' + column_name)
+                    columns[column_name] = numpy.array(values)
+            except (OSError, ValueError):
+                self._logger.warning('WARNING: unreadable cache partition, dropping', exc_info=True)
+                shutil.rmtree(partition_path, ignore_errors=True)
+                return None
+            #touch meta: LRU clock
+            os.utime(path.join(partition_path, META_FILE), None)
+
+        frame = pandas.DataFrame(columns, columns=list(meta['columns'].keys()))
+        for key, value in zip(self.partition_keys, meta['partition']):
+            frame[key] = value
+        return frame
+
+    def store(self, partition, frame, low, high):
+        '''(re)write a partition from frame (rows low < index_key <= high)'''
+        partition_path = self._partition_path(partition)
+        frame = frame.sort_values(by=self.index_key)
+        column_kinds = {}
+        with self._lock:
+            if not path.isdir(partition_path):
+                os.makedirs(partition_path)
+            for column_name in frame.columns:
+                if column_name in self.partition_keys:
+                    continue    #constant per partition: lives in meta
+                series = frame[column_name]
+                column_path = path.join(partition_path, column_name + '.npy')
+                if column_name == self.index_key or str(series.dtype).startswith('datetime64'):
+                    values = pandas.to_datetime(series).values.astype('datetime64[ns]').view('int64')
+                    column_kinds[column_name] = 'datetime'
+                elif not isinstance(series.dtype, numpy.dtype) or series.dtype == object:
+                    null_mask = series.isnull().values
+                    values = series.fillna('').astype(str).values.astype('U')
+                    _save_array(path.join(partition_path, column_name + '.null.npy'), null_mask)
+                    column_kinds[column_name] = 'object'
+                else:
+                    values = series.values
+                    column_kinds[column_name] = 'native'
+                _save_array(column_path, values)
+
+            meta = {
+                'partition': list(partition),
+                'low': str(pandas.Timestamp(low)),
+                'high': str(pandas.Timestamp(high)),
+                'rows': len(frame),
+                'columns': column_kinds,
+                'updated': time.time()
+            }
+            #meta last: readers trust column files only once meta agrees with them
+            meta_tmp = path.join(partition_path, META_FILE + '.tmp')
+            with open(meta_tmp, 'w') as file_handle:
+                json.dump(meta, file_handle)
+            os.replace(meta_tmp, path.join(partition_path, META_FILE))
+
+        self.evict()
+
+    def evict(self):
+        '''drop least-recently-used partitions until under max_bytes'''
+        if not path.isdir(self.root_path):
+            return
+        with self._lock:
+            partitions = []
+            total_bytes = 0
+            for entry in os.listdir(self.root_path):
+                partition_path = path.join(self.root_path, entry)
+                meta_path = path.join(partition_path, META_FILE)
+                if not path.isfile(meta_path):
+                    continue
+                size = sum(
+                    path.getsize(path.join(partition_path, file_name))
+                    for file_name in os.listdir(partition_path)
+                )
+                partitions.append((path.getmtime(meta_path), size, partition_path))
+                total_bytes += size
+
+            for _, size, partition_path in sorted(partitions):
+                if total_bytes <= self.max_bytes:
+                    break
+                self._logger.info('-- local cache evicting %s', partition_path)
+                shutil.rmtree(partition_path, ignore_errors=True)
+                total_bytes -= size
+
+    def clear(self):
+        '''drop every cached partition for this datasource'''
+        with self._lock:
+            shutil.rmtree(self.root_path, ignore_errors=True)
+
+def _save_array(file_path, values):
+    '''numpy.save via temp + rename so readers never see a torn file'''
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as file_handle:
+        numpy.save(file_handle, numpy.ascontiguousarray(values))
+    os.replace(tmp_path, file_path)
@@ -0,0 +1,367 @@
+'''MemMapStore.py: append-only, memory-mapped column files for TableType.MemMap
+
+Layout (one directory per table):
+    meta.json       columns/dtypes/categories, committed row count, keys file
+    keys.<rows>.json    offset index: key tuple -> [first_row, last_row, rows]
+    <column>.bin    one fixed-width array per column, rows sorted by index_key
+
+Rows are only ever appended in index_key order, so a time range is two
+binary searches and the matching rows are one contiguous slice of every
+column file.  Strings are stored as int32 codes into a categories list.
+meta.json is replaced (atomically) after the column files and the new
+offset index are written: readers never see a half-appended batch, and a
+crashed append is trimmed off on the next one.
+
+Single writer per directory; any number of reader threads/processes.
+
+'''
+
+import itertools
+import json
+import os
+import tempfile
+import threading
+from os import path
+import logging
+#use NullHandler to avoid "NoneType is not Scriptable" exceptions
+DEFAULT_LOGGER = logging.getLogger('NULL')
+DEFAULT_LOGGER.addHandler(logging.NullHandler())
+
+import prosper.warehouse.Utilities as table_utils
+import prosper.warehouse.QueryBuilder as table_query
+
+numpy = table_utils.lazy_import('numpy')
+pandas = table_utils.lazy_import('pandas')
+
+META_FILE = 'meta.json'
+KEYS_FILE = 'keys.{0}.json'     #versioned by row count: meta.json names the live one
+COLUMN_SUFFIX = '.bin'
+CATEGORY_DTYPE = 'int32'    #storage for string columns: codes, -1 = NULL
+DATETIME_DTYPE = 'datetime64[ns]'
+
+def _write_json(file_path, payload):
+    '''write-then-rename: readers see the old or the new file, never a partial one'''
+    file_handle = tempfile.NamedTemporaryFile(
+        'w', dir=path.dirname(file_path), suffix='.tmp', delete=False
+    )
+    with file_handle:
+        json.dump(payload, file_handle)
+    os.replace(file_handle.name, file_path)
+
+def _read_json(file_path, default):
+    try:
+        with open(file_path, 'r') as file_handle:
+            return json.load(file_handle)
+    except FileNotFoundError:
+        return default
+
+def key_str(values):
+    '''key tuple -> offset-index key (json, so it survives the round trip)'''
+    return json.dumps([table_query.native_value(value) for value in values])
+
+def storage_dtype(series):
+    '''fixed-width dtype a column is stored as (None: strings -> category codes)'''
+    dtype = series.dtype
+    if str(dtype).startswith('datetime64'):
+        return DATETIME_DTYPE
+    if isinstance(dtype, numpy.dtype) and dtype.kind in 'biuf':
+        return dtype.str
+    return None
+
+class ColumnStore:
+    '''one table's column files + offset index
+
+    Args:
+        root_path (str): table directory (created if missing)
+        index_key (str): sort column (datetime)
+        key_columns (:obj:`list`): primary keys (offset index)
+        logger (:obj:`logging.logger`): logging handle
+
+    '''
+    def __init__(self, root_path, index_key, key_columns, logger=DEFAULT_LOGGER):
+        self.root_path = root_path
+        self.index_key = index_key
+        self.key_columns = list(key_columns)
+        self._logger = logger
+        self._lock = threading.RLock()
+        self._maps = {}     #column: (rows, memmap)
+        self._meta_mtime = None
+        if not path.isdir(root_path):
+            os.makedirs(root_path)
+        self._load_meta()
+
+    ## Metadata ##
+    def _load_meta(self):
+        '''(re)read meta.json + its keys file if another writer changed them'''
+        meta_path = path.join(self.root_path, META_FILE)
+        try:
+            mtime = os.stat(meta_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is not None and mtime == self._meta_mtime:
+            return
+        self.meta = _read_json(meta_path, {'rows': 0, 'columns': [], 'keys_file': None})
+        self.offsets = {}
+        if self.meta.get('keys_file'):
+            self.offsets = _read_json(path.join(self.root_path, self.meta['keys_file']), {})
+        self.key_index = {tuple(json.loads(key)): entry for key, entry in self.offsets.items()}
+        self._meta_mtime = mtime
+        self._maps = {}
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    @property
+    def columns(self):
+        return [column['name'] for column in self.meta['columns']]
+
+    def _column_meta(self, column_name):
+        for column in self.meta['columns']:
+            if column['name'] == column_name:
+                return column
+        raise UnknownColumn('no column {0} in {1}'.format(column_name, self.root_path))
+
+    def _column_path(self, column_name):
+        return path.join(self.root_path, column_name + COLUMN_SUFFIX)
+
+    ## Reads ##
+    def column(self, column_name):
+        '''memory-mapped committed rows of one column (read-only view, no copy)'''
+        with self._lock:
+            self._load_meta()
+            rows = self.rows
+            cached = self._maps.get(column_name)
+            if cached and cached[0] == rows:
+                return cached[1]
+            dtype = self._column_meta(column_name)['dtype']
+            if rows:
+                values = numpy.memmap(
+                    self._column_path(column_name), dtype=dtype, mode='r', shape=(rows,)
+                )
+            else:
+                values = numpy.empty(0, dtype=dtype)
+            self._maps[column_name] = (rows, values)
+            return values
+
+    def search(self, low=None, high=None, low_inclusive=False):
+        '''(start, stop) rows with low < index_key < high (None: unbounded)'''
+        index_values = self.column(self.index_key)
+        start, stop = 0, len(index_values)
+        if low is not None:
+            start = int(numpy.searchsorted(
+                index_values,
+                numpy.datetime64(pandas.Timestamp(low), 'ns'),
+                side='left' if low_inclusive else 'right'
+            ))
+        if high is not None:
+            stop = int(numpy.searchsorted(
+                index_values,
+                numpy.datetime64(pandas.Timestamp(high), 'ns'),
+                side='left'
+            ))
+        return start, max(start, stop)
+
+    def key_offsets(self, filters):
+        '''offset-index entries for every key tuple matching filters ({column: [values]})
+
+        Entries are (first_row, last_row, rows) snapshots: an append running
+        later doesn't move them past the rows they were read with.
+
+        '''
+        wanted = [
+            set(table_query.native_value(value) for value in filters[column])
+            if column in filters else None
+            for column in self.key_columns
+        ]
+        with self._lock:
+            self._load_meta()
+            if not filters:
+                return [tuple(entry) for entry in self.key_index.values()]
+            if all(values is not None for values in wanted):
+                #every key column pinned: direct lookups, no scan
+                return [
+                    tuple(self.key_index[key_values])
+                    for key_values in itertools.product(*wanted)
+                    if key_values in self.key_index
+                ]
+            return [
+                tuple(entry) for key_values, entry in self.key_index.items()
+                if all(
+                    values is None or key_value in values
+                    for key_value, values in zip(key_values, wanted)
+                )
+            ]
+
+    def decode(self, column_name, values):
+        '''stored values -> DataFrame-ready column (codes -> Categorical)'''
+        categories = self._column_meta(column_name).get('categories')
+        if categories is None:
+            return values
+        return pandas.Categorical.from_codes(values, categories=categories)
+
+    def encode_filter(self, column_name, wanted):
+        '''filter values -> stored representation (category codes)'''
+        categories = self._column_meta(column_name).get('categories')
+        if categories is None:
+            return numpy.asarray(wanted)
+        lookup = {category: code for code, category in enumerate(categories)}
+        return numpy.asarray([lookup[value] for value in wanted if value in lookup], dtype=CATEGORY_DTYPE)
+
+    def latest(self, key_values):
+        '''index_key of a key tuple's newest row, O(1); None if the key has no rows'''
+        with self._lock:
+            self._load_meta()
+            entry = self.key_index.get(tuple(
+                table_query.native_value(value) for value in key_values
+            ))
+            if entry is None:
+                return None
+            last_row = entry[1]
+        return self.column(self.index_key)[last_row]
+
+    ## Writes ##
+    def append(self, frame):
+        '''append a flat frame (index_key as a column); rows must not predate the store
+
+        Returns:
+            (int): rows written
+
+        '''
+        if frame.empty:
+            return 0
+        frame = frame.sort_values(by=self.index_key, kind='stable')
+        with self._lock:
+            self._load_meta()
+            try:
+                return self._append(frame)
+            except BaseException:
+                #drop half-updated in-memory meta: disk still has the last commit
+                self._meta_mtime = None
+                self._load_meta()
+                raise
+
+    def _append(self, frame):
+        '''append() body: caller holds _lock'''
+        index_values = pandas.to_datetime(frame[self.index_key]).values.astype(DATETIME_DTYPE)
+        if self.rows:
+            last_index = self.column(self.index_key)[self.rows - 1]
+            if index_values[0] < last_index:
+                raise OutOfOrderAppend(
+                    'append-only: {0} predates latest {1}'.format(index_values[0], last_index)
+                )
+        if not self.meta['columns']:
+            self.meta['columns'] = self._define_columns(frame)
+        elif set(frame.columns) != set(self.columns):
+            raise SchemaMismatch(
+                'columns {0} != stored {1}'.format(sorted(frame.columns), sorted(self.columns))
+            )
+
+        encoded = {}
+        for column in self.meta['columns']:
+            if column['name'] == self.index_key:
+                encoded[column['name']] = index_values
+            else:
+                encoded[column['name']] = self._encode(column, frame[column['name']])
+
+        for column in self.meta['columns']:
+            self._append_file(column, encoded[column['name']])
+
+        first_row = self.rows
+        self._index_keys(frame, first_row)
+        self.meta['rows'] = first_row + len(frame)
+        old_keys_file = self.meta.get('keys_file')
+        self.meta['keys_file'] = KEYS_FILE.format(self.meta['rows'])
+        _write_json(path.join(self.root_path, self.meta['keys_file']), self.offsets)
+        _write_json(path.join(self.root_path, META_FILE), self.meta)    #commit point
+        if old_keys_file and old_keys_file != self.meta['keys_file']:
+            try:
+                os.remove(path.join(self.root_path, old_keys_file))
+            except OSError:
+                pass
+        self._meta_mtime = None
+        self._logger.info('-- memmap append: rows=%d total=%d', len(frame), self.meta['rows'])
+        return len(frame)
+
+    def _define_columns(self, frame):
+        '''first append fixes the column set and storage dtypes'''
+        columns = []
+        for column_name in frame.columns:
+            dtype = storage_dtype(frame[column_name])
+            if column_name == self.index_key:
+                dtype = DATETIME_DTYPE
+            if dtype is None:
+                columns.append({'name': column_name, 'dtype': CATEGORY_DTYPE, 'categories': []})
+            else:
+                columns.append({'name': column_name, 'dtype': dtype})
+        return columns
+
+    def _encode(self, column, series):
+        '''series -> stored fixed-width values (new categories are added to meta)'''
+        if 'categories' not in column:
+            try:
+                return series.to_numpy(dtype=column['dtype'])
+            except (TypeError, ValueError) as error_msg:
+                raise SchemaMismatch('{0}: {1}'.format(column['name'], error_msg))
+
+        categories = column['categories']
+        known = set(categories)
+        not_null = series.notnull().values
+        text = series[not_null].astype(str)
+        categories.extend(value for value in pandas.unique(text) if value not in known)
+        codes = numpy.full(len(series), -1, dtype=CATEGORY_DTYPE)
+        codes[not_null] = pandas.Categorical(text, categories=categories).codes
+        return codes
+
+    def _append_file(self, column, values):
+        '''trim anything past the committed rows (crashed append), then append'''
+        column_path = self._column_path(column['name'])
+        committed_bytes = self.rows * numpy.dtype(column['dtype']).itemsize
+        if path.exists(column_path) and path.getsize(column_path) != committed_bytes:
+            os.truncate(column_path, committed_bytes)
+        with open(column_path, 'ab') as file_handle:
+            file_handle.write(numpy.ascontiguousarray(values).tobytes())
+
+    def _index_keys(self, frame, first_row):
+        '''update the offset index with this batch (rows first_row...)'''
+        if not self.key_columns:
+            return
+        key_frame = frame[self.key_columns].reset_index(drop=True)
+        key_frame['_row'] = numpy.arange(first_row, first_row + len(frame))
+        summary = key_frame.groupby(self.key_columns, sort=False, observed=True)['_row'].agg(
+            ['first', 'last', 'count']
+        )
+        for key_values, first, last, count in zip(
+                summary.index, summary['first'], summary['last'], summary['count']
+        ):
+            if not isinstance(key_values, tuple):
+                key_values = (key_values,)
+            key_values = tuple(table_query.native_value(value) for value in key_values)
+            entry = self.key_index.get(key_values)
+            if entry is None:
+                entry = [int(first), int(last), int(count)]
+                self.key_index[key_values] = entry
+                self.offsets[key_str(key_values)] = entry
+            else:
+                entry[1] = int(last)
+                entry[2] += int(count)
+
+class MemMapStoreException(Exception):
+    '''base class for memory-mapped store exceptions'''
+    def __init__(self, error_msg):
+        self.error_msg = error_msg
+
+    def __str__(self):
+        return self.error_msg
+
+class OutOfOrderAppend(MemMapStoreException):
+    '''rows older than what's stored: history is append-only'''
+    pass
+
+class SchemaMismatch(MemMapStoreException):
+    '''payload columns/types don't match the stored columns'''
+    pass
+
+class UnknownColumn(MemMapStoreException):
+    '''column not in this store'''
+    pass
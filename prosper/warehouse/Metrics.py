@@ -0,0 +1,266 @@
+'''Metrics.py: in-process timing/row/byte histograms for warehouse operations
+
+Each instrumented call (get_data, put_data, _direct_query, test_table_*) is an
+"operation"; time inside it is split into phases (connect, execute, fetch,
+build).  Observations land in REGISTRY histograms tagged by operation, phase,
+datasource and table_type, and are forwarded to any add_sink() callbacks.
+
+Dump with to_json() or serve to_prometheus() from a scrape endpoint.
+
+'''
+
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+METRIC_SECONDS = 'warehouse_operation_seconds'
+METRIC_ROWS = 'warehouse_operation_rows'
+METRIC_BYTES = 'warehouse_operation_bytes'
+METRIC_ERRORS = 'warehouse_operation_errors'
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROWS_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+METRIC_BUCKETS = {
+    METRIC_SECONDS: SECONDS_BUCKETS,
+    METRIC_ROWS: ROWS_BUCKETS,
+    METRIC_BYTES: BYTES_BUCKETS,
+    METRIC_ERRORS: (1,)
+}
+
+ENABLED = True
+REGISTRY = {}   #(metric_name, tags tuple): Histogram
+REGISTRY_LOCK = threading.Lock()
+SINKS = []      #callables: sink(metric_name, value, tags_dict)
+_STATE = threading.local()
+
+class Histogram:
+    '''cumulative-bucket histogram (prometheus semantics)'''
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        '''add one observation'''
+        with self._lock:
+            self.count += 1
+            self.total += value
+            for position, upper in enumerate(self.buckets):
+                if value <= upper:
+                    self.counts[position] += 1
+                    break
+
+    def snapshot(self):
+        '''{buckets: {le: cumulative count}, sum, count}'''
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for upper, count in zip(self.buckets, self.counts):
+                cumulative += count
+                buckets[str(upper)] = cumulative
+            buckets['+Inf'] = self.count
+            return {'buckets': buckets, 'sum': self.total, 'count': self.count}
+
+def set_enabled(enabled=True):
+    '''global on/off switch (off: operations cost one attribute check)'''
+    global ENABLED
+    ENABLED = bool(enabled)
+
+def add_sink(sink):
+    '''forward every observation to sink(metric_name, value, tags_dict)'''
+    SINKS.append(sink)
+
+def remove_sink(sink):
+    '''stop forwarding to sink'''
+    if sink in SINKS:
+        SINKS.remove(sink)
+
+def observe(metric_name, value, **tags):
+    '''record one value for metric_name+tags'''
+    if not ENABLED:
+        return
+    tag_key = tuple(sorted(tags.items()))
+    with REGISTRY_LOCK:
+        histogram = REGISTRY.get((metric_name, tag_key))
+        if histogram is None:
+            histogram = Histogram(METRIC_BUCKETS.get(metric_name, SECONDS_BUCKETS))
+            REGISTRY[(metric_name, tag_key)] = histogram
+    histogram.observe(value)
+    for sink in list(SINKS):
+        sink(metric_name, value, dict(tags))
+
+class Operation:
+    '''one timed warehouse call: total time + phases + rows/bytes'''
+    def __init__(self, operation, datasource, table_type):
+        self.tags = {
+            'operation': operation,
+            'datasource': str(datasource),
+            'table_type': str(table_type)
+        }
+        self.rows = None
+        self.nbytes = None
+        self._start = None
+
+    def __enter__(self):
+        stack = getattr(_STATE, 'stack', None)
+        if stack is None:
+            stack = _STATE.stack = []
+        stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self._start
+        _STATE.stack.pop()
+        observe(METRIC_SECONDS, elapsed, phase='total', **self.tags)
+        if exc_type is not None:
+            observe(METRIC_ERRORS, 1, **self.tags)
+        if self.rows is not None:
+            observe(METRIC_ROWS, self.rows, **self.tags)
+        if self.nbytes is not None:
+            observe(METRIC_BYTES, self.nbytes, **self.tags)
+        return False
+
+    @contextmanager
+    def phase(self, phase_name):
+        '''time a sub-step of this operation'''
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            observe(
+                METRIC_SECONDS,
+                time.perf_counter() - start_time,
+                phase=phase_name,
+                **self.tags
+            )
+
+    def add_rows(self, rows, nbytes=None):
+        '''attach result size (summed if called more than once)'''
+        self.rows = (self.rows or 0) + rows
+        if nbytes is not None:
+            self.nbytes = (self.nbytes or 0) + nbytes
+
+def current_operation():
+    '''innermost Operation on this thread, or None'''
+    stack = getattr(_STATE, 'stack', None)
+    return stack[-1] if stack else None
+
+@contextmanager
+def attached(operation):
+    '''make another thread's Operation current here (worker threads of one call)
+
+    Metrics state is per thread, so phases timed on a ThreadPoolExecutor worker
+    would otherwise have no operation to land on.
+
+    '''
+    if operation is None:
+        yield
+        return
+    stack = getattr(_STATE, 'stack', None)
+    if stack is None:
+        stack = _STATE.stack = []
+    stack.append(operation)
+    try:
+        yield operation
+    finally:
+        stack.pop()
+
+@contextmanager
+def _null_context():
+    yield
+
+def phase(phase_name):
+    '''time a phase of the current operation (no-op outside one / when disabled)'''
+    operation = current_operation()
+    if not ENABLED or operation is None:
+        return _null_context()
+    return operation.phase(phase_name)
+
+def add_rows(rows, nbytes=None):
+    '''attach rows/bytes to the current operation'''
+    operation = current_operation()
+    if ENABLED and operation is not None:
+        operation.add_rows(rows, nbytes)
+
+def frame_bytes(frame):
+    '''cheap DataFrame size estimate (no deep inspection of object columns)'''
+    return int(frame.memory_usage(index=True, deep=False).sum())
+
+def instrumented(operation_name):
+    '''method decorator: run as an Operation tagged from self.datasource_name/table_type
+
+    DataFrame results record rows/bytes unless the method already did.
+
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not ENABLED:
+                return func(self, *args, **kwargs)
+            with Operation(
+                    operation_name,
+                    getattr(self, 'datasource_name', None),
+                    getattr(self, 'table_type', None)
+            ) as operation:
+                result = func(self, *args, **kwargs)
+                if operation.rows is None and hasattr(result, 'memory_usage'):
+                    operation.add_rows(len(result), frame_bytes(result))
+                return result
+        return wrapper
+    return decorator
+
+def snapshot():
+    '''every histogram as a list of {metric, tags, buckets, sum, count}'''
+    with REGISTRY_LOCK:
+        items = list(REGISTRY.items())
+    report = []
+    for (metric_name, tag_key), histogram in sorted(items, key=lambda item: item[0]):
+        entry = {'metric': metric_name, 'tags': dict(tag_key)}
+        entry.update(histogram.snapshot())
+        report.append(entry)
+    return report
+
+def to_json(indent=None):
+    '''snapshot() as a JSON string'''
+    return json.dumps(snapshot(), indent=indent)
+
+def _label_str(labels):
+    '''{k: v} -> k="v",...  (prometheus escaping)'''
+    return ','.join(
+        '{0}="{1}"'.format(
+            key,
+            str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        )
+        for key, value in labels
+    )
+
+def to_prometheus():
+    '''snapshot() in prometheus text exposition format'''
+    lines = []
+    described = set()
+    for entry in snapshot():
+        metric_name = entry['metric']
+        if metric_name not in described:
+            lines.append('# TYPE {0} histogram'.format(metric_name))
+            described.add(metric_name)
+        labels = sorted(entry['tags'].items())
+        for upper, count in entry['buckets'].items():
+            lines.append('{0}_bucket{{{1}}} {2}'.format(
+                metric_name,
+                _label_str(labels + [('le', upper)]),
+                count
+            ))
+        lines.append('{0}_sum{{{1}}} {2}'.format(metric_name, _label_str(labels), entry['sum']))
+        lines.append('{0}_count{{{1}}} {2}'.format(metric_name, _label_str(labels), entry['count']))
+    return '\n'.join(lines) + '\n'
+
+def reset():
+    '''drop every histogram'''
+    with REGISTRY_LOCK:
+        REGISTRY.clear()
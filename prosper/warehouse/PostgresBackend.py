@@ -0,0 +1,177 @@
+'''PostgresBackend.py: psycopg2 connections, DDL translation and COPY I/O for TableType.Postgres'''
+
+import io
+import re
+import logging
+#use NullHandler to avoid "NoneType is not Scriptable" exceptions
+DEFAULT_LOGGER = logging.getLogger('NULL')
+DEFAULT_LOGGER.addHandler(logging.NullHandler())
+
+import prosper.warehouse.Utilities as table_utils
+
+pandas = table_utils.lazy_import('pandas')
+
+COPY_BUFFER_SIZE = 1024 * 1024  #bytes per COPY read/write round
+COPY_NULL = '\\N'
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+#MySQL column types -> Postgres (applied in order on the create file)
+TYPE_TRANSLATIONS = (
+    (r"\bENUM\s*\((?:[^')]|'(?:[^']|'')*')*\)", 'TEXT'),
+    (r'\bTINYINT\s*(\(\s*\d+\s*\))?', 'SMALLINT'),
+    (r'\bMEDIUMINT\s*(\(\s*\d+\s*\))?', 'INTEGER'),
+    (r'\bBIGINT\s*\(\s*\d+\s*\)', 'BIGINT'),
+    (r'\bINT\s*\(\s*\d+\s*\)', 'INTEGER'),
+    (r'\bDOUBLE\s*(\([^)]*\))?', 'DOUBLE PRECISION'),
+    (r'\bFLOAT\s*(\([^)]*\))?', 'REAL'),
+    (r'\bDATETIME\b', 'TIMESTAMP'),
+    (r'\bUNSIGNED\b', '')
+)
+
+def connect(connection_values, logger=DEFAULT_LOGGER):
+    '''open a psycopg2 connection (pool factory for TableType.Postgres)
+
+    cfg db_schema is the database name, matching how MySQL tables use it.
+
+    '''
+    import psycopg2     #optional dependency: only Postgres datasources need it
+    logger.info(
+        '-- postgres connect: %s:%s/%s',
+        connection_values['host'],
+        connection_values['port'],
+        connection_values['schema']
+    )
+    return psycopg2.connect(
+        host=connection_values['host'],
+        port=connection_values['port'],
+        dbname=connection_values['schema'],
+        user=connection_values['user'],
+        password=connection_values['passwd']
+    )
+
+def translate_ddl(create_string):
+    '''SQL/*.mysql table-create file -> Postgres DDL
+
+    Identifiers stay quoted ("orderCount"), so mixed-case names survive;
+    QueryBuilder quotes them the same way for the Postgres dialect.
+
+    '''
+    create_string = re.sub(r'\)\s*ENGINE\s*=[^;]*', ')', create_string, flags=re.IGNORECASE)
+    create_string = create_string.replace('`', '"')
+    for pattern, replacement in TYPE_TRANSLATIONS:
+        create_string = re.sub(pattern, replacement, create_string, flags=re.IGNORECASE)
+    return create_string
+
+def csv_ready(frame):
+    '''bools -> 1/0 (TINYINT columns land in SMALLINT), everything else as-is'''
+    export_frame = frame
+    for column_name in frame.columns:
+        if frame[column_name].dtype == bool:
+            if export_frame is frame:
+                export_frame = frame.copy()
+            export_frame[column_name] = frame[column_name].astype('int8')
+    return export_frame
+
+class FrameCSVStream:
+    '''file-like CSV view of a DataFrame, rendered chunk by chunk as COPY reads it
+
+    Only one chunk of CSV text exists at a time, so COPY FROM STDIN of a
+    large payload doesn't need a second full copy of it in memory.
+
+    '''
+    def __init__(self, frame, chunk_rows=50000):
+        self._frame = csv_ready(frame)
+        self._chunk_rows = chunk_rows
+        self._offset = 0
+        self._buffer = ''
+
+    def _render_next(self):
+        chunk = self._frame.iloc[self._offset:self._offset + self._chunk_rows]
+        self._offset += self._chunk_rows
+        return chunk.to_csv(
+            header=False,
+            index=False,
+            na_rep=COPY_NULL,
+            date_format=DATETIME_FORMAT
+        )
+
+    def read(self, size=-1):
+        while (size < 0 or len(self._buffer) < size) and self._offset < len(self._frame):
+            self._buffer += self._render_next()
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+def copy_from_frame(connection, table_name, frame, quote_name, chunk_rows=50000):
+    '''COPY table (columns) FROM STDIN, streamed from frame (no commit)'''
+    copy_sql = "COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{null}')".format(
+        table=quote_name(table_name),
+        columns=','.join(quote_name(column) for column in frame.columns),
+        null=COPY_NULL
+    )
+    cursor = connection.cursor()
+    cursor.copy_expert(copy_sql, FrameCSVStream(frame, chunk_rows), size=COPY_BUFFER_SIZE)
+    cursor.close()
+
+def copy_upsert(connection, table_name, frame, update_columns, quote_name, chunk_rows=50000):
+    '''COPY into a temp table, then INSERT ... ON CONFLICT (keys) DO UPDATE (no commit)
+
+    Conflict target is every column not in update_columns (index + primary keys).
+
+    '''
+    staging_name = 'prosper_staging_' + table_name
+    key_columns = [column for column in frame.columns if column not in update_columns]
+    cursor = connection.cursor()
+    cursor.execute(
+        'CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {table} INCLUDING DEFAULTS) '
+        'ON COMMIT DELETE ROWS'.format(
+            staging=quote_name(staging_name),
+            table=quote_name(table_name)
+        )
+    )
+    copy_from_frame(connection, staging_name, frame, quote_name, chunk_rows)
+    columns = ','.join(quote_name(column) for column in frame.columns)
+    cursor.execute(
+        'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} '
+        'ON CONFLICT ({keys}) DO UPDATE SET {updates}'.format(
+            table=quote_name(table_name),
+            columns=columns,
+            staging=quote_name(staging_name),
+            keys=','.join(quote_name(column) for column in key_columns),
+            updates=','.join(
+                '{0}=EXCLUDED.{0}'.format(quote_name(column))
+                for column in update_columns if column in frame.columns
+            )
+        )
+    )
+    cursor.close()
+
+def copy_to_frame(connection, query_string, query_params=None):
+    '''run a SELECT as COPY (...) TO STDOUT and parse it with the C csv reader
+
+    COPY can't take bind parameters, so the statement is rendered with the
+    driver's own quoting (cursor.mogrify) first.
+
+    Returns:
+        (:obj:`pandas.DataFrame`): text-decoded; callers apply dtypes
+
+    '''
+    cursor = connection.cursor()
+    bound_query = cursor.mogrify(query_string, query_params).decode('utf-8')
+    buffer = io.StringIO()
+    cursor.copy_expert(
+        "COPY ({0}) TO STDOUT WITH (FORMAT csv, HEADER, NULL '{1}')".format(bound_query, COPY_NULL),
+        buffer,
+        size=COPY_BUFFER_SIZE
+    )
+    cursor.close()
+    buffer.seek(0)
+    return pandas.read_csv(
+        buffer,
+        na_values=[COPY_NULL],
+        keep_default_na=False
+    )
@@ -0,0 +1,247 @@
+'''Profiler.py: opt-in, sampled cProfile/tracemalloc capture of warehouse calls
+
+A datasource with a Profiler attached profiles 1 in sample_rate of its
+get_data()/put_data() calls and writes one report set per captured call to
+report_path/<datasource>/:
+    <stamp>_<pid>_<operation>_<shape>_<call>.prof   cProfile stats (pstats, snakeviz, ...)
+    <stamp>_<pid>_<operation>_<shape>_<call>.txt    top functions by cumulative time (+ allocations)
+    <stamp>_<pid>_<operation>_<shape>_<call>.json   query shape, elapsed, traced memory, error
+
+<shape> is a short hash of the query shape (filter keys/list lengths, data
+keys, modifiers), so repeat captures of the same kind of call sort together.
+
+cProfile and tracemalloc are process-wide: one call is captured at a time
+(others run unprofiled), and only the calling thread is profiled, so work a
+call hands to pool threads (get_data(slices=N)) shows up as waiting.
+
+'''
+
+import functools
+import hashlib
+import io
+import itertools
+import json
+import os
+import threading
+import time
+from os import path
+import logging
+#use NullHandler to avoid "NoneType is not Scriptable" exceptions
+DEFAULT_LOGGER = logging.getLogger('NULL')
+DEFAULT_LOGGER.addHandler(logging.NullHandler())
+
+import prosper.warehouse.QueryBuilder as table_query
+
+DEFAULT_SAMPLE_RATE = 1
+DEFAULT_TOP_FUNCTIONS = 40
+DEFAULT_TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 10
+#get_data()/put_data() keywords that aren't primary_keys filters
+QUERY_MODIFIERS = (
+    'datetime_end', 'limit', 'kwargs_passthrough', 'slices', 'slice_mode', 'bucket', 'agg'
+)
+
+_CAPTURE_LOCK = threading.Lock()   #one capture at a time: both tools are process-wide
+_STATE = threading.local()          #inside a profiled call on this thread
+
+def query_shape(operation_name, args, kwargs):
+    '''what kind of call this is, without its values
+
+    Returns:
+        (:obj:`dict`): operation, data keys, filter_shape(), modifiers in use
+            (put_data: payload rows/columns)
+
+    '''
+    shape = {'operation': operation_name}
+    if args and hasattr(args[0], 'columns'):
+        payload = args[0]
+        shape['payload_rows'] = len(payload)
+        shape['payload_columns'] = [str(column) for column in payload.columns]
+        return shape
+
+    shape['data_keys'] = [str(arg) for arg in args[1:]]
+    filters = {key: value for key, value in kwargs.items() if key not in QUERY_MODIFIERS}
+    if kwargs.get('kwargs_passthrough'):
+        filters = kwargs['kwargs_passthrough']
+    shape['filters'] = [list(element) for element in table_query.filter_shape(filters)]
+    shape['modifiers'] = sorted(
+        key for key in QUERY_MODIFIERS
+        if key != 'kwargs_passthrough' and kwargs.get(key) is not None
+    )
+    return shape
+
+def shape_tag(shape):
+    '''short, filename-safe tag for a query_shape()'''
+    shape_json = json.dumps(shape, sort_keys=True, default=str)
+    return hashlib.sha1(shape_json.encode('utf-8')).hexdigest()[:10]
+
+class Profiler:
+    '''sampled profiling for one datasource
+
+    Args:
+        report_path (str): directory for reports (created if missing)
+        datasource_name (str): subdirectory/tag for this datasource
+        sample_rate (int): profile 1 in sample_rate calls (1: every call)
+        memory (bool): also trace allocations with tracemalloc (slower)
+        logger (:obj:`logging.logger`): logging handle
+
+    '''
+    def __init__(
+            self,
+            report_path,
+            datasource_name,
+            sample_rate=DEFAULT_SAMPLE_RATE,
+            memory=False,
+            logger=DEFAULT_LOGGER
+    ):
+        self.report_path = path.join(report_path, str(datasource_name))
+        self.datasource_name = str(datasource_name)
+        self.sample_rate = max(1, int(sample_rate))
+        self.memory = memory
+        self._logger = logger
+        self._calls = itertools.count()     #next() is atomic: safe across threads
+        self.captured = 0
+        self.skipped_busy = 0
+
+    def next_call(self):
+        '''(call number, sampled?): 1 in sample_rate calls is sampled'''
+        call_number = next(self._calls)
+        return call_number, call_number % self.sample_rate == 0
+
+    def run(self, operation_name, func, args, kwargs):
+        '''call func(*args, **kwargs), profiled if this call is sampled'''
+        if getattr(_STATE, 'active', False):
+            #nested (table_config put_data() -> SQLTable.put_data()): outer call decides
+            return func(*args, **kwargs)
+        _STATE.active = True
+        try:
+            call_number, sampled = self.next_call()
+            if not sampled:
+                return func(*args, **kwargs)
+            if not _CAPTURE_LOCK.acquire(blocking=False):
+                #another thread's call is being captured
+                self.skipped_busy += 1
+                return func(*args, **kwargs)
+            try:
+                return self._capture(operation_name, call_number, func, args, kwargs)
+            finally:
+                _CAPTURE_LOCK.release()
+        finally:
+            _STATE.active = False
+
+    def _capture(self, operation_name, call_number, func, args, kwargs):
+        '''run() body: caller holds _CAPTURE_LOCK'''
+        import cProfile     #profiling modules load on first capture, not at import
+        import tracemalloc
+        shape = query_shape(operation_name, args[1:], kwargs)     #args[0]: self
+        started_tracing = False
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            started_tracing = True
+        if self.memory:
+            memory_before = tracemalloc.take_snapshot()
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+
+        profile = cProfile.Profile()
+        error = None
+        start_time = time.perf_counter()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        except Exception as error_msg:
+            error = repr(error_msg)
+            raise
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start_time
+            memory_stats = None
+            if self.memory:
+                memory_after = tracemalloc.take_snapshot()
+                current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+                memory_stats = {
+                    'current_bytes': current_bytes,
+                    'peak_bytes': peak_bytes,
+                    'top': memory_after.compare_to(memory_before, 'lineno')[:DEFAULT_TOP_ALLOCATIONS]
+                }
+                if started_tracing:
+                    tracemalloc.stop()
+            try:
+                self._write_report(
+                    operation_name, call_number, shape, profile, elapsed, memory_stats, error
+                )
+            except Exception:
+                #never fail the caller's query over a report
+                self._logger.warning('WARNING: unable to write profile report', exc_info=True)
+
+    def _write_report(
+            self,
+            operation_name,
+            call_number,
+            shape,
+            profile,
+            elapsed,
+            memory_stats,
+            error
+    ):
+        '''.prof + .txt + .json for one captured call'''
+        import pstats
+        if not path.isdir(self.report_path):
+            os.makedirs(self.report_path, exist_ok=True)
+        base_name = '{stamp}_{pid}_{operation}_{tag}_{call}'.format(
+            stamp=time.strftime('%Y%m%d_%H%M%S'),
+            pid=os.getpid(),
+            operation=operation_name,
+            tag=shape_tag(shape),
+            call=call_number
+        )
+        base_path = path.join(self.report_path, base_name)
+        profile.dump_stats(base_path + '.prof')
+
+        text_report = io.StringIO()
+        text_report.write('{0}.{1} {2:.3f}s shape={3}\n\n'.format(
+            self.datasource_name, operation_name, elapsed, json.dumps(shape, default=str)
+        ))
+        pstats.Stats(profile, stream=text_report).sort_stats('cumulative').print_stats(
+            DEFAULT_TOP_FUNCTIONS
+        )
+        summary = {
+            'datasource': self.datasource_name,
+            'operation': operation_name,
+            'shape': shape,
+            'shape_tag': shape_tag(shape),
+            'elapsed_seconds': elapsed,
+            'error': error,
+            'call_number': call_number,
+            'sample_rate': self.sample_rate
+        }
+        if memory_stats is not None:
+            text_report.write('\n-- allocations (growth during call, by line)\n')
+            for stat in memory_stats['top']:
+                text_report.write('{0}\n'.format(stat))
+            summary['traced_current_bytes'] = memory_stats['current_bytes']
+            summary['traced_peak_bytes'] = memory_stats['peak_bytes']
+            summary['top_allocations'] = [str(stat) for stat in memory_stats['top']]
+
+        with open(base_path + '.txt', 'w') as file_handle:
+            file_handle.write(text_report.getvalue())
+        with open(base_path + '.json', 'w') as file_handle:
+            json.dump(summary, file_handle, indent=2, default=str)
+        self.captured += 1
+        self._logger.info('-- profile report: %s (%.3fs)', base_path, elapsed)
+
+def profiled(operation_name):
+    '''method decorator: hand the call to self._profiler when one is attached
+
+    No profiler (the default): one attribute check per call.
+
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            profiler = getattr(self, '_profiler', None)
+            if profiler is None:
+                return func(self, *args, **kwargs)
+            return profiler.run(operation_name, func, (self,) + args, kwargs)
+        return wrapper
+    return decorator
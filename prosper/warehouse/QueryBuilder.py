@@ -0,0 +1,448 @@
+'''QueryBuilder.py: compile-once parameterized SELECTs for SQLTable.get_data()'''
+
+import functools
+import re
+
+import prosper.warehouse.Utilities as table_utils
+
+pandas = table_utils.lazy_import('pandas')
+
+STATEMENT_CACHE_SIZE = 256
+PLACEHOLDER = '%s'     #DB-API "format" paramstyle (mysql.connector)
+PLACEHOLDERS = {
+    'sqlite': '?'       #sqlite3 "qmark" paramstyle
+}
+IDENTIFIER_QUOTES = {
+    'postgres': '"'     #case-sensitive names (orderCount) must be quoted
+}
+DEFAULT_DIALECT = 'mysql'
+
+BUCKET_PATTERN = re.compile(r'^\s*(\d*)\s*([a-zA-Z]+)\s*$')
+BUCKET_UNITS = {
+    's': 1, 'sec': 1,
+    't': 60, 'min': 60,
+    'h': 3600,
+    'd': 86400,
+    'w': 604800
+}
+AGG_FUNCTIONS = {
+    'min': 'MIN({column})',
+    'max': 'MAX({column})',
+    'sum': 'SUM({column})',
+    'mean': 'AVG({column})',
+    'count': 'COUNT({column})',
+    #GROUP_CONCAT ordered by time, keep the end we want (skips NULLs)
+    'first': "SUBSTRING_INDEX(GROUP_CONCAT({column} ORDER BY {index_key} ASC), ',', 1)",
+    'last': "SUBSTRING_INDEX(GROUP_CONCAT({column} ORDER BY {index_key} DESC), ',', 1)"
+}
+DIALECT_AGG_FUNCTIONS = {
+    #no ORDER BY inside GROUP_CONCAT: pick the row off MIN/MAX of "index_key|value"
+    'sqlite': {
+        'first': "SUBSTR(MIN({index_key} || '|' || {column}), " \
+                 "INSTR(MIN({index_key} || '|' || {column}), '|') + 1)",
+        'last': "SUBSTR(MAX({index_key} || '|' || {column}), " \
+                "INSTR(MAX({index_key} || '|' || {column}), '|') + 1)"
+    },
+    'postgres': {
+        'first': '(ARRAY_AGG({column} ORDER BY {index_key} ASC) FILTER (WHERE {column} IS NOT NULL))[1]',
+        'last': '(ARRAY_AGG({column} ORDER BY {index_key} DESC) FILTER (WHERE {column} IS NOT NULL))[1]'
+    }
+}
+BUCKET_EXPRESSIONS = {
+    'mysql': "TIMESTAMPADD(SECOND, FLOOR(TIMESTAMPDIFF(SECOND, '1970-01-01', {index_key})/{size})*{size}, '1970-01-01')",
+    'sqlite': "DATETIME((CAST(STRFTIME('%s', {index_key}) AS INTEGER)/{size})*{size}, 'unixepoch')",
+    'postgres': "TO_TIMESTAMP(FLOOR(EXTRACT(EPOCH FROM {index_key})/{size})*{size}) AT TIME ZONE 'UTC'"
+}
+OHLC = (('open', 'first'), ('high', 'max'), ('low', 'min'), ('close', 'last'))
+
+def dialect_name(dialect):
+    '''TableType value ('MySQL', 'SQLite'...) -> lookup key'''
+    return str(dialect or DEFAULT_DIALECT).lower()
+
+def placeholder(dialect=DEFAULT_DIALECT):
+    '''bind-parameter marker for a dialect'''
+    return PLACEHOLDERS.get(dialect_name(dialect), PLACEHOLDER)
+
+def quote_identifier(name, dialect=DEFAULT_DIALECT):
+    '''column/table name as the dialect needs it (unchanged where names are case-insensitive)'''
+    quote_char = IDENTIFIER_QUOTES.get(dialect_name(dialect))
+    if not quote_char:
+        return name
+    return '{0}{1}{0}'.format(quote_char, name.replace(quote_char, quote_char * 2))
+
+def agg_template(func, dialect=DEFAULT_DIALECT):
+    '''SQL template for one agg func in a dialect'''
+    return DIALECT_AGG_FUNCTIONS.get(dialect_name(dialect), {}).get(func, AGG_FUNCTIONS[func])
+
+def bind_time(value):
+    '''datetime-ish -> 'YYYY-MM-DD HH:MM:SS' (compares correctly against stored text, too)'''
+    return str(pandas.Timestamp(value))
+
+def filter_shape(kwargs):
+    '''the part of a filter that changes the SQL text: keys + list lengths
+
+    Returns:
+        (tuple): ((key, None|len(values)), ...) sorted by key
+
+    '''
+    shape = []
+    for key in sorted(kwargs):
+        value = kwargs[key]
+        if isinstance(value, (list, tuple, set)):
+            shape.append((key, len(value)))
+        else:
+            shape.append((key, None))
+    return tuple(shape)
+
+def native_value(value):
+    '''numpy scalars -> python scalars (drivers can't bind numpy types)'''
+    return value.item() if hasattr(value, 'item') else value
+
+def bind_filters(kwargs):
+    '''filter values in the same order filter_shape() laid out placeholders'''
+    params = []
+    for key in sorted(kwargs):
+        value = kwargs[key]
+        if isinstance(value, (list, tuple, set)):
+            params.extend(native_value(element) for element in value)
+        else:
+            params.append(native_value(value))
+    return params
+
+def _shape_filters(shape, mark=PLACEHOLDER, dialect=DEFAULT_DIALECT):
+    '''WHERE fragments (with placeholders) for a filter_shape()'''
+    where_list = []
+    for key, value_count in shape:
+        key = quote_identifier(key, dialect)
+        if value_count is None:
+            where_list.append('{0}={1}'.format(key, mark))
+        elif value_count == 0:
+            where_list.append('1=0')    #empty IN () is a syntax error; matches nothing
+        else:
+            where_list.append('{0} IN ({1})'.format(
+                key,
+                ','.join([mark] * value_count)
+            ))
+    return where_list
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def compile_select(
+        table_name,
+        index_key,
+        query_keys,
+        data_keys,
+        shape,
+        has_end,
+        has_limit,
+        start_inclusive=False,
+        dialect=DEFAULT_DIALECT
+):
+    '''build SELECT text for one query "shape".  Values are bound later
+
+    Args:
+        table_name (str): table to select from
+        index_key (str): time index column
+        query_keys (tuple): primary keys to return
+        data_keys (tuple): data columns to return
+        shape (tuple): from filter_shape()
+        has_end (bool): bind an upper bound on index_key
+        has_limit (bool): bind a LIMIT
+        start_inclusive (bool): index_key >= start (time slices) instead of >
+        dialect (str): TableType value: picks placeholder/SQL flavor
+
+    Returns:
+        (str): SQL with placeholders
+
+    '''
+    mark = placeholder(dialect)
+    table_name, index_key = quote_identifier(table_name, dialect), quote_identifier(index_key, dialect)
+    select_keys = [index_key]
+    select_keys.extend(quote_identifier(key, dialect) for key in query_keys)
+    select_keys.extend(quote_identifier(key, dialect) for key in data_keys)
+
+    where_list = ['{0} {1} {2}'.format(
+        index_key,
+        '>=' if start_inclusive else '>',
+        mark
+    )]
+    if has_end:
+        where_list.append('{0} < {1}'.format(index_key, mark))
+    where_list.extend(_shape_filters(shape, mark, dialect))
+
+    query_string = \
+        'SELECT {select_keys} FROM {table_name} WHERE {where} ORDER BY {index_key} DESC'.\
+        format(
+            select_keys=','.join(select_keys),
+            table_name=table_name,
+            where=' AND '.join(where_list),
+            index_key=index_key
+        )
+    if has_limit:
+        query_string += ' LIMIT {0}'.format(mark)
+    return query_string
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def compile_latest(
+        table_name,
+        index_key,
+        group_by,
+        shape,
+        dialect=DEFAULT_DIALECT
+):
+    '''SELECT group_by..., MAX(index_key) ... GROUP BY group_by for one filter shape'''
+    table_name, index_key = quote_identifier(table_name, dialect), quote_identifier(index_key, dialect)
+    group_by = [quote_identifier(key, dialect) for key in group_by]
+    select_keys = list(group_by)
+    select_keys.append('MAX({0})'.format(index_key))
+
+    query_string = 'SELECT {select_keys} FROM {table_name}'.format(
+        select_keys=','.join(select_keys),
+        table_name=table_name
+    )
+    where_list = _shape_filters(shape, placeholder(dialect), dialect)
+    if where_list:
+        query_string += ' WHERE ' + ' AND '.join(where_list)
+    if group_by:
+        query_string += ' GROUP BY ' + ','.join(group_by)
+    return query_string
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def compile_day_counts(
+        table_name,
+        index_key,
+        shape,
+        has_end,
+        dialect=DEFAULT_DIALECT
+):
+    '''rows per day in a window: feeds adaptive time slicing'''
+    mark = placeholder(dialect)
+    table_name, index_key = quote_identifier(table_name, dialect), quote_identifier(index_key, dialect)
+    where_list = ['{0} > {1}'.format(index_key, mark)]
+    if has_end:
+        where_list.append('{0} < {1}'.format(index_key, mark))
+    where_list.extend(_shape_filters(shape, mark, dialect))
+    return \
+        'SELECT DATE({index_key}),COUNT(*) FROM {table_name} WHERE {where} ' \
+        'GROUP BY DATE({index_key}) ORDER BY DATE({index_key})'.format(
+            index_key=index_key,
+            table_name=table_name,
+            where=' AND '.join(where_list)
+        )
+
+def build_day_counts(
+        table_name,
+        index_key,
+        datetime_start,
+        datetime_end=None,
+        kwargs=None,
+        dialect=DEFAULT_DIALECT
+):
+    '''compiled per-day row count query + params'''
+    kwargs = kwargs or {}
+    query_string = compile_day_counts(
+        table_name,
+        index_key,
+        filter_shape(kwargs),
+        bool(datetime_end),
+        dialect_name(dialect)
+    )
+    params = [bind_time(datetime_start)]
+    if datetime_end:
+        params.append(bind_time(datetime_end))
+    params.extend(bind_filters(kwargs))
+    return query_string, params
+
+def build_latest(
+        table_name,
+        index_key,
+        group_by,
+        kwargs=None,
+        dialect=DEFAULT_DIALECT
+):
+    '''compiled watermark query (cached per shape) + params'''
+    kwargs = kwargs or {}
+    query_string = compile_latest(
+        table_name,
+        index_key,
+        tuple(group_by),
+        filter_shape(kwargs),
+        dialect_name(dialect)
+    )
+    return query_string, bind_filters(kwargs)
+
+def bucket_seconds(bucket):
+    '''pandas-style frequency ('1D', '4H', '15min') -> seconds'''
+    match = BUCKET_PATTERN.match(str(bucket))
+    if not match or match.group(2).lower() not in BUCKET_UNITS:
+        raise ValueError('unsupported bucket: {0}'.format(bucket))
+    return int(match.group(1) or 1) * BUCKET_UNITS[match.group(2).lower()]
+
+def agg_columns(agg):
+    '''expand {column: func|[funcs]} -> ((output_name, func, column), ...)
+
+    One func keeps the column name; several (or 'ohlc') suffix it: price_open...
+
+    '''
+    expanded = []
+    for column in sorted(agg):
+        funcs = agg[column]
+        if isinstance(funcs, str):
+            funcs = [funcs]
+        for func in funcs:
+            if func == 'ohlc':
+                for suffix, ohlc_func in OHLC:
+                    expanded.append(('{0}_{1}'.format(column, suffix), ohlc_func, column))
+                continue
+            if func not in AGG_FUNCTIONS:
+                raise ValueError('unsupported agg: {0}'.format(func))
+            output_name = column if len(funcs) == 1 else '{0}_{1}'.format(column, func)
+            expanded.append((output_name, func, column))
+    return tuple(expanded)
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def compile_aggregate(
+        table_name,
+        index_key,
+        query_keys,
+        aggregates,
+        bucket_size,
+        shape,
+        has_end,
+        has_limit,
+        dialect=DEFAULT_DIALECT
+):
+    '''GROUP BY (time bucket, query_keys) SELECT for one shape
+
+    Args:
+        aggregates (tuple): from agg_columns()
+        bucket_size (int): bucket width in seconds (epoch-aligned, timezone-free)
+
+    '''
+    mark = placeholder(dialect)
+    table_name, index_key = quote_identifier(table_name, dialect), quote_identifier(index_key, dialect)
+    query_keys = [quote_identifier(key, dialect) for key in query_keys]
+    bucket_expression = BUCKET_EXPRESSIONS[dialect_name(dialect)].format(
+        index_key=index_key,
+        size=bucket_size
+    )
+
+    select_list = ['{0} AS {1}'.format(bucket_expression, index_key)]
+    select_list.extend(query_keys)
+    for output_name, func, column in aggregates:
+        select_list.append('{0} AS {1}'.format(
+            agg_template(func, dialect).format(
+                column=quote_identifier(column, dialect),
+                index_key=index_key
+            ),
+            quote_identifier(output_name, dialect)
+        ))
+
+    where_list = ['{0} > {1}'.format(index_key, mark)]
+    if has_end:
+        where_list.append('{0} < {1}'.format(index_key, mark))
+    where_list.extend(_shape_filters(shape, mark, dialect))
+
+    #GROUP BY would resolve the bare index_key name to the raw column: use the expression
+    query_string = \
+        'SELECT {select_list} FROM {table_name} WHERE {where} ' \
+        'GROUP BY {group_by} ORDER BY {bucket_expression} DESC'.format(
+            select_list=','.join(select_list),
+            table_name=table_name,
+            where=' AND '.join(where_list),
+            group_by=','.join([bucket_expression] + list(query_keys)),
+            bucket_expression=bucket_expression
+        )
+    if has_limit:
+        query_string += ' LIMIT {0}'.format(mark)
+    return query_string
+
+def build_aggregate(
+        table_name,
+        index_key,
+        query_keys,
+        agg,
+        bucket,
+        datetime_start,
+        datetime_end=None,
+        limit=None,
+        kwargs=None,
+        dialect=DEFAULT_DIALECT
+):
+    '''compiled bucketed aggregate (cached per shape) + params
+
+    Returns:
+        (str): SQL with placeholders
+        (:obj:`list`): params in placeholder order
+        (tuple): agg_columns() layout of the result
+
+    '''
+    kwargs = kwargs or {}
+    aggregates = agg_columns(agg)
+    query_string = compile_aggregate(
+        table_name,
+        index_key,
+        tuple(query_keys),
+        aggregates,
+        bucket_seconds(bucket),
+        filter_shape(kwargs),
+        bool(datetime_end),
+        bool(limit),
+        dialect_name(dialect)
+    )
+
+    params = [bind_time(datetime_start)]
+    if datetime_end:
+        params.append(bind_time(datetime_end))
+    params.extend(bind_filters(kwargs))
+    if limit:
+        params.append(limit)
+    return query_string, params, aggregates
+
+def build_select(
+        table_name,
+        index_key,
+        query_keys,
+        data_keys,
+        datetime_start,
+        datetime_end=None,
+        limit=None,
+        kwargs=None,
+        start_inclusive=False,
+        dialect=DEFAULT_DIALECT
+):
+    '''compiled SQL (cached per shape) + the params to bind to it
+
+    Returns:
+        (str): SQL with placeholders
+        (:obj:`list`): params in placeholder order
+
+    '''
+    kwargs = kwargs or {}
+    query_string = compile_select(
+        table_name,
+        index_key,
+        tuple(query_keys),
+        tuple(data_keys),
+        filter_shape(kwargs),
+        bool(datetime_end),
+        bool(limit),
+        start_inclusive,
+        dialect_name(dialect)
+    )
+
+    params = [bind_time(datetime_start)]
+    if datetime_end:
+        params.append(bind_time(datetime_end))
+    params.extend(bind_filters(kwargs))
+    if limit:
+        params.append(limit)
+    return query_string, params
+
+def cache_info():
+    '''hits/misses/size of the compiled-statement caches'''
+    return {
+        'select': compile_select.cache_info(),
+        'latest': compile_latest.cache_info(),
+        'day_counts': compile_day_counts.cache_info(),
+        'aggregate': compile_aggregate.cache_info()
+    }
@@ -0,0 +1,231 @@
+'''ResultCache.py: in-process TTL/LRU cache of get_data() results'''
+
+import threading
+import time
+from collections import OrderedDict
+import logging
+#use NullHandler to avoid "NoneType is not Scriptable" exceptions
+DEFAULT_LOGGER = logging.getLogger('NULL')
+DEFAULT_LOGGER.addHandler(logging.NullHandler())
+
+import prosper.warehouse.Utilities as table_utils
+import prosper.warehouse.QueryBuilder as table_query
+
+pandas = table_utils.lazy_import('pandas')
+
+DEFAULT_MAX_MB = 256
+
+def _normalize_value(value):
+    '''filter value -> hashable, order-free form'''
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(
+            (table_query.native_value(element) for element in value),
+            key=repr
+        ))
+    return (table_query.native_value(value),)
+
+def match_value(value):
+    '''filter/payload key value -> token for overlap checks
+
+    34, 34.0, '34' and numpy.int32(34) all select the same rows, so they
+    must all come out the same.
+
+    '''
+    value = table_query.native_value(value)
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def normalize_filters(kwargs):
+    '''{key: value|[values]} -> ((key, (values...)), ...) sorted by key'''
+    return tuple(
+        (key, _normalize_value(kwargs[key]))
+        for key in sorted(kwargs)
+    )
+
+def _normalize_agg(agg):
+    '''agg dict -> hashable'''
+    if not agg:
+        return None
+    return tuple(
+        (column, (agg[column],) if isinstance(agg[column], str) else tuple(agg[column]))
+        for column in sorted(agg)
+    )
+
+def result_key(
+        datasource_name,
+        datetime_start,
+        args,
+        datetime_end=None,
+        limit=None,
+        kwargs=None,
+        bucket=None,
+        agg=None
+):
+    '''normalized cache key for one get_data() call
+
+    int datetime_start ("last x days") keys on the day count, not the
+    converted timestamp, so repeat calls hit until the TTL runs out.
+
+    '''
+    if isinstance(datetime_start, int):
+        start_key = ('days', datetime_start)
+    else:
+        start_key = str(pandas.Timestamp(datetime_start))
+    return (
+        datasource_name,
+        start_key,
+        str(pandas.Timestamp(datetime_end)) if datetime_end else None,
+        tuple(args),
+        normalize_filters(kwargs or {}),
+        limit,
+        bucket,
+        _normalize_agg(agg)
+    )
+
+class ResultCache:
+    '''memory-bounded LRU of DataFrames with a TTL, invalidated by writes
+
+    Every invalidate() bumps `generation`.  A query that read the generation
+    before it ran, and finds it changed by the time it put(), may hold rows
+    from before the write: that put() is dropped.
+
+    Args:
+        ttl (float): seconds an entry is served for
+        max_bytes (int): total frame size budget; LRU entries evicted past it
+        logger (:obj:`logging.logger`): logging handle
+
+    '''
+    def __init__(
+            self,
+            ttl,
+            max_bytes=DEFAULT_MAX_MB * 1024 * 1024,
+            logger=DEFAULT_LOGGER
+    ):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._logger = logger
+        self._entries = OrderedDict()   #key: (frame, expires_at, nbytes, start, end, filters)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def get(self, key):
+        '''copy of the cached frame, or None'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            frame = entry[0]
+        #callers own their copy: mutating it must not poison the cache
+        return frame.copy()
+
+    def put(self, key, frame, datetime_start, datetime_end, kwargs, generation=None):
+        '''cache a result; (start, end, kwargs) describe the rows it covers
+
+        Args:
+            generation (int, optional): `generation` read before the query ran.
+                Stale (a write invalidated since): not cached
+
+        '''
+        nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        entry = (
+            frame.copy(),
+            time.monotonic() + self.ttl,
+            nbytes,
+            pandas.Timestamp(datetime_start),
+            pandas.Timestamp(datetime_end) if datetime_end else None,
+            {
+                key_name: set(match_value(value) for value in values)
+                for key_name, values in normalize_filters(kwargs or {})
+            }
+        )
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_puts += 1
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._total_bytes += nbytes
+            while self._total_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._drop(oldest_key)
+                self.evictions += 1
+
+    def _drop(self, key):
+        '''remove one entry (lock held)'''
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry[2]
+
+    def invalidate(self, written_low, written_high, written_values):
+        '''drop entries whose (time range, filters) overlap a write
+
+        Args:
+            written_low (:obj:`pandas.Timestamp`): oldest index_key written
+            written_high (:obj:`pandas.Timestamp`): newest index_key written
+            written_values (:obj:`dict`): {primary_key: values written}
+
+        '''
+        written_values = {
+            key_name: set(match_value(value) for value in values)
+            for key_name, values in written_values.items()
+        }
+        with self._lock:
+            self.generation += 1
+            stale_keys = []
+            for key, entry in self._entries.items():
+                _, _, _, start, end, filters = entry
+                if written_high < start or (end is not None and written_low >= end):
+                    continue
+                if any(
+                        key_name in written_values and
+                        not values & written_values[key_name]
+                        for key_name, values in filters.items()
+                ):
+                    continue
+                stale_keys.append(key)
+            for key in stale_keys:
+                self._drop(key)
+            self.invalidations += len(stale_keys)
+        if stale_keys:
+            self._logger.debug('-- result cache invalidated %d entries', len(stale_keys))
+
+    def clear(self):
+        '''drop everything (counters kept)'''
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        '''hit/miss/eviction/invalidation counters + current size'''
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'stale_puts': self.stale_puts,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes
+            }
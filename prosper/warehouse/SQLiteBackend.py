@@ -0,0 +1,78 @@
+'''SQLiteBackend.py: embedded sqlite3 backend for TableType.SQLite datasources'''
+
+import datetime
+import re
+import sqlite3
+import logging
+#use NullHandler to avoid "NoneType is not Scriptable" exceptions
+DEFAULT_LOGGER = logging.getLogger('NULL')
+DEFAULT_LOGGER.addHandler(logging.NullHandler())
+
+MEMORY_PATH = ':memory:'
+DEFAULT_TIMEOUT = 30.0  #seconds to wait on a locked db (busy_timeout)
+PRAGMAS = (
+    ('journal_mode', 'WAL'),        #readers don't block the writer
+    ('synchronous', 'NORMAL'),      #fsync at checkpoints only: safe under WAL
+    ('temp_store', 'MEMORY'),
+    ('cache_size', '-65536'),       #64MB page cache (negative = KiB)
+    ('mmap_size', '268435456')      #256MB memory-mapped reads
+)
+
+#text layout shared with QueryBuilder.bind_time(): string compares == time compares
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat() + ' 00:00:00')
+
+def connect(
+        db_path=None,
+        memory_name='prosper_warehouse',
+        timeout=DEFAULT_TIMEOUT,
+        pragmas=PRAGMAS,
+        logger=DEFAULT_LOGGER
+):
+    '''open a tuned sqlite3 connection (pool factory for TableType.SQLite)
+
+    Args:
+        db_path (str): database file.  ':memory:'/None: one shared in-process db
+        memory_name (str): names the shared in-memory db (one per schema)
+        timeout (float): busy timeout, seconds
+        pragmas (tuple): (name, value) PRAGMAs run on every new connection
+        logger (:obj:`logging.logger`): logging handle
+
+    Returns:
+        (:obj:`sqlite3.Connection`): usable from any thread (the pool serializes use)
+
+    '''
+    uri = False
+    if not db_path or db_path == MEMORY_PATH:
+        #plain :memory: is private per connection; pooled connections must share one db
+        db_path = 'file:{0}?mode=memory&cache=shared'.format(memory_name)
+        uri = True
+    logger.info('-- sqlite connect: %s', db_path)
+    connection = sqlite3.connect(
+        db_path,
+        timeout=timeout,
+        check_same_thread=False,
+        uri=uri
+    )
+    for pragma_name, value in pragmas:
+        connection.execute('PRAGMA {0}={1}'.format(pragma_name, value))
+    return connection
+
+def translate_ddl(create_string):
+    '''SQL/*.mysql table-create file -> sqlite DDL
+
+    Column types keep their MySQL names (sqlite maps them by affinity);
+    only syntax sqlite rejects is rewritten.  Exact types stay recoverable
+    from the original file (TypeMap.parse_ddl).
+
+    '''
+    #table options: ENGINE=InnoDB DEFAULT CHARSET=latin1 ...
+    create_string = re.sub(r'\)\s*ENGINE\s*=[^;]*', ')', create_string, flags=re.IGNORECASE)
+    #ENUM('a','b') -> TEXT
+    create_string = re.sub(r"\bENUM\s*\((?:[^')]|'(?:[^']|'')*')*\)", 'TEXT', create_string, flags=re.IGNORECASE)
+    #DOUBLE() / FLOAT() -> DOUBLE / FLOAT
+    create_string = re.sub(
+        r'\b(DOUBLE|FLOAT|REAL|DECIMAL)\(\s*\)', r'\1', create_string, flags=re.IGNORECASE
+    )
+    create_string = re.sub(r'\bUNSIGNED\b', '', create_string, flags=re.IGNORECASE)
+    return create_string
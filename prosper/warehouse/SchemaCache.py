@@ -0,0 +1,118 @@
+'''SchemaCache.py: remember which tables already passed test_table()'''
+
+import hashlib
+import json
+import time
+import threading
+from os import path, replace
+import tempfile
+import logging
+#use NullHandler to avoid "NoneType is not Scriptable" exceptions
+DEFAULT_LOGGER = logging.getLogger('NULL')
+DEFAULT_LOGGER.addHandler(logging.NullHandler())
+
+VALIDATED = {}  #key_str: fingerprint -- per-process, lives as long as the process
+CACHE_LOCK = threading.Lock()
+
+def schema_fingerprint(*parts):
+    '''stable hash of whatever defines "the schema we validated against"'''
+    hasher = hashlib.sha1()
+    for part in parts:
+        hasher.update(repr(part).encode('utf-8'))
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+def _key_str(validation_key):
+    '''tuple key -> str (json-safe)'''
+    return '|'.join(str(element) for element in validation_key)
+
+def _read_disk_cache(cache_path):
+    '''load {key_str: {fingerprint, validated_at}}; empty on any problem'''
+    try:
+        with open(cache_path, 'r') as file_handle:
+            return json.load(file_handle)
+    except (OSError, ValueError):
+        return {}
+
+def is_validated(
+        validation_key,
+        fingerprint,
+        cache_path=None,
+        ttl=None,
+        logger=DEFAULT_LOGGER
+):
+    '''check process cache, then (optional) disk cache for a matching fingerprint
+
+    Args:
+        validation_key (tuple): identifies the physical table
+        fingerprint (str): schema_fingerprint() of the expected schema
+        cache_path (str, optional): json file shared between processes
+        ttl (float, optional): seconds a disk entry stays trusted
+        logger (:obj:`logging.logger`): logging handle
+
+    Returns:
+        (bool): True if test_table() can be skipped
+
+    '''
+    key_str = _key_str(validation_key)
+    with CACHE_LOCK:
+        if VALIDATED.get(key_str) == fingerprint:
+            return True
+
+    if not cache_path:
+        return False
+
+    entry = _read_disk_cache(cache_path).get(key_str)
+    if not entry or entry.get('fingerprint') != fingerprint:
+        return False
+    if ttl is not None and time.time() - entry.get('validated_at', 0) > ttl:
+        logger.info('-- schema cache entry expired: %s', key_str)
+        return False
+
+    with CACHE_LOCK:
+        VALIDATED[key_str] = fingerprint
+    return True
+
+def mark_validated(
+        validation_key,
+        fingerprint,
+        cache_path=None,
+        logger=DEFAULT_LOGGER
+):
+    '''record a passing test_table() in-process and (optionally) on disk'''
+    key_str = _key_str(validation_key)
+    with CACHE_LOCK:
+        VALIDATED[key_str] = fingerprint
+
+    if not cache_path:
+        return
+
+    disk_cache = _read_disk_cache(cache_path)
+    disk_cache[key_str] = {
+        'fingerprint': fingerprint,
+        'validated_at': time.time()
+    }
+    try:
+        #write-then-rename so concurrent readers never see a half-written file
+        file_handle = tempfile.NamedTemporaryFile(
+            'w',
+            dir=path.dirname(path.abspath(cache_path)),
+            delete=False
+        )
+        with file_handle:
+            json.dump(disk_cache, file_handle)
+        replace(file_handle.name, cache_path)
+    except OSError:
+        logger.warning(
+            'WARNING: unable to write schema cache\r\tcache_path=%s',
+            cache_path,
+            exc_info=True
+        )
+
+def clear(validation_key=None):
+    '''forget validations (all, or one table).  Disk cache is left alone'''
+    with CACHE_LOCK:
+        if validation_key is None:
+            VALIDATED.clear()
+        else:
+            VALIDATED.pop(_key_str(validation_key), None)
@@ -0,0 +1,166 @@
+'''TypeMap.py: column types from the table schema -> compact pandas dtypes'''
+
+import re
+import threading
+import logging
+#use NullHandler to avoid "NoneType is not Scriptable" exceptions
+DEFAULT_LOGGER = logging.getLogger('NULL')
+DEFAULT_LOGGER.addHandler(logging.NullHandler())
+
+import prosper.warehouse.Utilities as table_utils
+
+pandas = table_utils.lazy_import('pandas')
+
+COLUMN_PATTERN = re.compile(r'^\s*`?(\w+)`?\s+(\w+(?:\s*\([^)]*\))?(?:\s+unsigned)?)', re.IGNORECASE)
+ENUM_PATTERN = re.compile(r"'((?:[^']|'')*)'")
+SKIP_WORDS = ('primary', 'primary_key', 'key', 'index', 'unique', 'constraint', 'foreign')
+
+#base SQL type -> pandas dtype (None: leave as decoded)
+MYSQL_DTYPES = {
+    'tinyint': 'int8',
+    'smallint': 'int16',
+    'mediumint': 'int32',
+    'int': 'int32',
+    'integer': 'int32',
+    'bigint': 'int64',
+    'float': 'float32',
+    'real': 'float64',
+    'double': 'float64',
+    'decimal': 'float64',
+    'numeric': 'float64',
+    'bool': 'bool',
+    'boolean': 'bool',
+    'bit': 'bool',
+    'date': 'datetime64[ns]',
+    'datetime': 'datetime64[ns]',
+    'timestamp': 'datetime64[ns]',
+    'enum': 'category',
+    'char': None,
+    'varchar': None,
+    'text': None
+}
+
+DTYPE_CACHE = {}    #validation key: {column: dtype}
+CACHE_LOCK = threading.Lock()
+
+def column_dtype(column_type):
+    '''one SQL column type ('INT(8)', "enum('a','b')", 'tinyint(1)') -> pandas dtype
+
+    Returns:
+        (str or :obj:`pandas.CategoricalDtype` or None): None if no compact mapping
+
+    '''
+    raw_type = column_type.strip()
+    column_type = raw_type.lower()
+    base_type = re.split(r'[\s(]', column_type, maxsplit=1)[0]
+    dtype = MYSQL_DTYPES.get(base_type)
+    if dtype is None:
+        return None
+    if base_type == 'enum':
+        return pandas.CategoricalDtype(
+            [value.replace("''", "'") for value in ENUM_PATTERN.findall(raw_type)]
+        )
+    if base_type == 'tinyint' and column_type.startswith('tinyint(1)'):
+        return 'bool'   #MySQL's BOOL is TINYINT(1)
+    if 'unsigned' in column_type and dtype.startswith('int'):
+        return 'u' + dtype
+    return dtype
+
+def parse_ddl(create_string):
+    '''{column: column type} from the CREATE TABLE in a SQL/*.mysql file'''
+    column_types = {}
+    for statement in create_string.split(';'):
+        match = re.search(r'CREATE\s+TABLE[^(]*\((.*)\)', statement, re.IGNORECASE | re.DOTALL)
+        if match:
+            break
+    else:
+        return column_types
+    for line in match.group(1).split('\n'):
+        column_match = COLUMN_PATTERN.match(line)
+        if not column_match or column_match.group(1).lower() in SKIP_WORDS:
+            continue
+        column_types[column_match.group(1)] = column_match.group(2)
+    return column_types
+
+def parse_overrides(override_str):
+    '''cfg `dtype_overrides = serverOpen:bool,typeid:int64` -> dict'''
+    overrides = {}
+    if not override_str:
+        return overrides
+    for entry in override_str.split(','):
+        if ':' not in entry:
+            continue
+        column, dtype = entry.split(':', 1)
+        overrides[column.strip()] = dtype.strip()
+    return overrides
+
+def build_dtype_map(column_types, index_key=None, overrides=None):
+    '''{column: SQL type} -> {column: pandas dtype}, overrides win'''
+    dtypes = {}
+    for column, column_type in column_types.items():
+        dtype = column_dtype(column_type)
+        if dtype is not None:
+            dtypes[column] = dtype
+    if index_key:
+        dtypes[index_key] = 'datetime64[ns]'
+    dtypes.update(overrides or {})
+    return dtypes
+
+def apply_dtypes(frame, dtypes, logger=DEFAULT_LOGGER):
+    '''cast frame columns in place of the int64/float64/object read_sql gives back
+
+    Integer columns holding NULLs or fractional values stay float (numpy ints
+    have no NaN, and the cast would truncate).  A column that won't cast is
+    left as decoded and logged.
+
+    '''
+    for column in frame.columns:
+        dtype = dtypes.get(column)
+        if dtype is None:
+            continue
+        series = frame[column]
+        if series.dtype == dtype:
+            #already decoded as this type (ColumnDecoder)
+            continue
+        try:
+            if dtype == 'datetime64[ns]':
+                #pandas>=2 keeps the resolution it parsed (us, s): every path hands back ns
+                frame[column] = pandas.to_datetime(series).astype(dtype)
+            elif dtype == 'bool':
+                if not series.isnull().any():
+                    frame[column] = series.astype('bool')
+            elif isinstance(dtype, str) and dtype.lstrip('u').startswith('int'):
+                if series.isnull().any():
+                    if str(series.dtype) != 'float64':
+                        frame[column] = series.astype('float64')
+                else:
+                    cast_series = series.astype(dtype)
+                    if series.dtype.kind == 'f' and (cast_series != series).any():
+                        raise ValueError('fractional values in integer column')
+                    frame[column] = cast_series
+            else:
+                frame[column] = series.astype(dtype)
+        except (TypeError, ValueError):
+            logger.warning(
+                'WARNING: unable to apply dtype\r\tcolumn=%s\r\tdtype=%s',
+                column, dtype
+            )
+    return frame
+
+def get_cached(cache_key):
+    '''dtype map for a table, or None'''
+    with CACHE_LOCK:
+        return DTYPE_CACHE.get(cache_key)
+
+def set_cached(cache_key, dtypes):
+    '''remember a table's dtype map for the life of the process'''
+    with CACHE_LOCK:
+        DTYPE_CACHE[cache_key] = dtypes
+
+def clear(cache_key=None):
+    '''forget dtype maps (all, or one table)'''
+    with CACHE_LOCK:
+        if cache_key is None:
+            DTYPE_CACHE.clear()
+        else:
+            DTYPE_CACHE.pop(cache_key, None)
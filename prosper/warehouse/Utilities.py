@@ -1,12 +1,94 @@
 '''Utilities.py: working functions for parsing database stuff'''
 
 import datetime
-import re
+import importlib
+import queue
+import threading
+import types
+from os import path
 import logging
 #use NullHandler to avoid "NoneType is not Scriptable" exceptions
 DEFAULT_LOGGER = logging.getLogger('NULL')
 DEFAULT_LOGGER.addHandler(logging.NullHandler())
 
+class LazyModule(types.ModuleType):
+    '''stand-in for a heavy module (pandas/numpy): imported on first attribute access
+
+    The real import goes through importlib's per-module locks, so the first
+    access is thread-safe; afterwards attributes are served from this
+    module's own __dict__ without the __getattr__ hop.
+
+    '''
+    def __getattr__(self, attr_name):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr_name)
+
+def lazy_import(module_name):
+    '''`pandas = lazy_import('pandas')`: defer a heavy import until first use'''
+    return LazyModule(module_name)
+
+## Logging: nothing is formatted unless a handler actually emits the record ##
+class LogFields(dict):
+    '''structured log fields: renders `\\r\\tkey=value` lines only when formatted'''
+    def __str__(self):
+        return ''.join('\r\t{0}={1}'.format(key, value) for key, value in self.items())
+
+class LogFrame:
+    '''DataFrame log argument: stringified only when a DEBUG record is emitted'''
+    def __init__(self, frame, max_rows=20):
+        self.frame = frame
+        self.max_rows = max_rows
+
+    def __str__(self):
+        return self.frame.to_string(max_rows=self.max_rows)
+
+def log_fields(logger, level, message, exc_info=False, **fields):
+    '''log message + key=value fields, e.g.:
+
+        log_fields(logger, logging.ERROR, 'EXCEPTION: query failed', exc_info=True, query=query)
+
+    Fields are also on record.fields for structured (JSON) handlers.
+    Returns immediately if the logger is disabled for level.
+
+    '''
+    if not logger.isEnabledFor(level):
+        return
+    fields = LogFields(fields)
+    logger.log(level, '%s%s', message, fields, exc_info=exc_info, extra={'fields': fields})
+
+CONFIG_CACHE = {}   #cfg abspath: parsed config, shared by every table_config module
+CONNECTION_VALUES_CACHE = {}    #(cfg abspath, key_name): get_config_values()
+CONFIG_LOCK = threading.RLock()
+
+def load_config(config_path, logger=DEFAULT_LOGGER):
+    '''parse a table_config.cfg once per process (prosper.common get_config)'''
+    config_path = path.abspath(config_path)
+    with CONFIG_LOCK:
+        if config_path not in CONFIG_CACHE:
+            from prosper.common.prosper_config import get_config
+            logger.info('-- load_config: %s', config_path)
+            CONFIG_CACHE[config_path] = get_config(config_path)
+        return CONFIG_CACHE[config_path]
+
+def load_connection_values(config_path, key_name, logger=DEFAULT_LOGGER):
+    '''get_config_values() for one section, parsed once per process'''
+    cache_key = (path.abspath(config_path), key_name)
+    with CONFIG_LOCK:
+        if cache_key not in CONNECTION_VALUES_CACHE:
+            CONNECTION_VALUES_CACHE[cache_key] = get_config_values(
+                load_config(config_path, logger=logger),
+                key_name,
+                logger=logger
+            )
+        return CONNECTION_VALUES_CACHE[cache_key]
+
+def clear_config_cache():
+    '''forget parsed configs (next load_config() re-reads the file)'''
+    with CONFIG_LOCK:
+        CONFIG_CACHE.clear()
+        CONNECTION_VALUES_CACHE.clear()
+
 ## TODO: UTILTIES ##
 def bool_can_write(DatabaseClass):
     '''return permissions if writing to db is allowed'''
@@ -20,7 +102,7 @@ def get_config_values(
         logger=DEFAULT_LOGGER
 ):
     '''parses standardized config object and returns vals, or defaults'''
-    logger.info('----get_config_values: Parsing config for: {key_name}'.format(key_name=key_name))
+    logger.info('----get_config_values: Parsing config for: %s', key_name)
     connection_values = {}
     connection_values['schema'] = config_object.get(key_name, 'db_schema')
     connection_values['host']   = config_object.get(key_name, 'db_host')
@@ -44,9 +126,105 @@ def get_config_values(
         connection_values['port']   = int(config_object.get('default', 'db_port'))
         connection_values['table']  = key_name
 
+    ## Backend: mysql (default), sqlite (embedded: sqlite_path, :memory: if unset) ##
+    connection_values['table_type'] = get_config_option(
+        config_object, key_name, 'table_type', 'mysql'
+    ).lower()
+    connection_values['sqlite_path'] = get_config_option(
+        config_object, key_name, 'sqlite_path', None
+    )
+
+    ## Pool settings: optional, fall back to [default] then module defaults ##
+    connection_values['pool_size'] = int(get_config_option(
+        config_object, key_name, 'pool_size', 5
+    ))
+    connection_values['pool_idle_timeout'] = float(get_config_option(
+        config_object, key_name, 'pool_idle_timeout', 300
+    ))
+    connection_values['pool_health_check'] = str_to_bool(get_config_option(
+        config_object, key_name, 'pool_health_check', True
+    ))
+
+    ## put_data() write path: see BulkLoader.WriteStrategy ##
+    connection_values['write_strategy'] = get_config_option(
+        config_object, key_name, 'write_strategy', 'batch_insert'
+    ).lower()
+    connection_values['write_batch_size'] = int(get_config_option(
+        config_object, key_name, 'write_batch_size', 5000
+    ))
+
+    ## get_data() local columnar cache: off unless local_cache_path is set ##
+    connection_values['local_cache_path'] = get_config_option(
+        config_object, key_name, 'local_cache_path', None
+    )
+    connection_values['local_cache_max_mb'] = float(get_config_option(
+        config_object, key_name, 'local_cache_max_mb', 512
+    ))
+
+    ## get_data() dtypes: compact types from the table schema (+ overrides) ##
+    connection_values['compact_dtypes'] = str_to_bool(get_config_option(
+        config_object, key_name, 'compact_dtypes', True
+    ))
+    connection_values['dtype_overrides'] = get_config_option(
+        config_object, key_name, 'dtype_overrides', ''
+    )
+    connection_values['fast_decode'] = str_to_bool(get_config_option(
+        config_object, key_name, 'fast_decode', True
+    ))
+
+    ## get_data() result cache: off unless result_cache_ttl > 0 ##
+    connection_values['result_cache_ttl'] = float(get_config_option(
+        config_object, key_name, 'result_cache_ttl', 0
+    ))
+    connection_values['result_cache_max_mb'] = float(get_config_option(
+        config_object, key_name, 'result_cache_max_mb', 256
+    ))
+
+    ## get_data()/put_data() profiling (Profiler.py): off unless profile_path is set ##
+    connection_values['profile_path'] = get_config_option(
+        config_object, key_name, 'profile_path', None
+    )
+    connection_values['profile_sample_rate'] = int(get_config_option(
+        config_object, key_name, 'profile_sample_rate', 1
+    ))
+    connection_values['profile_memory'] = str_to_bool(get_config_option(
+        config_object, key_name, 'profile_memory', False
+    ))
+
+    ## test_table() cache: optional json file shared across processes ##
+    connection_values['schema_cache_path'] = get_config_option(
+        config_object, key_name, 'schema_cache_path', None
+    )
+    schema_cache_ttl = get_config_option(config_object, key_name, 'schema_cache_ttl', None)
+    connection_values['schema_cache_ttl'] = \
+        float(schema_cache_ttl) if schema_cache_ttl is not None else None
+
     #logger.debug(str(connection_values))
     return connection_values
 
+def get_config_option(
+        config_object,
+        key_name,
+        option_name,
+        default=None
+):
+    '''read an optional config value: [key_name] -> [default] -> default arg
+
+    Blank and #SECRET placeholders count as unset'''
+    for section in (key_name, 'default'):
+        if not config_object.has_option(section, option_name):
+            continue
+        value = config_object.get(section, option_name)
+        if value and not value.startswith('#'):
+            return value
+    return default
+
+def str_to_bool(value):
+    '''config strings -> bool'''
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
 ## TODO: UTILTIES ##
 def bool_test_headers(
         existing_headers,
@@ -83,7 +261,7 @@ def bool_test_headers(
                     if orphan_list else ''
             )
 
-        logger.ERROR(error_msg)
+        logger.error('%s', error_msg)
         return error_msg
 
     else:
@@ -127,48 +305,48 @@ def test_args_headers(data_keys, args):
     else:
         return True
 
-ILICIT_PATTERN = re.compile('[`\\;]+|(--)+')
-def format_kwargs(kwargs, table_type=None):
-    '''parse key:values to build up filter keys'''
-    #TODO: change query magic on table_type
-    #FIXME: this seems stupid vvv
-    if not kwargs:
-        return ''
-    query_list = []
-    for key, value in kwargs.items():
-        #FIXME: validate values: SQL injection risk
-        value_str = ''
-        bool_multi = False
-        if ILICIT_PATTERN.match(str(value)):
-            raise RuntimeError('SQL INJECTION SUSPECT: {0}'.format(value))
-
-        if isinstance(value, str):
-            if ',' not in value_str:
-                value_str = '\'{0}\''.format(value)
-            else:
-                #test collection of strings to add ''?
-                value_str = value
-                bool_multi= True
-
-        elif isinstance(value, list):
-            value_str = ','.join(str(v) for v in value)
-            bool_multi= True
-        elif isinstance(value, int):
-            value_str = value
-
-        partial_str = ''
-        if bool_multi:
-            partial_str = '{key} IN ({value_str}) '.\
-                format(
-                    key=key,
-                    value_str=value_str
-                )
-        else:
-            partial_str = '{key}={value} '.\
-            format(
-                key=key,
-                value=value_str
-            )
-        query_list.append(partial_str)
-    query_str = 'AND ({0})'.format('AND '.join(query_list))
-    return query_str
+class PrefetchIterator:
+    '''iterate fetch_func() results while fetching the next one on a background thread
+
+    Stops after the first falsy result (empty chunk).  Call close() if abandoning
+    early so the worker thread is released before its cursor is.
+
+    '''
+    def __init__(self, fetch_func):
+        self._fetch_func = fetch_func
+        self._queue = queue.Queue(maxsize=1)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def _worker(self):
+        '''fetch one chunk ahead of the consumer'''
+        try:
+            while not self._stop.is_set():
+                chunk = self._fetch_func()
+                self._queue.put((None, chunk))
+                if not chunk:
+                    return
+        except Exception as error_msg:
+            self._queue.put((error_msg, None))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        error_msg, chunk = self._queue.get()
+        if error_msg is not None:
+            raise error_msg
+        if not chunk:
+            raise StopIteration
+        return chunk
+
+    def close(self):
+        '''stop the worker: drain the queue until it notices'''
+        self._stop.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._thread.join()
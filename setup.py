@@ -76,8 +76,11 @@ setup(
     version='0.0.4',
     license='MIT',
     classifiers=[
-        'Programming Language :: Python :: 3.5'
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7'
     ],
+    python_requires='>=3.7',
     keywords='prosper eveonline api database',
     packages=hack_find_packages('prosper'),
     include_package_data=True,
@@ -92,16 +95,27 @@ setup(
             'table_configs/table_config.cfg'
         ]
     },
+    tests_require=[
+        'pytest'
+    ],
+    cmdclass={
+        'test':PyTest
+    },
     install_requires=[
         'configparser==3.5.0',
-        'mysql-connector==2.1.4',
-        'numpy==1.11.1',
-        'pandas==0.18.1',
+        'mysql-connector-python>=8.0',
+        'numpy>=1.17',
+        'pandas>=1.1',
         'plumbum==1.6.2',
-        'python-dateutil==2.5.3',
-        'pytz==2016.6.1',
+        'python-dateutil>=2.7.3',
+        'pytz>=2017.2',
         'six==1.10.0',
         'requests==2.11.1',
         'ProsperCommon==0.3.3'
-    ]
+    ],
+    extras_require={
+        'postgres':[
+            'psycopg2'
+        ]
+    }
 )
@@ -0,0 +1,163 @@
+'''conftest.py: SQLite-backed datasources shared by the warehouse tests
+
+Keys come from prosper/table_configs/table_config.cfg and DDL from SQL/, like
+the real table_configs; the connection is an embedded TableType.SQLite file
+under pytest's tmp_path, so the suite runs without a database server.
+
+'''
+
+import configparser
+import itertools
+from os import path
+
+import pandas
+import pytest
+
+import prosper.warehouse.Connection as Connection
+import prosper.warehouse.ConnectionPool as table_pool
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.dirname(HERE)
+CONFIG_ABSPATH = path.join(ROOT, 'prosper', 'table_configs', 'table_config.cfg')
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read(CONFIG_ABSPATH)
+
+_SCHEMA_IDS = itertools.count()
+
+class SQLiteTestTable(Connection.SQLTable):
+    '''table_configs-style SQLTable on a per-test sqlite file'''
+    CONFIG_SECTION = None
+    CONNECTION_VALUES = None
+
+    def set_local_path(self):
+        return path.join(ROOT, 'prosper', 'table_configs')
+
+    def _define_table_type(self):
+        return Connection.TableType().set_table_type(self.CONNECTION_VALUES['table_type'])
+
+    def get_table_create_string(self):
+        create_file = path.join(self.local_path, CONFIG.get(self.CONFIG_SECTION, 'table_create_file'))
+        with open(create_file, 'r') as file_handle:
+            return file_handle.read()
+
+    def get_keys(self):
+        self.index_key = CONFIG.get(self.CONFIG_SECTION, 'index_key')
+        return (
+            CONFIG.get(self.CONFIG_SECTION, 'primary_keys').split(','),
+            CONFIG.get(self.CONFIG_SECTION, 'data_keys').split(',')
+        )
+
+    def _set_info(self):
+        return self.CONFIG_SECTION, self.CONNECTION_VALUES['schema']
+
+    def get_connection_values(self):
+        return self.CONNECTION_VALUES
+
+    def get_connection(self):
+        raise Connection.UnsupportedTableType('sqlite only', self.CONFIG_SECTION)
+
+    def test_table(self):
+        self.test_table_exists(self.table_name, self.schema_name)
+        self.test_table_headers(self.table_name, self.schema_name, self.all_keys)
+
+    def latest_entry(self, **kwargs):
+        latest_frame = self.latest_entries(**kwargs)
+        if latest_frame.empty:
+            return None
+        return latest_frame[self.index_key].max()
+
+class SchemaLookupTable(SQLiteTestTable):
+    '''get_dtypes() borrows a pooled connection, like MySQL's INFORMATION_SCHEMA query'''
+    def get_dtypes(self, refresh=False):
+        with self._borrow_connection():
+            pass
+        return super().get_dtypes(refresh)
+
+def connection_values(sqlite_path, **overrides):
+    '''same shape as Utilities.get_config_values(), pointed at a sqlite file'''
+    values = {
+        'table_type': 'SQLite',
+        'sqlite_path': sqlite_path,
+        #validation/dtype caches are keyed on schema: one per test
+        'schema': 'prosper_test_{0}'.format(next(_SCHEMA_IDS)),
+        'host': None,
+        'user': None,
+        'passwd': None,
+        'port': None,
+        'table': None,
+        'pool_size': 4,
+        'pool_idle_timeout': 300,
+        'pool_health_check': False,
+        'write_strategy': 'upsert',
+        'write_batch_size': 1000,
+        'local_cache_path': None,
+        'local_cache_max_mb': 64,
+        'compact_dtypes': True,
+        'fast_decode': True,
+        'dtype_overrides': '',
+        'result_cache_ttl': 0,
+        'result_cache_max_mb': 64,
+        'schema_cache_path': None,
+        'schema_cache_ttl': None,
+        'profile_path': None,
+        'profile_sample_rate': 1,
+        'profile_memory': False
+    }
+    values.update(overrides)
+    return values
+
+@pytest.fixture
+def make_table(tmp_path):
+    '''make_table(section, table_base=SQLiteTestTable, **connection overrides)
+    -> validated datasource
+
+    Every call in one test shares the test's sqlite file (and so its data).
+
+    '''
+    sqlite_path = str(tmp_path / 'warehouse.sqlite')
+    schema_name = None
+
+    def _make_table(section, table_base=SQLiteTestTable, **overrides):
+        nonlocal schema_name
+        values = connection_values(sqlite_path, **overrides)
+        if schema_name is None:
+            schema_name = values['schema']
+        values['schema'] = schema_name
+        table_class = type(section, (table_base,), {
+            'CONFIG_SECTION': section,
+            'CONNECTION_VALUES': values
+        })
+        return table_class(section)
+
+    yield _make_table
+    table_pool.close_pools()
+
+def crest_frame(days=4, typeids=(34, 35), regionids=(10000002,), start='2016-01-01'):
+    '''small, deterministic crest_markethistory payload (price_date as a column)'''
+    rows = []
+    for day, (typeid, regionid) in itertools.product(
+            range(days), itertools.product(typeids, regionids)
+    ):
+        rows.append({
+            'price_date': pandas.Timestamp(start) + pandas.Timedelta(days=day),
+            'typeid': typeid,
+            'regionid': regionid,
+            'orderCount': day + 1,
+            'volume': (day + 1) * 10 + typeid,
+            'lowPrice': 1.25 + day,
+            'highPrice': 2.5 + day,
+            'avgPrice': 1.75 + day
+        })
+    return pandas.DataFrame(rows)
+
+@pytest.fixture
+def crest_table(make_table):
+    '''crest_markethistory with crest_frame() loaded'''
+    table = make_table('crest_markethistory')
+    table.put_data(crest_frame())
+    return table
+
+def sort_frame(frame, columns):
+    '''row order + index independent comparison helper'''
+    return frame.sort_values(by=list(columns)).reset_index(drop=True)
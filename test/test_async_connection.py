@@ -0,0 +1,27 @@
+'''test_async_connection.py: asyncio facade over a SQLite datasource'''
+
+import asyncio
+
+import pandas
+
+import prosper.warehouse.AsyncConnection as AsyncConnection
+from conftest import crest_frame
+
+def test_async_round_trip(make_table):
+    table = AsyncConnection.AsyncDatabase(make_table('crest_markethistory'))
+
+    async def _session():
+        await table.put_data(crest_frame())
+        frames = await asyncio.gather(
+            table.get_data('2015-12-31', typeid=34),
+            table.get_data('2015-12-31', typeid=35)
+        )
+        chunks = [chunk async for chunk in table.iter_data('2015-12-31', chunk_size=3)]
+        latest = await table.latest_entry(typeid=34, regionid=10000002)
+        return frames, chunks, latest
+
+    frames, chunks, latest = asyncio.run(_session())
+    assert [len(frame) for frame in frames] == [4, 4]
+    assert sum(len(chunk) for chunk in chunks) == len(crest_frame())
+    assert latest == pandas.Timestamp('2016-01-04')
+    assert table.table_name == 'crest_markethistory'
@@ -0,0 +1,53 @@
+'''test_bulk_loader.py: put_data() write paths against a mocked MySQL connection'''
+
+import datetime
+from unittest import mock
+
+import pandas
+import pytest
+
+import prosper.warehouse.BulkLoader as table_bulk
+
+def _payload():
+    return pandas.DataFrame({
+        'price_date': pandas.to_datetime(['2016-01-01', '2016-01-02']),
+        'typeid': [34, 35],
+        'volume': [10, None]
+    }).set_index('price_date')
+
+def test_to_sql_on_mysql_is_a_batch_insert():
+    connection = mock.MagicMock()
+    cursor = connection.cursor.return_value
+    report = table_bulk.bulk_write(
+        connection,
+        _payload(),
+        'crest_markethistory',
+        'prosper',
+        strategy=table_bulk.WriteStrategy.ToSQL,
+        dialect='MySQL'
+    )
+
+    query_str, params = cursor.execute.call_args.args
+    assert query_str == \
+        'INSERT INTO `crest_markethistory` (`price_date`,`typeid`,`volume`) VALUES (%s,%s,%s),(%s,%s,%s)'
+    assert params == [
+        datetime.datetime(2016, 1, 1), 34, 10.0,
+        datetime.datetime(2016, 1, 2), 35, None
+    ]
+    connection.commit.assert_called_once_with()
+    assert report['strategy'] == table_bulk.WriteStrategy.ToSQL
+    assert report['rows'] == 2
+
+def test_failed_write_rolls_back():
+    connection = mock.MagicMock()
+    connection.cursor.return_value.execute.side_effect = RuntimeError('lost connection')
+    with pytest.raises(RuntimeError):
+        table_bulk.bulk_write(
+            connection,
+            _payload(),
+            'crest_markethistory',
+            strategy=table_bulk.WriteStrategy.ToSQL,
+            dialect='MySQL'
+        )
+    connection.rollback.assert_called_once_with()
+    connection.commit.assert_not_called()
@@ -0,0 +1,108 @@
+'''test_column_decoder.py: cursor batches -> typed numpy columns'''
+
+import datetime
+
+import numpy
+import pandas
+
+import prosper.warehouse.ColumnDecoder as table_decode
+
+class FakeCursor:
+    '''executed DB-API cursor over a fixed row list'''
+    def __init__(self, column_names, rows, rowcount=-1):
+        self.description = [(column_name,) + (None,) * 6 for column_name in column_names]
+        self.rowcount = rowcount
+        self._rows = list(rows)
+        self.fetch_sizes = []
+
+    def fetchmany(self, size):
+        batch, self._rows = self._rows[:size], self._rows[size:]
+        self.fetch_sizes.append(size)
+        return batch
+
+def test_decode_typed_columns():
+    rows = [
+        (datetime.datetime(2016, 1, day), 34, 1.5 * day, 'global')
+        for day in range(1, 6)
+    ]
+    cursor = FakeCursor(['price_date', 'typeid', 'avgPrice', 'location_type'], rows)
+    frame = table_decode.decode_cursor(
+        cursor,
+        {'price_date': 'datetime64[ns]', 'typeid': 'int32', 'avgPrice': 'float32'}
+    )
+    assert list(frame.columns) == ['price_date', 'typeid', 'avgPrice', 'location_type']
+    assert str(frame['price_date'].dtype) == 'datetime64[ns]'
+    assert frame['typeid'].dtype == 'int32'
+    assert frame['avgPrice'].dtype == 'float32'
+    assert pandas.api.types.is_string_dtype(frame['location_type'])
+    assert list(frame['avgPrice']) == [1.5, 3.0, 4.5, 6.0, 7.5]
+
+def test_decode_matches_from_records_across_batches():
+    '''batching/growth must not drop or reorder rows'''
+    rows = [(row, row * 2.0) for row in range(5000)]
+    cursor = FakeCursor(['typeid', 'volume'], rows)
+    frame = table_decode.decode_cursor(cursor, {'typeid': 'int64'}, batch_rows=777)
+    expected = pandas.DataFrame.from_records(rows, columns=['typeid', 'volume'])
+    pandas.testing.assert_frame_equal(frame, expected)
+    assert cursor.fetch_sizes == [777] * len(cursor.fetch_sizes)
+
+def test_decode_uses_rowcount_for_capacity():
+    rows = [(row,) for row in range(2000)]
+    frame = table_decode.decode_cursor(
+        FakeCursor(['typeid'], rows, rowcount=2000),
+        {'typeid': 'int32'},
+        batch_rows=500
+    )
+    assert len(frame) == 2000
+    assert frame['typeid'].iloc[-1] == 1999
+
+def test_decode_null_in_int_column_promotes_to_float():
+    cursor = FakeCursor(['typeid', 'orderCount'], [(34, 1), (35, None), (36, 3)])
+    frame = table_decode.decode_cursor(cursor, {'typeid': 'int32', 'orderCount': 'int32'})
+    assert frame['typeid'].dtype == 'int32'
+    assert frame['orderCount'].dtype == 'float64'
+    assert numpy.isnan(frame['orderCount'].iloc[1])
+    assert frame['orderCount'].iloc[2] == 3.0
+
+def test_decode_categorical():
+    dtype = pandas.CategoricalDtype(['regionid', 'global'])
+    cursor = FakeCursor(['location_type'], [('global',), ('regionid',), ('global',)])
+    frame = table_decode.decode_cursor(cursor, {'location_type': dtype})
+    assert frame['location_type'].dtype == dtype
+    assert list(frame['location_type']) == ['global', 'regionid', 'global']
+
+def test_decode_empty_result():
+    frame = table_decode.decode_cursor(FakeCursor(['typeid', 'volume'], []), {'typeid': 'int32'})
+    assert frame.empty
+    assert list(frame.columns) == ['typeid', 'volume']
+
+def test_decode_null_in_bool_column_stays_null():
+    '''numpy.array([None], dtype=bool) is False: the NULL must survive'''
+    cursor = FakeCursor(['serverOpen'], [(1,), (None,), (0,)])
+    frame = table_decode.decode_cursor(cursor, {'serverOpen': 'bool'})
+    assert list(frame['serverOpen'].isnull()) == [False, True, False]
+    assert list(frame['serverOpen'].fillna(-1)) == [1, -1, 0]
+
+def test_decode_null_in_later_batch():
+    '''promotion keeps the rows already written by earlier batches'''
+    rows = [(True, 1)] * 4 + [(None, None)] + [(False, 2)] * 3
+    cursor = FakeCursor(['serverOpen', 'orderCount'], rows)
+    frame = table_decode.decode_cursor(
+        cursor,
+        {'serverOpen': 'bool', 'orderCount': 'int32'},
+        batch_rows=3
+    )
+    assert list(frame['serverOpen'].isnull()) == [False] * 4 + [True] + [False] * 3
+    assert frame['orderCount'].dtype == 'float64'
+    assert list(frame['orderCount'].fillna(-1)) == [1.0] * 4 + [-1.0] + [2.0] * 3
+
+def test_decode_fractional_values_in_int_column():
+    '''1.5 in an int column is kept, not truncated to 1'''
+    cursor = FakeCursor(['orderCount'], [(1,), (1.5,), (3,)])
+    frame = table_decode.decode_cursor(cursor, {'orderCount': 'int32'})
+    assert list(frame['orderCount']) == [1.0, 1.5, 3.0]
+
+    #whole-number floats still fit
+    cursor = FakeCursor(['orderCount'], [(1.0,), (2.0,)])
+    frame = table_decode.decode_cursor(cursor, {'orderCount': 'int32'})
+    assert frame['orderCount'].dtype == 'int32'
@@ -0,0 +1,51 @@
+'''test_fetch_connection.py: table_configs loading + fetch_many()'''
+
+import pytest
+
+import prosper.warehouse.FetchConnection as FetchConnection
+from conftest import crest_frame
+
+TABLE_CONFIG = '''
+from conftest import SQLiteTestTable, connection_values
+
+class crest_markethistory(SQLiteTestTable):
+    CONFIG_SECTION = 'crest_markethistory'
+    CONNECTION_VALUES = connection_values({sqlite_path!r})
+'''
+
+@pytest.fixture
+def table_config_path(tmp_path):
+    '''a table_configs directory holding one SQLite-backed crest_markethistory'''
+    config_dir = tmp_path / 'table_configs'
+    config_dir.mkdir()
+    (config_dir / 'crest_markethistory.py').write_text(
+        TABLE_CONFIG.format(sqlite_path=str(tmp_path / 'warehouse.sqlite'))
+    )
+    yield str(config_dir)
+    FetchConnection.invalidate_cache(table_config_path=str(config_dir))
+
+def test_fetch_many_isolates_bad_requests(table_config_path):
+    data_source = FetchConnection.fetch_data_source(
+        'crest_markethistory',
+        table_config_path=table_config_path,
+        cache_instance=True
+    )
+    data_source.put_data(crest_frame())
+
+    good_spec = {'datetime_start': '2015-12-31', 'args': ['volume'], 'kwargs': {'typeid': 34}}
+    missing_start = {'args': ['volume']}
+    results = FetchConnection.fetch_many(
+        [
+            ('crest_markethistory', None, good_spec),
+            ('crest_markethistory', None, missing_start),
+            ('no_such_module', None, {'datetime_start': '2015-12-31'})
+        ],
+        table_config_path=table_config_path
+    )
+
+    assert [result.error is None for result in results] == [True, False, False]
+    assert len(results[0].data) == 4
+    assert isinstance(results[1].error, KeyError)
+    #caller's specs are not consumed
+    assert good_spec == {'datetime_start': '2015-12-31', 'args': ['volume'], 'kwargs': {'typeid': 34}}
+    assert missing_start == {'args': ['volume']}
@@ -0,0 +1,81 @@
+'''test_memmap_store.py: append-only memory-mapped column files'''
+
+import numpy
+import pandas
+import pytest
+
+import prosper.warehouse.MemMapStore as table_memmap
+
+def _history(start, days, typeids=(34, 35), regionid=10000002):
+    frames = []
+    for typeid in typeids:
+        frames.append(pandas.DataFrame({
+            'price_date': pandas.date_range(start, periods=days),
+            'typeid': typeid,
+            'regionid': regionid,
+            'location_type': 'regionid',
+            'volume': numpy.arange(days, dtype='int64') + typeid
+        }))
+    return pandas.concat(frames, ignore_index=True)
+
+@pytest.fixture
+def store(tmp_path):
+    return table_memmap.ColumnStore(str(tmp_path / 'crest'), 'price_date', ['typeid', 'regionid'])
+
+def test_append_and_search(store):
+    assert store.append(_history('2016-01-01', 10)) == 20
+    assert store.rows == 20
+    start, stop = store.search(low='2016-01-03', high='2016-01-06')
+    dates = store.column('price_date')[start:stop]
+    assert len(dates) == 2 * 2    #01-04, 01-05 for both typeids
+    assert dates.min() == numpy.datetime64('2016-01-04')
+
+    start, stop = store.search(low='2016-01-03', low_inclusive=True)
+    assert store.column('price_date')[start] == numpy.datetime64('2016-01-03')
+
+def test_rows_are_sorted_and_zero_copy(store):
+    store.append(_history('2016-01-01', 5))
+    dates = store.column('price_date')
+    assert (numpy.diff(dates.astype('int64')) >= 0).all()
+    assert isinstance(dates, numpy.memmap)
+
+def test_key_offsets_and_latest(store):
+    store.append(_history('2016-01-01', 5))
+    store.append(_history('2016-01-06', 5, typeids=(35, 36)))
+    offsets = store.key_offsets({'typeid': [35], 'regionid': [10000002]})
+    assert len(offsets) == 1
+    first_row, last_row, rows = offsets[0]
+    assert rows == 10
+    assert store.column('typeid')[first_row] == 35 and store.column('typeid')[last_row] == 35
+
+    #partial filter: scan the index
+    assert len(store.key_offsets({'typeid': [34, 36]})) == 2
+    assert len(store.key_offsets({})) == 3
+
+    assert store.latest((35, 10000002)) == numpy.datetime64('2016-01-10')
+    assert store.latest((34, 10000002)) == numpy.datetime64('2016-01-05')
+    assert store.latest((99, 10000002)) is None
+
+def test_strings_stored_as_categories(store):
+    store.append(_history('2016-01-01', 3))
+    codes = store.column('location_type')
+    assert codes.dtype == numpy.dtype(table_memmap.CATEGORY_DTYPE)
+    assert list(store.decode('location_type', codes[:2])) == ['regionid', 'regionid']
+    assert list(store.encode_filter('location_type', ['regionid', 'unknown'])) == [0]
+
+def test_out_of_order_append_refused(store):
+    store.append(_history('2016-01-05', 3))
+    with pytest.raises(table_memmap.OutOfOrderAppend):
+        store.append(_history('2016-01-01', 3))
+    assert store.rows == 6
+
+def test_schema_mismatch_refused(store):
+    store.append(_history('2016-01-01', 3))
+    with pytest.raises(table_memmap.SchemaMismatch):
+        store.append(_history('2016-01-04', 3).drop(columns=['volume']))
+
+def test_reopen_sees_committed_rows(store, tmp_path):
+    store.append(_history('2016-01-01', 4))
+    reopened = table_memmap.ColumnStore(str(tmp_path / 'crest'), 'price_date', ['typeid', 'regionid'])
+    assert reopened.rows == 8
+    assert reopened.latest((34, 10000002)) == numpy.datetime64('2016-01-04')
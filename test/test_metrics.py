@@ -0,0 +1,34 @@
+'''test_metrics.py: per-operation phase timings'''
+
+import threading
+
+import prosper.warehouse.Metrics as table_metrics
+
+def _phase_counts(operation_name):
+    return {
+        entry['tags']['phase']: entry['count']
+        for entry in table_metrics.snapshot()
+        if entry['metric'] == table_metrics.METRIC_SECONDS
+        and entry['tags']['operation'] == operation_name
+    }
+
+def test_attached_operation_collects_worker_phases():
+    table_metrics.reset()
+    with table_metrics.Operation('get_data', 'crest', 'SQLite') as operation:
+        def _worker():
+            with table_metrics.attached(operation), table_metrics.phase('fetch'):
+                pass
+        worker = threading.Thread(target=_worker)
+        worker.start()
+        worker.join()
+    assert _phase_counts('get_data') == {'fetch': 1, 'total': 1}
+    assert table_metrics.current_operation() is None
+
+def test_sliced_get_data_records_slice_phases(crest_table):
+    '''each slice runs on a worker thread: its connect/execute/fetch still count'''
+    table_metrics.reset()
+    crest_table.get_data('2015-12-31', datetime_end='2016-01-10', slices=3)
+    phase_counts = _phase_counts('get_data')
+    assert phase_counts['total'] == 1
+    for phase_name in ('connect', 'execute', 'fetch'):
+        assert phase_counts[phase_name] == 3
@@ -0,0 +1,127 @@
+'''test_query_builder.py: SQL text/params from QueryBuilder'''
+
+import numpy
+import pytest
+
+import prosper.warehouse.QueryBuilder as table_query
+
+def test_filter_shape_ignores_values():
+    '''same keys + list lengths -> same shape, whatever the values'''
+    assert table_query.filter_shape({'typeid': [34, 35], 'regionid': 1}) == \
+        table_query.filter_shape({'regionid': 2, 'typeid': [36, 37]})
+    assert table_query.filter_shape({'typeid': [34, 35]}) != \
+        table_query.filter_shape({'typeid': [34, 35, 36]})
+
+def test_bind_filters_order_matches_shape():
+    '''params come out in sorted-key order, lists flattened, numpy scalars unwrapped'''
+    params = table_query.bind_filters({'typeid': [numpy.int32(34), 35], 'regionid': numpy.int64(1)})
+    assert params == [1, 34, 35]
+    assert all(type(param) is int for param in params)
+
+def test_build_select_mysql():
+    query_string, params = table_query.build_select(
+        'crest_markethistory',
+        'price_date',
+        ['typeid', 'regionid'],
+        ['volume'],
+        '2016-01-01',
+        datetime_end='2016-02-01',
+        limit=10,
+        kwargs={'typeid': [34, 35], 'regionid': 10000002}
+    )
+    assert query_string == (
+        'SELECT price_date,typeid,regionid,volume FROM crest_markethistory '
+        'WHERE price_date > %s AND price_date < %s AND regionid=%s AND typeid IN (%s,%s) '
+        'ORDER BY price_date DESC LIMIT %s'
+    )
+    assert params == ['2016-01-01 00:00:00', '2016-02-01 00:00:00', 10000002, 34, 35, 10]
+
+def test_build_select_dialects():
+    '''sqlite binds with ?, postgres quotes case-sensitive names'''
+    sqlite_query, _ = table_query.build_select(
+        'crest_markethistory', 'price_date', ['typeid'], ['orderCount'], '2016-01-01',
+        kwargs={'typeid': 34}, dialect='SQLite'
+    )
+    assert '?' in sqlite_query and '%s' not in sqlite_query
+
+    postgres_query, _ = table_query.build_select(
+        'crest_markethistory', 'price_date', ['typeid'], ['orderCount'], '2016-01-01',
+        dialect='Postgres'
+    )
+    assert '"orderCount"' in postgres_query
+
+def test_empty_filter_list_matches_nothing():
+    query_string, params = table_query.build_select(
+        'crest_markethistory', 'price_date', ['typeid'], ['volume'], '2016-01-01',
+        kwargs={'typeid': []}
+    )
+    assert '1=0' in query_string
+    assert params == ['2016-01-01 00:00:00']
+
+def test_start_inclusive():
+    query_string, _ = table_query.build_select(
+        'crest_markethistory', 'price_date', [], ['volume'], '2016-01-01',
+        start_inclusive=True
+    )
+    assert 'price_date >= %s' in query_string
+
+def test_compile_select_is_cached_per_shape():
+    table_query.compile_select.cache_clear()
+    for typeid in (34, 35, 36):
+        table_query.build_select(
+            'crest_markethistory', 'price_date', ['typeid'], ['volume'], '2016-01-01',
+            kwargs={'typeid': typeid}
+        )
+    cache_info = table_query.cache_info()['select']
+    assert cache_info.misses == 1
+    assert cache_info.hits == 2
+
+@pytest.mark.parametrize('bucket,seconds', [
+    ('1D', 86400),
+    ('4H', 14400),
+    ('15min', 900),
+    ('w', 604800)
+])
+def test_bucket_seconds(bucket, seconds):
+    assert table_query.bucket_seconds(bucket) == seconds
+
+def test_bucket_seconds_rejects_unknown_unit():
+    with pytest.raises(ValueError):
+        table_query.bucket_seconds('3 fortnights')
+
+def test_agg_columns():
+    assert table_query.agg_columns({'volume': 'sum', 'avgPrice': ['min', 'max']}) == (
+        ('avgPrice_min', 'min', 'avgPrice'),
+        ('avgPrice_max', 'max', 'avgPrice'),
+        ('volume', 'sum', 'volume')
+    )
+    assert [output_name for output_name, _, _ in table_query.agg_columns({'avgPrice': 'ohlc'})] == \
+        ['avgPrice_open', 'avgPrice_high', 'avgPrice_low', 'avgPrice_close']
+    with pytest.raises(ValueError):
+        table_query.agg_columns({'volume': 'median'})
+
+def test_build_aggregate():
+    query_string, params, aggregates = table_query.build_aggregate(
+        'crest_markethistory',
+        'price_date',
+        ['typeid'],
+        {'volume': 'sum'},
+        '1D',
+        '2016-01-01',
+        kwargs={'typeid': 34},
+        dialect='SQLite'
+    )
+    assert 'SUM(volume) AS volume' in query_string
+    assert 'GROUP BY DATETIME(' in query_string
+    assert params == ['2016-01-01 00:00:00', 34]
+    assert aggregates == (('volume', 'sum', 'volume'),)
+
+def test_build_latest():
+    query_string, params = table_query.build_latest(
+        'crest_markethistory', 'price_date', ['typeid', 'regionid'], kwargs={'typeid': [34, 35]}
+    )
+    assert query_string == (
+        'SELECT typeid,regionid,MAX(price_date) FROM crest_markethistory '
+        'WHERE typeid IN (%s,%s) GROUP BY typeid,regionid'
+    )
+    assert params == [34, 35]
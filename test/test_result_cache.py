@@ -0,0 +1,114 @@
+'''test_result_cache.py: TTL/LRU get_data() result cache'''
+
+import time
+
+import numpy
+import pandas
+
+import prosper.warehouse.ResultCache as table_results
+
+def _frame(rows=3):
+    return pandas.DataFrame({
+        'price_date': pandas.date_range('2016-01-01', periods=rows),
+        'typeid': [34] * rows,
+        'volume': list(range(rows))
+    })
+
+def test_result_key_normalizes_filters():
+    '''filter order, list order and numpy scalars don't change the key'''
+    key_a = table_results.result_key(
+        'crest', '2016-01-01', ('volume',), kwargs={'typeid': [35, 34], 'regionid': 1}
+    )
+    key_b = table_results.result_key(
+        'crest', pandas.Timestamp('2016-01-01'), ('volume',),
+        kwargs={'regionid': numpy.int64(1), 'typeid': [34, numpy.int32(35)]}
+    )
+    assert key_a == key_b
+
+def test_result_key_days_back():
+    '''int datetime_start keys on the day count, not "now - days"'''
+    assert table_results.result_key('crest', 7, ()) == table_results.result_key('crest', 7, ())
+    assert table_results.result_key('crest', 7, ()) != table_results.result_key('crest', 8, ())
+
+def test_get_returns_a_copy():
+    cache = table_results.ResultCache(60)
+    cache.put('key', _frame(), '2016-01-01', None, {})
+    cached = cache.get('key')
+    cached['volume'] = -1
+    assert list(cache.get('key')['volume']) == [0, 1, 2]
+    assert cache.stats()['hits'] == 2
+
+def test_ttl_expires():
+    cache = table_results.ResultCache(0.01)
+    cache.put('key', _frame(), '2016-01-01', None, {})
+    time.sleep(0.02)
+    assert cache.get('key') is None
+    assert cache.stats()['entries'] == 0
+
+def test_lru_eviction_by_size():
+    frame = _frame(100)
+    frame_bytes = int(frame.memory_usage(index=True, deep=True).sum())
+    cache = table_results.ResultCache(60, max_bytes=frame_bytes * 2)
+    cache.put('a', frame, '2016-01-01', None, {})
+    cache.put('b', frame, '2016-01-01', None, {})
+    cache.get('a')      #a is now most recent: b goes first
+    cache.put('c', frame, '2016-01-01', None, {})
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.stats()['evictions'] == 1
+
+def test_invalidate_by_time_range():
+    cache = table_results.ResultCache(60)
+    cache.put('old', _frame(), '2016-01-01', '2016-01-05', {})
+    cache.put('open', _frame(), '2016-01-01', None, {})
+    cache.invalidate(
+        pandas.Timestamp('2016-02-01'),
+        pandas.Timestamp('2016-02-01'),
+        {}
+    )
+    assert cache.get('old') is not None
+    assert cache.get('open') is None
+
+def test_invalidate_by_filter_values():
+    cache = table_results.ResultCache(60)
+    cache.put('typeid_34', _frame(), '2016-01-01', None, {'typeid': 34})
+    cache.put('typeid_35', _frame(), '2016-01-01', None, {'typeid': [35, 36]})
+    cache.invalidate(
+        pandas.Timestamp('2016-01-02'),
+        pandas.Timestamp('2016-01-02'),
+        {'typeid': {'36'}}
+    )
+    assert cache.get('typeid_34') is not None
+    assert cache.get('typeid_35') is None
+
+def test_invalidate_matches_across_numeric_types():
+    '''a float-keyed payload (34.0) invalidates an int filter (34), and vice versa'''
+    cache = table_results.ResultCache(60)
+    cache.put('int_filter', _frame(), '2016-01-01', None, {'typeid': 34})
+    cache.put('str_filter', _frame(), '2016-01-01', None, {'typeid': '35'})
+    cache.put('other', _frame(), '2016-01-01', None, {'typeid': 36})
+    cache.invalidate(
+        pandas.Timestamp('2016-01-02'),
+        pandas.Timestamp('2016-01-02'),
+        {'typeid': numpy.array([34.0, 35.0])}
+    )
+    assert cache.get('int_filter') is None
+    assert cache.get('str_filter') is None
+    assert cache.get('other') is not None
+
+def test_match_value():
+    assert table_results.match_value(numpy.int32(34)) == table_results.match_value('34.0') == 34
+    assert table_results.match_value(34.5) == 34.5
+    assert table_results.match_value('regionid') == 'regionid'
+
+def test_stale_put_dropped():
+    '''a result queried before a write must not land in the cache after it'''
+    cache = table_results.ResultCache(60)
+    generation = cache.generation
+    cache.invalidate(pandas.Timestamp('2016-01-02'), pandas.Timestamp('2016-01-02'), {})
+    cache.put('in_flight', _frame(), '2016-01-01', None, {}, generation=generation)
+    assert cache.get('in_flight') is None
+    assert cache.stats()['stale_puts'] == 1
+
+    cache.put('fresh', _frame(), '2016-01-01', None, {}, generation=cache.generation)
+    assert cache.get('fresh') is not None
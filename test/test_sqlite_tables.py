@@ -0,0 +1,229 @@
+'''test_sqlite_tables.py: SQLTable end to end on the embedded SQLite backend'''
+
+import pandas
+import pytest
+
+import prosper.warehouse.Connection as Connection
+from conftest import SchemaLookupTable, crest_frame, sort_frame
+
+KEYS = ['price_date', 'typeid', 'regionid']
+
+def test_put_get_round_trip(crest_table):
+    frame = crest_table.get_data('2015-12-31')
+    expected = crest_frame()
+    assert len(frame) == len(expected)
+    assert list(frame.columns) == crest_table.all_keys
+    #newest first
+    assert frame['price_date'].is_monotonic_decreasing
+    pandas.testing.assert_frame_equal(
+        sort_frame(frame, KEYS),
+        sort_frame(expected, KEYS),
+        check_dtype=False
+    )
+
+def test_get_data_compact_dtypes(crest_table):
+    frame = crest_table.get_data('2015-12-31')
+    assert str(frame['price_date'].dtype) == 'datetime64[ns]'
+    assert frame['typeid'].dtype == 'int32'
+    assert frame['volume'].dtype == 'int64'
+    assert frame['avgPrice'].dtype == 'float32'
+
+def test_get_data_filters_and_columns(crest_table):
+    frame = crest_table.get_data(
+        '2016-01-01',
+        'volume',
+        datetime_end='2016-01-04',
+        typeid=35
+    )
+    assert list(frame.columns) == ['price_date', 'typeid', 'regionid', 'volume']
+    assert list(frame['price_date']) == [pandas.Timestamp('2016-01-03'), pandas.Timestamp('2016-01-02')]
+    assert set(frame['typeid']) == {35}
+
+    frame = crest_table.get_data('2015-12-31', typeid=[34, 35], limit=3)
+    assert len(frame) == 3
+    assert frame['price_date'].iloc[0] == pandas.Timestamp('2016-01-04')
+
+def test_get_data_rejects_unknown_keys(crest_table):
+    with pytest.raises(Exception):
+        crest_table.get_data('2015-12-31', 'notAColumn')
+
+def test_upsert_overwrites(crest_table):
+    update = crest_frame(days=1, typeids=(34,))
+    update['volume'] = 999
+    crest_table.put_data(update)
+    frame = crest_table.get_data('2015-12-31', 'volume', typeid=34, datetime_end='2016-01-02')
+    assert list(frame['volume']) == [999]
+    assert len(crest_table.get_data('2015-12-31')) == len(crest_frame())
+
+def test_put_data_rejects_unknown_columns(crest_table):
+    payload = crest_frame()
+    payload['notAColumn'] = 1
+    with pytest.raises(Connection.MismatchedHeaders):
+        crest_table.put_data(payload)
+
+def test_sliced_matches_single_query(crest_table):
+    single = crest_table.get_data('2015-12-31', datetime_end='2016-01-10')
+    for slice_mode in (Connection.SliceMode.Fixed, Connection.SliceMode.Adaptive):
+        sliced = crest_table.get_data(
+            '2015-12-31',
+            datetime_end='2016-01-10',
+            slices=3,
+            slice_mode=slice_mode
+        )
+        pandas.testing.assert_frame_equal(sort_frame(sliced, KEYS), sort_frame(single, KEYS))
+
+def test_iter_data_matches_get_data(crest_table):
+    chunks = list(crest_table.iter_data('2015-12-31', chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 2]
+    streamed = pandas.concat(chunks, ignore_index=True)
+    pandas.testing.assert_frame_equal(
+        sort_frame(streamed, KEYS),
+        sort_frame(crest_table.get_data('2015-12-31'), KEYS)
+    )
+
+def test_iter_data_prefetch(crest_table):
+    chunks = list(crest_table.iter_data('2015-12-31', chunk_size=5, prefetch=True))
+    assert sum(len(chunk) for chunk in chunks) == len(crest_frame())
+
+def test_bucket_sum(crest_table):
+    frame = crest_table.get_data('2015-12-31', bucket='2D', agg={'volume': 'sum'}, typeid=34)
+    assert list(frame.columns) == ['price_date', 'typeid', 'regionid', 'volume']
+    frame = sort_frame(frame, KEYS)
+    #2D buckets are epoch-aligned: 2015-12-31/01-01, 01-02/01-03, 01-04/01-05
+    assert list(frame['price_date']) == [
+        pandas.Timestamp('2015-12-31'), pandas.Timestamp('2016-01-02'), pandas.Timestamp('2016-01-04')
+    ]
+    assert list(frame['volume']) == [44, 54 + 64, 74]
+
+def test_bucket_ohlc(crest_table):
+    frame = crest_table.get_data('2015-12-31', bucket='1W', agg={'avgPrice': 'ohlc'}, typeid=34)
+    assert len(frame) == 1
+    row = frame.iloc[0]
+    assert (row['avgPrice_open'], row['avgPrice_close']) == (1.75, 4.75)
+    assert (row['avgPrice_low'], row['avgPrice_high']) == (1.75, 4.75)
+
+def test_bad_bucket(crest_table):
+    with pytest.raises(Connection.BadQueryModifier):
+        crest_table.get_data('2015-12-31', bucket='1 fortnight')
+
+def test_latest_entries(crest_table):
+    latest = crest_table.latest_entries()
+    assert len(latest) == 2
+    assert set(latest['price_date']) == {pandas.Timestamp('2016-01-04')}
+    assert crest_table.latest_entry(typeid=34, regionid=10000002) == pandas.Timestamp('2016-01-04')
+
+def test_result_cache_invalidated_by_put(make_table):
+    table = make_table('crest_markethistory', result_cache_ttl=60)
+    table.put_data(crest_frame())
+    table.get_data('2015-12-31', typeid=34)
+    table.get_data('2015-12-31', typeid=34)
+    assert table.result_cache_stats()['hits'] == 1
+
+    update = crest_frame(days=1, typeids=(34,))
+    update['volume'] = 999
+    table.put_data(update)
+    frame = table.get_data('2015-12-31', typeid=34)
+    assert 999 in set(frame['volume'])
+
+def test_result_cache_invalidated_by_float_keys(make_table):
+    '''payload keys decoded as floats still match int filters'''
+    table = make_table('crest_markethistory', result_cache_ttl=60)
+    table.put_data(crest_frame())
+    table.get_data('2015-12-31', typeid=34)
+
+    update = crest_frame(days=1, typeids=(34,))
+    update['typeid'] = update['typeid'].astype('float64')
+    update['volume'] = 999
+    table.put_data(update)
+    assert 999 in set(table.get_data('2015-12-31', typeid=34)['volume'])
+
+def test_result_cache_skips_results_raced_by_a_write(make_table):
+    '''a get_data() that started before put_data() does not cache its rows'''
+    table = make_table('crest_markethistory', result_cache_ttl=60)
+    table.put_data(crest_frame())
+    query_data = table._query_data
+
+    def _query_then_write(*args, **kwargs):
+        pandas_dataframe = query_data(*args, **kwargs)
+        update = crest_frame(days=1, typeids=(34,))
+        update['volume'] = 999
+        table.put_data(update)
+        return pandas_dataframe
+
+    table._query_data = _query_then_write
+    assert 999 not in set(table.get_data('2015-12-31', typeid=34)['volume'])
+    table._query_data = query_data
+    assert 999 in set(table.get_data('2015-12-31', typeid=34)['volume'])
+    assert table.result_cache_stats()['stale_puts'] == 1
+
+def test_shared_schema_validation(make_table, crest_table):
+    '''a second object on the same table skips test_table()'''
+    second = make_table('crest_markethistory')
+    assert len(second.get_data('2015-12-31')) == len(crest_frame())
+
+@pytest.mark.parametrize('query', [
+    {},
+    {'typeid': 35, 'datetime_end': '2016-01-03'},
+    {'bucket': '2D', 'agg': {'orderCount': 'mean', 'volume': 'mean'}},
+    {'bucket': '2D', 'agg': {'orderCount': ['min', 'max', 'sum', 'count'], 'avgPrice': 'ohlc'}},
+    {'bucket': '1W'}
+])
+def test_fast_decode_matches_slow_decode(make_table, query):
+    fast_table = make_table('crest_markethistory')
+    fast_table.put_data(crest_frame())
+    slow_table = make_table('crest_markethistory', fast_decode=False)
+    pandas.testing.assert_frame_equal(
+        sort_frame(fast_table.get_data('2015-12-31', **query), KEYS),
+        sort_frame(slow_table.get_data('2015-12-31', **query), KEYS)
+    )
+
+def test_bucket_mean_of_int_column(crest_table):
+    '''mean() of an INT column is a float: not truncated to the column's dtype'''
+    frame = crest_table.get_data(
+        '2015-12-31',
+        bucket='2D',
+        agg={'orderCount': 'mean', 'volume': 'mean'},
+        typeid=34
+    )
+    frame = sort_frame(frame, KEYS)
+    assert list(frame['orderCount']) == [1.0, 2.5, 4.0]
+    assert list(frame['volume']) == [44.0, 59.0, 74.0]
+
+def test_null_in_bool_override(make_table):
+    '''dtype_overrides bool column with a NULL: same on the fast and slow paths'''
+    payload = crest_frame(days=3, typeids=(34,))
+    payload['orderCount'] = [1, None, 0]
+    fast_table = make_table('crest_markethistory', dtype_overrides='orderCount:bool')
+    fast_table.put_data(payload)
+    slow_table = make_table(
+        'crest_markethistory', dtype_overrides='orderCount:bool', fast_decode=False
+    )
+    fast_frame = sort_frame(fast_table.get_data('2015-12-31', 'orderCount'), KEYS)
+    assert list(fast_frame['orderCount'].isnull()) == [False, True, False]
+    assert list(fast_frame['orderCount'].fillna(-1)) == [1, -1, 0]
+    pandas.testing.assert_frame_equal(
+        fast_frame,
+        sort_frame(slow_table.get_data('2015-12-31', 'orderCount'), KEYS)
+    )
+
+@pytest.fixture
+def single_connection_table(make_table):
+    '''pool_size=1 + a pooled schema lookup: a nested borrow raises PoolExhausted'''
+    table = make_table('crest_markethistory', table_base=SchemaLookupTable, pool_size=1)
+    table._pool.borrow_timeout = 0.5
+    table.put_data(crest_frame())
+    return table
+
+def test_iter_data_resolves_dtypes_before_borrowing(single_connection_table):
+    chunks = list(single_connection_table.iter_data('2015-12-31', chunk_size=3))
+    assert sum(len(chunk) for chunk in chunks) == len(crest_frame())
+    assert chunks[0]['typeid'].dtype == 'int32'
+
+@pytest.mark.parametrize('query', [
+    {},
+    {'bucket': '1D', 'agg': {'volume': 'sum'}},
+    {'slices': 2, 'datetime_end': '2016-01-10'}
+])
+def test_get_data_resolves_dtypes_before_borrowing(single_connection_table, query):
+    frame = single_connection_table.get_data('2015-12-31', **query)
+    assert frame['typeid'].dtype == 'int32'
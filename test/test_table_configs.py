@@ -0,0 +1,104 @@
+'''test_table_configs.py: the shipped table_configs modules, offline
+
+prosper.common's get_config() layers the uncommitted table_config_local.cfg
+secrets over table_config.cfg; the stub does the same with test credentials.
+mysql.connector is stubbed too, so nothing here opens a connection.
+
+'''
+
+import configparser
+import importlib
+import sys
+import types
+from unittest import mock
+
+import pytest
+
+import prosper.warehouse.Connection as Connection
+import prosper.warehouse.ConnectionPool as table_pool
+import prosper.warehouse.Utilities as table_utils
+
+TABLE_CONFIGS = ('snapshot_evecentral', 'crest_markethistory', 'eve_serverinfo')
+LOCAL_SECRETS = {
+    'db_schema': 'prosper_test',
+    'db_host': 'db.example',
+    'db_user': 'prosper',
+    'db_pw': 'hunter2',
+    'db_port': '3307'
+}
+
+def _get_config(config_path):
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    for section in TABLE_CONFIGS:
+        for key, value in LOCAL_SECRETS.items():
+            config.set(section, key, value)
+    return config
+
+@pytest.fixture
+def stubs(monkeypatch):
+    '''(get_config, mysql.connector.connect) mocks, installed in sys.modules'''
+    prosper_config = types.ModuleType('prosper.common.prosper_config')
+    prosper_config.get_config = mock.Mock(side_effect=_get_config)
+    prosper_common = types.ModuleType('prosper.common')
+    prosper_common.prosper_config = prosper_config
+    mysql_connector = types.ModuleType('mysql.connector')
+    mysql_connector.connect = mock.Mock()
+    mysql = types.ModuleType('mysql')
+    mysql.connector = mysql_connector
+    for module_name, module in (
+            ('prosper.common', prosper_common),
+            ('prosper.common.prosper_config', prosper_config),
+            ('mysql', mysql),
+            ('mysql.connector', mysql_connector)
+    ):
+        monkeypatch.setitem(sys.modules, module_name, module)
+
+    table_utils.clear_config_cache()
+    yield prosper_config.get_config, mysql_connector.connect
+    table_utils.clear_config_cache()
+    table_pool.close_pools()
+
+@pytest.fixture(params=TABLE_CONFIGS)
+def table_config(request, monkeypatch, stubs):
+    '''freshly imported prosper.table_configs module'''
+    module_name = 'prosper.table_configs.' + request.param
+    monkeypatch.delitem(sys.modules, module_name, raising=False)
+    module = importlib.import_module(module_name)
+    #ME is the module path minus .py: its cfg section when run from table_configs/
+    monkeypatch.setattr(module, 'ME', request.param)
+    return module
+
+def test_import_reads_no_config(table_config, stubs):
+    get_config, connect = stubs
+    get_config.assert_not_called()
+    connect.assert_not_called()
+
+def test_legacy_module_attributes(table_config, stubs):
+    get_config, _ = stubs
+    assert table_config.config.get(table_config.ME, 'table_name') == table_config.ME
+    connection_values = table_config.CONNECTION_VALUES
+    assert connection_values is table_config.connection_values()
+    assert connection_values['host'] == 'db.example'
+    assert connection_values['port'] == 3307
+    #parsed once, shared by every lookup
+    assert get_config.call_count == 1
+    with pytest.raises(AttributeError):
+        table_config.NOT_A_SETTING
+
+def test_construct_and_connect(table_config, stubs):
+    _, connect = stubs
+    datasource = getattr(table_config, table_config.ME)(table_config.ME, lazy=True)
+    assert (datasource.table_name, datasource.schema_name) == (table_config.ME, 'prosper_test')
+    assert datasource.table_type == Connection.TableType.MySQL
+    assert datasource.index_key == table_config.config.get(table_config.ME, 'index_key')
+    connect.assert_not_called()
+
+    assert datasource.get_connection() is connect.return_value
+    connect.assert_called_once_with(
+        user='prosper',
+        password='hunter2',
+        database='prosper_test',
+        host='db.example',
+        port=3307
+    )
@@ -0,0 +1,95 @@
+'''test_type_map.py: SQL column types -> compact pandas dtypes'''
+
+from os import path
+
+import numpy
+import pandas
+import pytest
+
+import prosper.warehouse.TypeMap as table_types
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+@pytest.mark.parametrize('column_type,dtype', [
+    ('INT(8)', 'int32'),
+    ('int(10) unsigned', 'uint32'),
+    ('BIGINT(12)', 'int64'),
+    ('TINYINT(1)', 'bool'),
+    ('tinyint(4)', 'int8'),
+    ('FLOAT(13,2)', 'float32'),
+    ('DOUBLE', 'float64'),
+    ('DATETIME', 'datetime64[ns]'),
+    ('VARCHAR(32)', None),
+    ('geometry', None)
+])
+def test_column_dtype(column_type, dtype):
+    assert table_types.column_dtype(column_type) == dtype
+
+def test_enum_becomes_category():
+    dtype = table_types.column_dtype("ENUM('global','it''s')")
+    assert isinstance(dtype, pandas.CategoricalDtype)
+    assert list(dtype.categories) == ['global', "it's"]
+
+def test_parse_ddl_crest():
+    with open(path.join(ROOT, 'SQL', 'crest_markethistory.mysql'), 'r') as file_handle:
+        column_types = table_types.parse_ddl(file_handle.read())
+    assert column_types == {
+        'price_date': 'DATE',
+        'typeid': 'INT(8)',
+        'regionid': 'INT(8)',
+        'orderCount': 'INT(8)',
+        'volume': 'BIGINT(12)',
+        'lowPrice': 'FLOAT(13,2)',
+        'highPrice': 'FLOAT(13,2)',
+        'avgPrice': 'FLOAT(13,2)'
+    }
+
+def test_build_dtype_map_overrides_win():
+    dtypes = table_types.build_dtype_map(
+        {'price_date': 'DATE', 'typeid': 'INT(8)', 'serverOpen': 'INT(1)'},
+        index_key='price_date',
+        overrides=table_types.parse_overrides('serverOpen:bool, typeid:int64,garbage')
+    )
+    assert dtypes == {
+        'price_date': 'datetime64[ns]',
+        'typeid': 'int64',
+        'serverOpen': 'bool'
+    }
+
+def test_apply_dtypes():
+    frame = pandas.DataFrame({
+        'price_date': ['2016-01-01', '2016-01-02'],
+        'typeid': [34, 35],
+        'orderCount': [1.0, numpy.nan],
+        'serverOpen': [1, 0],
+        'note': ['a', 'b']
+    })
+    frame = table_types.apply_dtypes(frame, {
+        'price_date': 'datetime64[ns]',
+        'typeid': 'int32',
+        'orderCount': 'int32',
+        'serverOpen': 'bool'
+    })
+    assert str(frame['price_date'].dtype) == 'datetime64[ns]'
+    assert frame['typeid'].dtype == 'int32'
+    #ints holding NULLs stay float
+    assert frame['orderCount'].dtype == 'float64'
+    assert frame['serverOpen'].dtype == 'bool'
+    assert pandas.api.types.is_string_dtype(frame['note'])
+
+def test_apply_dtypes_keeps_uncastable_column():
+    frame = pandas.DataFrame({'typeid': ['34', 'not a number']})
+    frame = table_types.apply_dtypes(frame, {'typeid': 'int32'})
+    assert list(frame['typeid']) == ['34', 'not a number']
+
+def test_dtype_cache():
+    table_types.set_cached(('test', 'cache'), {'typeid': 'int32'})
+    assert table_types.get_cached(('test', 'cache')) == {'typeid': 'int32'}
+    table_types.clear(('test', 'cache'))
+    assert table_types.get_cached(('test', 'cache')) is None
+
+def test_apply_dtypes_refuses_truncating_floats():
+    frame = pandas.DataFrame({'orderCount': [1.0, 1.5], 'volume': [1.0, 2.0]})
+    frame = table_types.apply_dtypes(frame, {'orderCount': 'int32', 'volume': 'int64'})
+    assert list(frame['orderCount']) == [1.0, 1.5]
+    assert frame['volume'].dtype == 'int64'